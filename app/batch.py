@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import main
+from core.scheduler import STAGE_LIMITS, scheduler
+from memory.short_term_memory import WordBudget, chain
+
+# Items generated at the same time, and prompts enhanced per batched LLM call
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_LLM_SIZE = int(os.getenv("BATCH_LLM_SIZE", "16"))
+BATCH_DIR = os.path.join(os.path.dirname(__file__), "datastore", "batches")
+
+
+def read_prompts(path: str) -> List[Dict[str, str]]:
+    """
+    Reads a prompts file: one JSON object per line with a "prompt" (and optionally an
+    "id"), or one plain-text prompt per line. Items without an ID are identified by the
+    hash of their prompt, so a resumed run recognizes them. Invalid lines are logged
+    with their line number and skipped.
+    """
+    items, seen = [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as e:
+                    logging.warning(f"{path}:{line_number}: skipped, invalid JSON ({e})")
+                    continue
+            else:
+                item = {"prompt": line}
+            prompt = item.get("prompt") if isinstance(item, dict) else None
+            if not isinstance(prompt, str) or not prompt.strip():
+                logging.warning(f"{path}:{line_number}: skipped, no \"prompt\" string")
+                continue
+            item_id = str(item.get("id") or hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16])
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+            items.append({"id": item_id, "prompt": prompt})
+    return items
+
+
+class Manifest:
+    """
+    Append-only JSONL record of the batch results, doubling as its checkpoint: every
+    finished item is written (and fsynced) as soon as it completes, and a resumed run
+    skips the items already recorded as completed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # line cut short by a crash
+                    self.records[record["id"]] = record
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def completed(self, item_id: str) -> bool:
+        return self.records.get(item_id, {}).get("status") == "completed"
+
+    def add(self, record: Dict) -> None:
+        with self._lock:
+            self.records[record["id"]] = record
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+async def enhance_batch(prompts: List[str]) -> List[str]:
+    """
+    Enhances prompts with one batched LLM call. A prompt whose enhancement fails is
+    used as-is rather than failing its item; the others are cut at the word budget.
+    """
+    llm_chain = await asyncio.to_thread(chain.get)  # the first call preloads the model
+    responses = await llm_chain.abatch(
+        [{"input": prompt, "history": []} for prompt in prompts],
+        config={"max_concurrency": STAGE_LIMITS["llm"]},
+        return_exceptions=True,
+    )
+    enhanced = []
+    for prompt, response in zip(prompts, responses):
+        if isinstance(response, Exception):
+            logging.warning(f"Prompt enhancement failed, using the original prompt: {response}")
+            enhanced.append(prompt)
+        else:
+            budget = WordBudget()
+            budget.feed(response.content)
+            enhanced.append(budget.text.strip())
+    return enhanced
+
+
+async def run_batch(items: List[Dict[str, str]], manifest: Manifest, username: str,
+                    concurrency: int = BATCH_CONCURRENCY, llm_batch_size: int = BATCH_LLM_SIZE) -> None:
+    """
+    Runs the pipeline for every item not completed yet. Prompts are enhanced in LLM
+    batches; the items of each batch start generating at once (up to `concurrency`
+    at a time) while the next batch is enhanced.
+    """
+    pending = [item for item in items if not manifest.completed(item["id"])]
+    logging.info(f"Batch: {len(items) - len(pending)} items already done, {len(pending)} to generate")
+
+    # This process only serves the batch: the remote stages run at the batch concurrency
+    for name in ("image", "model"):
+        scheduler.stages[name].limit = max(scheduler.stages[name].limit, concurrency)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def generate(item: Dict[str, str], enhanced_prompt: str) -> None:
+        async with slots:
+            record = {"id": item["id"], "prompt": item["prompt"], "enhanced_prompt": enhanced_prompt}
+            try:
+                artifacts = await main.generate_3d(enhanced_prompt, username, label=f"Batch item {item['id']}")
+                # An item is only checkpointed as completed once its files are on disk
+                await asyncio.gather(*(asyncio.to_thread(main.artifact_store.get().wait, a.id)
+                                       for a in artifacts.values()))
+                record["status"] = "completed"
+                for kind, artifact in artifacts.items():
+                    record[f"{kind}_id"] = artifact.id
+                    record[f"{kind}_path"] = artifact.path
+            except Exception as e:
+                record["status"] = "failed"
+                record["error"] = str(e)
+            record["finished_at"] = time.time()
+            manifest.add(record)
+
+    tasks = []
+    for start in range(0, len(pending), llm_batch_size):
+        chunk = pending[start:start + llm_batch_size]
+        enhanced = await enhance_batch([item["prompt"] for item in chunk])
+        tasks.extend(asyncio.create_task(generate(item, prompt)) for item, prompt in zip(chunk, enhanced))
+    await asyncio.gather(*tasks)
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate 3D models for many prompts")
+    parser.add_argument("prompts", help="JSONL file ({\"id\": ..., \"prompt\": ...} per line) or one prompt per line")
+    parser.add_argument("--name", help="Batch name, used for the manifest (default: the prompts file name)")
+    parser.add_argument("--manifest", help="Manifest path (default: datastore/batches/<name>.jsonl)")
+    parser.add_argument("--username", default="batch")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--llm-batch-size", type=int, default=BATCH_LLM_SIZE)
+    parser.add_argument("--app-ids", nargs="+", default=[main.TEXT_TO_IMAGE_APP, main.IMAGE_TO_3D_APP])
+    args = parser.parse_args(argv)
+
+    name = args.name or os.path.splitext(os.path.basename(args.prompts))[0]
+    manifest = Manifest(args.manifest or os.path.join(BATCH_DIR, f"{name}.jsonl"))
+    items = read_prompts(args.prompts)
+    main.stub.register(args.app_ids)
+    try:
+        asyncio.run(run_batch(items, manifest, args.username, args.concurrency, args.llm_batch_size))
+    finally:
+        manifest.close()
+
+    done = sum(manifest.completed(item["id"]) for item in items)
+    logging.info(f"Batch {name}: {done}/{len(items)} completed, manifest at {manifest.path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main_cli()
@@ -0,0 +1,4 @@
+"""
+Offline benchmark of the pipeline against local stand-ins for Ollama, Redis and the
+Openfabric apps. Run it from the app directory with `python -m bench.run --help`.
+"""
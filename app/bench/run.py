@@ -0,0 +1,311 @@
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from bench.stand_ins import (
+    IMAGE_TO_3D, RESOURCE_FIELDS, TEXT_TO_IMAGE, HashEmbeddings, StandInOllama, StandInOpenfabric, fake_redis
+)
+
+SCENARIOS = ("sessions", "context", "enhance", "stub", "execute")
+# Image hand-over modes of the "execute" scenario: uploaded, or passed through by URL
+PASSTHROUGH_MODES = {"off": False, "on": True}
+# Default share by which a stage may get slower (p95) or lose throughput before the
+# comparison with a baseline report fails
+REGRESSION_TOLERANCE = 0.2
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Nearest-rank percentile of the samples (0.0 when there are none)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+class Recorder:
+    """
+    Collects the latency of every operation of every stage, and the wall-clock time
+    of each stage run, to report percentiles and throughput.
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.wall: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        began = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception as e:
+            failed = True
+            logging.debug(f"{stage} failed: {e}")
+        finally:
+            elapsed = time.perf_counter() - began
+            with self._lock:
+                self.samples.setdefault(stage, []).append(elapsed)
+                if failed:
+                    self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def run(self, stage: str, operation: Callable[[int], None], count: int, concurrency: int) -> None:
+        """Runs `operation(i)` for i in range(count) on `concurrency` threads."""
+        def one(i: int) -> None:
+            with self.timed(stage):
+                operation(i)
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(count)))
+        self.wall[stage] = self.wall.get(stage, 0.0) + time.perf_counter() - began
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for stage, samples in self.samples.items():
+            wall = self.wall.get(stage, 0.0)
+            report[stage] = {
+                "count": len(samples),
+                "errors": self.errors.get(stage, 0),
+                "mean": sum(samples) / len(samples),
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "p99": percentile(samples, 99),
+                "throughput": len(samples) / wall if wall else 0.0,
+            }
+        return report
+
+
+def format_report(report: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"{'stage':<10} {'count':>6} {'errors':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>9}"]
+    for stage, row in report.items():
+        lines.append(
+            f"{stage:<10} {row['count']:>6} {row['errors']:>6} {row['p50'] * 1000:>10.1f} "
+            f"{row['p95'] * 1000:>10.1f} {row['p99'] * 1000:>10.1f} {row['throughput']:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def compare(report: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float = REGRESSION_TOLERANCE) -> List[str]:
+    """
+    Lists the stages whose p95 latency grew, or throughput dropped, by more than
+    `tolerance` compared with a baseline report, or whose error count grew.
+    """
+    regressions = []
+    for stage, row in report.items():
+        before = baseline.get(stage)
+        if not before:
+            continue
+        if before["p95"] and row["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(f"{stage}: p95 {before['p95'] * 1000:.1f} ms -> {row['p95'] * 1000:.1f} ms")
+        if before["throughput"] and row["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{stage}: throughput {before['throughput']:.2f} -> {row['throughput']:.2f} ops/s")
+        if row["errors"] > before["errors"]:
+            regressions.append(f"{stage}: errors {before['errors']} -> {row['errors']}")
+    return regressions
+
+
+def start_stand_ins(args: argparse.Namespace) -> Dict[str, object]:
+    """
+    Starts the stand-in services and points the application configuration at them.
+    Must run before the application modules are imported, as they read it at import.
+    """
+    ollama = StandInOllama(args.tokens, args.first_token_delay, args.token_delay)
+    apps = StandInOpenfabric(
+        {TEXT_TO_IMAGE: args.image_latency, IMAGE_TO_3D: args.model_latency},
+        args.jitter, args.failure_rate, args.payload_kb * 1024,
+    )
+    os.environ["OLLAMA_URL"] = ollama.url
+    os.environ["OPENFABRIC_SCHEME"] = "http"
+    os.environ["TEXT_TO_IMAGE_APP"] = apps.app_id(TEXT_TO_IMAGE)
+    os.environ["IMAGE_TO_3D_APP"] = apps.app_id(IMAGE_TO_3D)
+    if args.redis != "fake":
+        os.environ["REDIS_URL"] = args.redis
+    return {"ollama": ollama, "apps": apps}
+
+
+def install_stand_ins(args: argparse.Namespace, apps: StandInOpenfabric, workdir: str):
+    """
+    Imports the application and replaces its external services and on-disk state with
+    the stand-ins and a scratch directory.
+
+    Returns:
+        The `main` module, ready to serve requests.
+    """
+    import main
+    from core.artifact_store import ArtifactStore
+    from core.result_cache import ResultCache
+    from memory import long_term_memory, short_term_memory
+    from memory.conversation_log import ConversationLog, conversation_log
+    from memory.summary_queue import SummaryQueue, summary_queue
+    from session_manager import InMemorySessionBackend, RedisSessionBackend, SessionManager
+
+    if args.redis == "fake":
+        client = fake_redis()
+        if client is None:
+            sys.exit("fakeredis is not installed: pip install fakeredis, or pass --redis redis://...")
+        short_term_memory.set_redis_pool(client.connection_pool)
+    else:
+        import redis
+        client = redis.Redis.from_url(args.redis)
+
+    long_term_memory.embeddings.set(long_term_memory.CachedEmbeddings(HashEmbeddings()))
+    long_term_memory.vector_store.set(
+        long_term_memory.LongTermStore(long_term_memory.get_embeddings(), os.path.join(workdir, "long_term"))
+    )
+    summary_queue.set(SummaryQueue(os.path.join(workdir, "summary_queue.db")))
+    conversation_log.set(ConversationLog(os.path.join(workdir, "conversation_log")))
+    main.result_cache.set(ResultCache(os.path.join(workdir, "result_cache")))
+    main.artifact_store.set(ArtifactStore(os.path.join(workdir, "artifacts")))
+    main.session_manager = SessionManager(
+        RedisSessionBackend(client) if args.sessions == "redis" else InMemorySessionBackend()
+    )
+
+    main.stub.cache_dir = os.path.join(workdir, "schemas")
+    os.makedirs(main.stub.cache_dir, exist_ok=True)
+    main.stub.remote_class = apps.remote_class()
+    main.stub.register([main.TEXT_TO_IMAGE_APP, main.IMAGE_TO_3D_APP])
+    for app_id, name in ((main.TEXT_TO_IMAGE_APP, TEXT_TO_IMAGE), (main.IMAGE_TO_3D_APP, IMAGE_TO_3D)):
+        if sorted(main.stub.compiled_schema(app_id).resource_fields) != sorted(RESOURCE_FIELDS[name]):
+            logging.warning(f"The SDK does not read the {name} outputs as resources: downloads are not measured")
+    return main
+
+
+def run_scenarios(args: argparse.Namespace, main, recorder: Recorder) -> None:
+    from core import loop
+    from memory.memory_manager import MemoryManager
+    from memory.short_term_memory import aenhance_prompt
+    from ontology_dc8f06af066e4a7880a5938933236037.input import InputClass
+    from ontology_dc8f06af066e4a7880a5938933236037.output import OutputClass
+
+    # Every request has its own prompt, so the caches only serve what they would in production
+    def prompt(i: int) -> str:
+        return f"a small bronze statue of animal number {i} standing on a rock"
+
+    def user(i: int) -> str:
+        return f"bench-user-{i % args.users}"
+
+    if "sessions" in args.scenarios:
+        def session_op(i: int) -> None:
+            session, _ = main.session_manager.get_or_create_session(user(i))
+            main.session_manager.touch(session)
+        recorder.run("sessions", session_op, args.requests, args.concurrency)
+
+    if "context" in args.scenarios:
+        managers = [MemoryManager(f"bench-context-{u}", user(u)) for u in range(args.users)]
+        for manager in managers:
+            for turn in range(args.history_turns):
+                manager.record_turn(prompt(turn), f"enhanced {prompt(turn)}")
+
+        def context_op(i: int) -> None:
+            managers[i % len(managers)].fetch_context(prompt(args.requests + i))
+        recorder.run("context", context_op, args.requests, args.concurrency)
+
+    if "enhance" in args.scenarios:
+        def enhance_op(i: int) -> None:
+            loop.run(aenhance_prompt(prompt(i), [], user(i)))
+        recorder.run("enhance", enhance_op, args.requests, args.concurrency)
+
+    if "stub" in args.scenarios:
+        def stub_op(i: int) -> None:
+            main.stub.call(main.TEXT_TO_IMAGE_APP, {"prompt": prompt(i)}, user(i))
+        recorder.run("stub", stub_op, args.requests, args.concurrency)
+
+    if "execute" in args.scenarios:
+        class Model:
+            def __init__(self, request: InputClass):
+                self.request = request
+                self.response = OutputClass()
+
+        for n, mode in enumerate(args.passthrough):
+            main.RESOURCE_PASSTHROUGH = PASSTHROUGH_MODES[mode]
+            main._passthrough_rejected.clear()
+            offset = args.requests * (2 + n)
+
+            def execute_op(i: int) -> None:
+                model = Model(InputClass(prompt=prompt(offset + i), username=user(i)))
+                main.execute(model)
+                if not model.response.model_id:
+                    raise RuntimeError(model.response.message)
+            stage = "execute" if len(args.passthrough) == 1 else f"execute_{mode}"
+            recorder.run(stage, execute_op, args.requests, args.concurrency)
+
+
+def internals(main) -> Dict[str, object]:
+    """Internal counters of the application, reported alongside the latencies."""
+    from memory.long_term_memory import get_embeddings
+    from memory.summary_queue import summary_queue
+
+    return {
+        "scheduler": main.scheduler.stats(),
+        "remote": main.stub.call_stats(),
+        "artifact_store": main.artifact_store.get().stats(),
+        "embeddings": get_embeddings().stats(),
+        "summary_queue": summary_queue.get().stats(),
+    }
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against local stand-in services")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=50, help="operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--history-turns", type=int, default=10, help="turns stored per user before 'context'")
+    parser.add_argument("--tokens", type=int, default=60, help="words generated per LLM answer")
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--image-latency", type=float, default=1.0, help="text-to-image execution time (s)")
+    parser.add_argument("--model-latency", type=float, default=2.0, help="image-to-3D execution time (s)")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--payload-kb", type=int, default=256, help="size of the generated files")
+    parser.add_argument("--redis", default="fake", help="'fake' (fakeredis) or a Redis URL")
+    parser.add_argument("--sessions", choices=("memory", "redis"), default="memory")
+    parser.add_argument("--passthrough", nargs="+", choices=tuple(PASSTHROUGH_MODES), default=list(PASSTHROUGH_MODES),
+                        help="image hand-over modes of the 'execute' scenario (RESOURCE_PASSTHROUGH)")
+    parser.add_argument("--workdir", help="scratch directory (default: a temporary one)")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--baseline", help="JSON report to compare with; exits with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench-")
+    stand_ins = start_stand_ins(args)
+    main = install_stand_ins(args, stand_ins["apps"], workdir)
+
+    recorder = Recorder()
+    run_scenarios(args, main, recorder)
+    report = recorder.report()
+    print(format_report(report))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "stages": report, "internals": internals(main)}, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f)["stages"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+
+    for stand_in in stand_ins.values():
+        stand_in.close()
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main_cli())
@@ -0,0 +1,436 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import struct
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Type
+from urllib.parse import parse_qs, urlparse
+
+from langchain_core.embeddings import Embeddings
+
+from core.remote import Remote
+
+TEXT_TO_IMAGE = "text-to-image"
+IMAGE_TO_3D = "image-to-3d"
+
+# Words the stand-in LLM builds its "enhanced" prompts from
+_VOCABULARY = (
+    "a highly detailed intricate sculpture of weathered bronze under soft studio light with "
+    "subtle reflections polished surface dramatic shadows on a neutral background isometric "
+    "view sharp focus ornate texture smooth curves matte finish"
+).split()
+
+
+# ----------------------------------------------------------------------
+# Synthetic payloads
+# ----------------------------------------------------------------------
+def synthetic_png(size: int) -> bytes:
+    """
+    Returns a valid grayscale PNG of roughly `size` bytes (random pixels do not compress).
+    """
+    width = 256
+    height = max(1, size // (width + 1))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + os.urandom(width) for _ in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b""))
+
+
+def synthetic_glb(size: int) -> bytes:
+    """
+    Returns a binary glTF 2.0 container with a minimal JSON chunk and `size` random bytes.
+    """
+    document = json.dumps({"asset": {"version": "2.0", "generator": "bench"}}).encode("utf-8")
+    document += b" " * (-len(document) % 4)
+    binary = os.urandom(size + (-size % 4))
+    body = (struct.pack("<I", len(document)) + b"JSON" + document
+            + struct.pack("<I", len(binary)) + b"BIN\x00" + binary)
+    return b"glTF" + struct.pack("<II", 2, 12 + len(body)) + body
+
+
+def synthetic_mp4(size: int) -> bytes:
+    """
+    Returns an ISO media file made of an `ftyp` box and an `mdat` box of `size` random bytes.
+    """
+    ftyp = struct.pack(">I", 24) + b"ftypisom" + struct.pack(">I", 0x200) + b"isommp41"
+    return ftyp + struct.pack(">I", 8 + size) + b"mdat" + os.urandom(size)
+
+
+# ----------------------------------------------------------------------
+# HTTP servers
+# ----------------------------------------------------------------------
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def _serve(handler: Type[BaseHTTPRequestHandler], owner: object) -> ThreadingHTTPServer:
+    """Starts an HTTP server on a free local port, on a daemon thread."""
+    server = _Server(("127.0.0.1", 0), handler)
+    server.owner = owner
+    threading.Thread(target=server.serve_forever, name=f"bench-{handler.__name__}", daemon=True).start()
+    return server
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # keep the benchmark output readable
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload, status: int = 200) -> None:
+        self._send(status, json.dumps(payload).encode("utf-8"))
+
+
+# ----------------------------------------------------------------------
+# Ollama
+# ----------------------------------------------------------------------
+class StandInOllama:
+    """
+    StandInOllama serves the Ollama chat API (`/api/chat`, streamed or not) and answers
+    every prompt with synthetic words at a configurable generation speed.
+
+    Attributes:
+        url (str): Base URL to use as `OLLAMA_URL`.
+        tokens (int): Words generated per answer (lowered by the request's `num_predict`).
+        first_token_delay (float): Seconds before the first word (prompt evaluation).
+        token_delay (float): Seconds per generated word.
+        requests (int): Chat requests served so far.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, tokens: int = 60, first_token_delay: float = 0.2, token_delay: float = 0.02):
+        self.tokens = tokens
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = _serve(_OllamaHandler, self)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    # ----------------------------------------------------------------------
+    def answer(self, messages: List[Dict], limit: Optional[int] = None) -> List[str]:
+        """
+        Returns the words of the answer to a conversation, seeded by its last message.
+        """
+        with self._lock:
+            self.requests += 1
+        prompt = messages[-1].get("content", "") if messages else ""
+        rng = random.Random(prompt)
+        count = self.tokens if limit is None or limit < 0 else min(self.tokens, limit)
+        return [rng.choice(_VOCABULARY) for _ in range(count)]
+
+    # ----------------------------------------------------------------------
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _OllamaHandler(_Handler):
+
+    def do_GET(self):
+        if self.path.startswith("/api/tags"):
+            self._send_json({"models": [{"name": "llama3.2:latest", "model": "llama3.2:latest"}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.startswith("/api/chat"):
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        ollama: StandInOllama = self.server.owner
+        began = time.perf_counter_ns()
+        words = ollama.answer(body.get("messages", []), (body.get("options") or {}).get("num_predict"))
+        model = body.get("model", "llama3.2")
+        time.sleep(ollama.first_token_delay)
+
+        def message(content: str, done: bool) -> Dict:
+            payload = {
+                "model": model,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": content},
+                "done": done,
+            }
+            if done:
+                elapsed = time.perf_counter_ns() - began
+                payload.update(done_reason="stop", total_duration=elapsed, load_duration=0,
+                               prompt_eval_count=sum(len(m.get("content", "")) // 4 for m in body["messages"]),
+                               prompt_eval_duration=int(ollama.first_token_delay * 1e9),
+                               eval_count=len(words), eval_duration=elapsed)
+            return payload
+
+        if not body.get("stream", True):
+            time.sleep(ollama.token_delay * len(words))
+            self._send_json(message(" ".join(words), True))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, word in enumerate(words):
+            time.sleep(ollama.token_delay)
+            self._write_chunk(message(word if i == 0 else " " + word, False))
+        self._write_chunk(message("", True))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, payload: Dict) -> None:
+        line = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+
+# ----------------------------------------------------------------------
+# Openfabric apps
+# ----------------------------------------------------------------------
+# Binary outputs are declared as the SDK's Resource fields: the apps answer with
+# references, downloaded from their resource endpoint
+_RESOURCE = {"type": "string", "format": "binary"}
+_SCHEMAS = {
+    TEXT_TO_IMAGE: (
+        {"type": "object", "properties": {"prompt": {"type": "string"}}},
+        {"type": "object", "properties": {"result": _RESOURCE}},
+    ),
+    IMAGE_TO_3D: (
+        {"type": "object", "properties": {"input_image": {"type": "string"}}},
+        {"type": "object", "properties": {"generated_object": _RESOURCE, "video_object": _RESOURCE}},
+    ),
+}
+RESOURCE_FIELDS = {name: list(output["properties"]) for name, (_, output) in _SCHEMAS.items()}
+
+
+class StandInOpenfabric:
+    """
+    StandInOpenfabric plays the text-to-image and image-to-3D apps.
+
+    Manifests, schemas and resources are served over HTTP like the real apps (see
+    `Stub` with `OPENFABRIC_SCHEME=http`). The WebSocket proxy protocol itself is not
+    reproduced: `remote_class()` returns a `Remote` whose client executes requests
+    in-process, after the configured latency. The text-to-image app answers with a
+    resource reference to a synthetic PNG; the image-to-3D app checks its input image
+    (URL or base64) and answers with references to a synthetic GLB and MP4. The Stub
+    downloads every reference from the resource endpoint, as with the real apps.
+
+    Attributes:
+        latency (Dict[str, float]): Mean execution time of each app, in seconds.
+        jitter (float): Relative spread of the execution time (0.2: +/- 20%).
+        failure_rate (float): Share of the executions that fail.
+        payload_bytes (int): Approximate size of the generated files.
+        resources (Dict[str, bytes]): Resources produced so far, by reference.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, latency: Optional[Dict[str, float]] = None, jitter: float = 0.2,
+                 failure_rate: float = 0.0, payload_bytes: int = 256 * 1024):
+        self.latency = latency or {TEXT_TO_IMAGE: 1.0, IMAGE_TO_3D: 2.0}
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.payload_bytes = payload_bytes
+        self.resources: Dict[str, bytes] = {}
+        self.executions: Dict[str, int] = {name: 0 for name in _SCHEMAS}
+        self._lock = threading.Lock()
+        self._server = _serve(_OpenfabricHandler, self)
+        self.host = f"127.0.0.1:{self._server.server_address[1]}"
+
+    # ----------------------------------------------------------------------
+    def app_id(self, name: str) -> str:
+        """
+        Returns:
+            str: The app ID under which the Stub reaches the stand-in app.
+        """
+        return f"{self.host}/{name}"
+
+    # ----------------------------------------------------------------------
+    def remote_class(self) -> Type[Remote]:
+        """
+        Returns:
+            Type[Remote]: A `Remote` connecting to the in-process stand-in apps.
+        """
+        apps = self
+
+        class StandInRemote(Remote):
+            def connect(self) -> Remote:
+                # proxy_url is ws://<host>/<app name>/app
+                self.client = _StandInProxy(apps, self.proxy_url.rstrip("/").split("/")[-2])
+                self.failures = 0
+                return self
+
+        return StandInRemote
+
+    # ----------------------------------------------------------------------
+    def execute(self, name: str, inputs: Dict) -> Dict:
+        """
+        Produces the output of an app for the given inputs.
+
+        Raises:
+            ValueError: When the inputs are not usable.
+        """
+        with self._lock:
+            self.executions[name] += 1
+        if name == TEXT_TO_IMAGE:
+            if not inputs.get("prompt"):
+                raise ValueError("missing prompt")
+            return {"result": self._resource(synthetic_png(self.payload_bytes))}
+
+        image = inputs.get("input_image") or ""
+        if image.startswith("http"):
+            reid = parse_qs(urlparse(image).query).get("reid", [""])[0]
+            with self._lock:
+                image = self.resources.get(reid)
+        else:
+            image = base64.b64decode(image) if image else None
+        if not image or not image.startswith(b"\x89PNG"):
+            raise ValueError("input_image is not a PNG image")
+        seed = hashlib.sha256(image).hexdigest()[:8]
+        return {
+            "generated_object": self._resource(synthetic_glb(self.payload_bytes) + seed.encode("ascii")),
+            "video_object": self._resource(synthetic_mp4(self.payload_bytes // 2)),
+        }
+
+    # ----------------------------------------------------------------------
+    def _resource(self, data: bytes) -> str:
+        reid = uuid.uuid4().hex
+        with self._lock:
+            self.resources[reid] = data
+        return reid
+
+    # ----------------------------------------------------------------------
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _OpenfabricHandler(_Handler):
+
+    def do_GET(self):
+        apps: StandInOpenfabric = self.server.owner
+        url = urlparse(self.path)
+        name, _, endpoint = url.path.strip("/").partition("/")
+        query = parse_qs(url.query)
+        if name not in _SCHEMAS:
+            self._send_json({"error": "unknown app"}, 404)
+        elif endpoint == "manifest":
+            self._send_json({"name": name, "version": "bench", "description": "Local stand-in"})
+        elif endpoint == "schema":
+            input_schema, output_schema = _SCHEMAS[name]
+            self._send_json(output_schema if query.get("type") == ["output"] else input_schema)
+        elif endpoint == "resource":
+            with apps._lock:
+                data = apps.resources.get(query.get("reid", [""])[0])
+            if data is None:
+                self._send_json({"error": "unknown resource"}, 404)
+            else:
+                self._send(200, data, "application/octet-stream")
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+
+class _StandInResult:
+    """Execution handle with the interface of the SDK's `ExecutionResult` used by `Remote`."""
+
+    def __init__(self):
+        self._status = "RUNNING"
+        self._data = None
+        self._done = threading.Event()
+
+    def status(self) -> str:
+        return self._status
+
+    def data(self) -> Optional[Dict]:
+        return self._data
+
+    def wait(self, timeout: float = 0) -> bool:
+        return self._done.wait(timeout or None)
+
+    def cancel(self) -> None:
+        if not self._done.is_set():
+            self._finish("CANCELLED")
+
+    def _finish(self, status: str, data: Optional[Dict] = None) -> None:
+        self._data = data
+        self._status = status
+        self._done.set()
+
+
+class _StandInProxy:
+    """Proxy client executing the requests of one stand-in app on timer threads."""
+
+    def __init__(self, apps: StandInOpenfabric, name: str):
+        self.apps = apps
+        self.name = name
+
+    def request(self, inputs: Dict, uid: str) -> _StandInResult:
+        result = _StandInResult()
+        delay = self.apps.latency[self.name] * random.uniform(1 - self.apps.jitter, 1 + self.apps.jitter)
+
+        def complete():
+            if result.status() != "RUNNING":
+                return
+            if random.random() < self.apps.failure_rate:
+                result._finish("FAILED")
+                return
+            try:
+                result._finish("COMPLETED", self.apps.execute(self.name, inputs))
+            except ValueError:
+                result._finish("FAILED")
+
+        timer = threading.Timer(max(0.0, delay), complete)
+        timer.daemon = True
+        timer.start()
+        return result
+
+
+# ----------------------------------------------------------------------
+# Embeddings and Redis
+# ----------------------------------------------------------------------
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings (hashed word counts, L2-normalized): similar
+    texts get similar vectors without loading a model.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for word in text.lower().split():
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+
+def fake_redis():
+    """
+    Returns:
+        A `fakeredis.FakeRedis` client, or None when fakeredis is not installed. Lua
+        scripts (the Redis session backend) additionally need `lupa`.
+    """
+    try:
+        import fakeredis
+    except ImportError:
+        return None
+    return fakeredis.FakeRedis()
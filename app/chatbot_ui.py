@@ -1,78 +1,125 @@
 import gradio as gr
 import requests
 import os
-import glob
-from datetime import datetime
+import time
 
-def get_latest_files():
-    """Get the latest generated image and GLB files"""
-    output_dir = os.path.join(os.path.dirname(__file__), "output_3d_model")
-    
-    latest_image = None
-    latest_glb = None
-    
-    if os.path.exists(output_dir):
-        # Get all PNG files and find the latest one
-        png_files = glob.glob(f"{output_dir}/*.png")
-        if png_files:
-            latest_image = max(png_files, key=os.path.getmtime)
-        
-        # Get all GLB files and find the latest one
-        glb_files = glob.glob(f"{output_dir}/*.glb")
-        if glb_files:
-            latest_glb = max(glb_files, key=os.path.getmtime)
-    
-    return latest_image, latest_glb
+from core.artifact_store import ARTIFACT_DIR, artifact_path
+
+EXECUTION_URL = "http://localhost:8888/execution"
+# Seconds between job status polls, and how long to wait for a job to finish
+POLL_INTERVAL = 1.0
+JOB_TIMEOUT = 900
+# How long to wait for the server to finish writing the files of a completed job
+ARTIFACT_WAIT = 10
+
+def get_artifact_files(output, wait=0):
+    """Locate this request's image, GLB and video from the artifact references in its output.
+
+    The files are handed to Gradio by path, so it streams them from disk instead of
+    loading them in memory. The server answers before its background writes are done:
+    with `wait`, missing files are polled for up to that many seconds.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        files, missing = [], False
+        for kind, extension in (("image", ".png"), ("model", ".glb"), ("video", ".mp4")):
+            path = output.get(f"{kind}_path")
+            artifact_id = output.get(f"{kind}_id")
+            if (not path or not os.path.exists(path)) and artifact_id:
+                # The server may run with another working directory: derive the path from the ID
+                path = artifact_path(artifact_id, extension)
+            exists = bool(path) and os.path.exists(path)
+            missing = missing or (artifact_id is not None and not exists)
+            files.append(path if exists else None)
+        if not missing or time.monotonic() >= deadline:
+            return tuple(files)
+        time.sleep(0.1)
+
+STAGE_LABELS = {
+    "queued": "⏳ Waiting for a free worker...",
+    "enhance": "✍️ Enhancing prompt...",
+    "image": "🖼️ Generating image...",
+    "model": "📦 Generating 3D model...",
+}
+
+
+def post_execution(payload, timeout=10):
+    """Send one request to the server and return its output"""
+    response = requests.post(
+        EXECUTION_URL,
+        headers={
+            "accept": "application/json",
+            "Content-Type": "application/json"
+        },
+        json=payload,
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return response.json()
 
 def process_text_to_3d(username, input_text):
-    """Process the text to 3D model request"""
+    """Submit the text to 3D job, then poll it and stream progress and partial results"""
     
     # Validation
     if not input_text.strip():
-        return "Please enter some text.", None, None
+        yield "Please enter some text.", None, None, None
+        return
     
     if not username.strip():
-        return "Please enter a username.", None, None
+        yield "Please enter a username.", None, None, None
+        return
     
     try:
-        # Prepare the request payload
-        payload = {
+        # Submit the job: the server answers at once with a job id
+        output = post_execution({
             "attachments": [],
             "prompt": input_text,
-            "username": username
-        }
+            "username": username,
+            "mode": "async"
+        })
+        job_id = output.get("job_id")
+        if not job_id:
+            yield f"❌ {output.get('message') or 'Job was not accepted'}", None, None, None
+            return
         
-        # Make request to the server
-        response = requests.post(
-            "http://localhost:8888/execution",
-            headers={
-                "accept": "application/json",
-                "Content-Type": "application/json"
-            },
-            json=payload,
-            timeout=120
-        )
+        # Poll the job until it finishes, showing each stage and partial result
+        deadline = time.monotonic() + JOB_TIMEOUT
+        while output.get("status") in ("queued", "running"):
+            if time.monotonic() > deadline:
+                yield "❌ Request timed out. Try a simpler description.", None, None, None
+                return
+            image, glb, video = get_artifact_files(output)
+            status_msg = STAGE_LABELS.get(output.get("stage"), "⏳ Working...")
+            if output.get("enhanced_prompt"):
+                status_msg += f"\n📝 {output['enhanced_prompt']}"
+            yield status_msg, image, glb, video
+            time.sleep(POLL_INTERVAL)
+            output = post_execution({"job_id": job_id})
         
-        if response.status_code == 200:
-            # Get the latest generated files
-            latest_image, latest_glb = get_latest_files()
-            
-            status_msg = f"✅ Generated successfully for {username}"
-            if latest_image:
-                status_msg += f"\n🖼️ Image: {os.path.basename(latest_image)}"
-            if latest_glb:
-                status_msg += f"\n📦 Model: {os.path.basename(latest_glb)}"
-            
-            return status_msg, latest_image, latest_glb
-        else:
-            return f"❌ Error {response.status_code}: {response.text}", None, None
+        # Get the files generated by this request
+        image, glb, video = get_artifact_files(output, wait=ARTIFACT_WAIT)
+        if output.get("status") != "completed" or not glb:
+            yield f"❌ {output.get('message') or 'No 3D model was generated'}", image, None, None
+            return
+        
+        status_msg = f"✅ Generated successfully for {username}"
+        if image:
+            status_msg += f"\n🖼️ Image: {os.path.basename(image)}"
+        if glb:
+            status_msg += f"\n📦 Model: {os.path.basename(glb)}"
+        if video:
+            status_msg += f"\n🎬 Video: {os.path.basename(video)}"
+        
+        yield status_msg, image, glb, video
             
     except requests.exceptions.ConnectionError:
-        return "❌ Cannot connect to server (localhost:8888)", None, None
+        yield "❌ Cannot connect to server (localhost:8888)", None, None, None
     except requests.exceptions.Timeout:
-        return "❌ Request timed out. Try a simpler description.", None, None
+        yield "❌ Server did not answer in time.", None, None, None
+    except requests.exceptions.HTTPError as e:
+        yield f"❌ Error {e.response.status_code}: {e.response.text}", None, None, None
     except Exception as e:
-        return f"❌ Error: {str(e)}", None, None
+        yield f"❌ Error: {str(e)}", None, None, None
 
 # Create minimal Gradio interface
 with gr.Blocks(title="3D Generator", theme=gr.themes.Soft()) as app:
@@ -113,11 +160,17 @@ with gr.Blocks(title="3D Generator", theme=gr.themes.Soft()) as app:
             label="3D Model (.glb)",
             interactive=False
         )
+
+        output_video = gr.Video(
+            label="Preview Video",
+            height=300,
+            interactive=False
+        )
     
     generate_btn.click(
         fn=process_text_to_3d,
         inputs=[username_input, input_text],
-        outputs=[status_output, output_image, output_file]
+        outputs=[status_output, output_image, output_file, output_video]
     )
 
 # Launch the app
@@ -125,5 +178,6 @@ if __name__ == "__main__":
     app.launch(
         server_name="0.0.0.0",
         server_port=7860,
-        share=False
+        share=False,
+        allowed_paths=[ARTIFACT_DIR]
     )
\ No newline at end of file
@@ -0,0 +1,303 @@
+import hashlib
+import logging
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# Root directory of the generated artifacts (images, 3D models, preview videos)
+ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), "..", "output_3d_model")
+# Upper bound of the artifacts size on disk, least recently used artifacts are deleted beyond it
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_STORE_MAX_BYTES", str(5 * 1024 ** 3)))
+# Writes waiting for the writer thread; producers block beyond it
+ARTIFACT_WRITE_QUEUE = int(os.getenv("ARTIFACT_WRITE_QUEUE", "64"))
+
+
+def artifact_path(artifact_id: str, extension: str, root: str = ARTIFACT_DIR) -> str:
+    """
+    Locates an artifact from its ID without touching the disk.
+
+    Args:
+        artifact_id (str): The artifact ID.
+        extension (str): The file extension, e.g. ".glb".
+        root (str): Directory holding the artifacts.
+
+    Returns:
+        str: The artifact file path.
+    """
+    return os.path.join(root, artifact_id[:2], artifact_id[2:4], artifact_id + extension)
+
+
+class Artifact(NamedTuple):
+    """
+    A stored artifact.
+
+    Attributes:
+        id (str): The hex SHA-256 digest of the content.
+        path (str): The file holding the content (written asynchronously).
+        size (int): The content size in bytes.
+    """
+    id: str
+    path: str
+    size: int
+
+
+class ArtifactStore:
+    """
+    ArtifactStore is a content-addressed store for generated files.
+
+    Each artifact is named after the SHA-256 digest of its content in two levels of
+    shard directories (`ab/cd/abcd....glb`), so identical outputs are stored once.
+    Files are written by a single background thread to a temporary file renamed into
+    place, so readers never see a partial file and the request path never waits on
+    the disk. Artifacts are deleted in least-recently-used order once the total size
+    exceeds `max_bytes`; access order survives restarts through the files' mtimes.
+
+    Attributes:
+        root (str): Directory holding the artifacts.
+        max_bytes (int): Maximum total size of the artifacts.
+        deduplicated (int): Number of puts of content that was already stored.
+        evictions (int): Number of artifacts deleted to stay under `max_bytes`.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, root: str = ARTIFACT_DIR, max_bytes: int = ARTIFACT_MAX_BYTES,
+                 queue_size: int = ARTIFACT_WRITE_QUEUE):
+        """
+        Initializes the store, indexing the artifacts already on disk, and starts the writer.
+
+        Args:
+            root (str): Directory holding the artifacts.
+            max_bytes (int): Maximum total size of the artifacts.
+            queue_size (int): Maximum number of writes waiting for the writer thread.
+        """
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.deduplicated = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()  # id -> (file name, size)
+        self._pending: Dict[str, Tuple[Artifact, bytes, Future]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._writes: "queue.Queue[str]" = queue.Queue(queue_size)
+
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+        threading.Thread(target=self._write_forever, name="artifact-writer", daemon=True).start()
+
+    # ----------------------------------------------------------------------
+    def put(self, data: bytes, extension: str) -> Artifact:
+        """
+        Stores content, returning at once while the file is written in the background.
+        Content already stored (or being written) is not written again.
+
+        Args:
+            data (bytes): The content.
+            extension (str): The file extension, e.g. ".png".
+
+        Returns:
+            Artifact: The artifact ID, path and size.
+        """
+        artifact_id = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if artifact_id in self._pending:
+                self.deduplicated += 1
+                return self._pending[artifact_id][0]
+            if artifact_id in self._entries:
+                self.deduplicated += 1
+                self._entries.move_to_end(artifact_id)
+                name, size = self._entries[artifact_id]
+                artifact = Artifact(artifact_id, self._path(name), size)
+                touch = True
+            else:
+                artifact = Artifact(artifact_id, artifact_path(artifact_id, extension, self.root), len(data))
+                self._pending[artifact_id] = (artifact, data, Future())
+                touch = False
+
+        if touch:
+            try:
+                os.utime(artifact.path)
+            except OSError:
+                pass
+        else:
+            self._writes.put(artifact_id)
+        return artifact
+
+    # ----------------------------------------------------------------------
+    def get(self, artifact_id: str) -> Optional[bytes]:
+        """
+        Reads an artifact, marking it as most recently used.
+
+        Args:
+            artifact_id (str): The artifact ID.
+
+        Returns:
+            Optional[bytes]: The content, or None when the artifact is unknown.
+        """
+        path = self.path(artifact_id)
+        with self._lock:
+            if artifact_id in self._pending:
+                return self._pending[artifact_id][1]
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    # ----------------------------------------------------------------------
+    def find(self, artifact_id: str) -> Optional[Artifact]:
+        """
+        Looks up a stored (or queued) artifact by ID, marking it as most recently used.
+
+        Args:
+            artifact_id (str): The artifact ID.
+
+        Returns:
+            Optional[Artifact]: The artifact, or None when it is unknown (e.g. evicted).
+        """
+        with self._lock:
+            if artifact_id in self._pending:
+                return self._pending[artifact_id][0]
+            if artifact_id not in self._entries:
+                return None
+            self._entries.move_to_end(artifact_id)
+            name, size = self._entries[artifact_id]
+        artifact = Artifact(artifact_id, self._path(name), size)
+        try:
+            os.utime(artifact.path)
+        except OSError:
+            pass
+        return artifact
+
+    # ----------------------------------------------------------------------
+    def path(self, artifact_id: str) -> Optional[str]:
+        """
+        Returns the file of an artifact, marking it as most recently used. The file may
+        still be in the write queue: see `wait`.
+
+        Args:
+            artifact_id (str): The artifact ID.
+
+        Returns:
+            Optional[str]: The file path, or None when the artifact is unknown.
+        """
+        with self._lock:
+            if artifact_id in self._pending:
+                return self._pending[artifact_id][0].path
+            if artifact_id not in self._entries:
+                return None
+            self._entries.move_to_end(artifact_id)
+            return self._path(self._entries[artifact_id][0])
+
+    # ----------------------------------------------------------------------
+    def wait(self, artifact_id: str, timeout: Optional[float] = None) -> None:
+        """
+        Blocks until a queued artifact is on disk.
+
+        Args:
+            artifact_id (str): The artifact ID.
+            timeout (Optional[float]): Maximum time to wait, in seconds.
+        """
+        with self._lock:
+            pending = self._pending.get(artifact_id)
+        if pending is not None:
+            pending[2].result(timeout)
+
+    # ----------------------------------------------------------------------
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the store counters.
+
+        Returns:
+            Dict[str, int]: Number of artifacts, total size in bytes, pending writes,
+            deduplicated puts and evictions.
+        """
+        with self._lock:
+            return {
+                "artifacts": len(self._entries),
+                "bytes": self._size,
+                "pending": len(self._pending),
+                "deduplicated": self.deduplicated,
+                "evictions": self.evictions,
+            }
+
+    # ----------------------------------------------------------------------
+    def _path(self, name: str) -> str:
+        artifact_id, extension = os.path.splitext(name)
+        return artifact_path(artifact_id, extension, self.root)
+
+    # ----------------------------------------------------------------------
+    def _write_forever(self) -> None:
+        while True:
+            artifact_id = self._writes.get()
+            with self._lock:
+                artifact, data, done = self._pending[artifact_id]
+            try:
+                self._write(artifact.path, data)
+            except OSError as e:
+                logging.warning(f"Could not store artifact {artifact_id}: {e}")
+                with self._lock:
+                    del self._pending[artifact_id]
+                done.set_exception(e)
+                continue
+
+            with self._lock:
+                del self._pending[artifact_id]
+                self._entries[artifact_id] = (os.path.basename(artifact.path), artifact.size)
+                self._size += artifact.size
+            done.set_result(artifact)
+            self._evict()
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # ----------------------------------------------------------------------
+    def _scan(self) -> None:
+        """
+        Rebuilds the LRU order from the artifacts on disk, oldest access first.
+        """
+        found = []
+        for directory, _, names in os.walk(self.root):
+            if directory == self.root:
+                continue  # files left by older versions are not managed
+            for name in names:
+                path = os.path.join(directory, name)
+                if name.endswith(".tmp"):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_mtime, name.split(".", 1)[0], name, stat.st_size))
+
+        for _, artifact_id, name, size in sorted(found):
+            self._entries[artifact_id] = (name, size)
+            self._size += size
+        self._evict()
+
+    # ----------------------------------------------------------------------
+    def _evict(self) -> None:
+        while True:
+            with self._lock:
+                if self._size <= self.max_bytes or not self._entries:
+                    return
+                artifact_id, (name, size) = self._entries.popitem(last=False)
+                self._size -= size
+                self.evictions += 1
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from core import loop
+
+# Pipelines running at the same time, jobs accepted but not finished, and how long
+# finished jobs stay available to status polls
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_TTL = int(os.getenv("JOB_TTL", "3600"))
+# Job state lives next to the sessions: "redis" lets any worker answer a status poll
+JOB_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+JOB_REDIS_URL = os.getenv("SESSION_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while `JOB_QUEUE_SIZE` jobs are already pending."""
+
+
+class JobBackend(ABC):
+    """
+    Storage of the job records, so a job's status can be read by any worker sharing
+    the backend. A record is a dict with the keys `job_id`, `status`, `stage`, `result`,
+    `created` and `updated`.
+    """
+
+    @abstractmethod
+    def save(self, record: Dict[str, Any]) -> None:
+        """Stores (or replaces) a job record."""
+
+    @abstractmethod
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a job record, or None when the job is unknown or expired."""
+
+
+class InMemoryJobBackend(JobBackend):
+    """Job records kept in this process. Finished jobs are dropped `ttl` seconds after their last update."""
+
+    def __init__(self, ttl: int = JOB_TTL):
+        self.ttl = ttl
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def save(self, record: Dict[str, Any]) -> None:
+        expiry = time.time() - self.ttl
+        with self._lock:
+            self._records[record["job_id"]] = dict(record, result=dict(record["result"]))
+            expired = [job_id for job_id, r in self._records.items()
+                       if r["status"] in ("completed", "failed") and r["updated"] < expiry]
+            for job_id in expired:
+                del self._records[job_id]
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(job_id)
+            return dict(record, result=dict(record["result"])) if record is not None else None
+
+
+class RedisJobBackend(JobBackend):
+    """
+    Job records shared through Redis, like the sessions. A record is the hash `job:{id}`,
+    its partial results JSON-encoded; the hash expires `ttl` seconds after the last
+    update, so a job whose worker died disappears instead of staying "running".
+    """
+
+    KEY_PREFIX = "job:"
+
+    def __init__(self, client=None, url: str = JOB_REDIS_URL, ttl: int = JOB_TTL):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+
+    def save(self, record: Dict[str, Any]) -> None:
+        key = self.KEY_PREFIX + record["job_id"]
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={
+            "status": record["status"],
+            "stage": record["stage"],
+            "result": json.dumps(record["result"]),
+            "created": record["created"],
+            "updated": record["updated"],
+        })
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        fields = self.client.hgetall(self.KEY_PREFIX + job_id)
+        if not fields:
+            return None
+        fields = {key.decode("utf-8"): value.decode("utf-8") for key, value in fields.items()}
+        return {
+            "job_id": job_id,
+            "status": fields["status"],
+            "stage": fields["stage"],
+            "result": json.loads(fields["result"]),
+            "created": float(fields["created"]),
+            "updated": float(fields["updated"]),
+        }
+
+
+class Job:
+    """
+    Job tracks one asynchronous pipeline run: its status, current stage and the
+    partial results published so far. Every change is written through to the job
+    backend, off the event loop when made from a coroutine.
+
+    Attributes:
+        job_id (str): The job ID returned to the client.
+        status (str): "queued", "running", "completed" or "failed".
+        stage (str): The pipeline stage in progress, or the final stage.
+        result (Dict[str, Any]): Partial results, keyed by output field.
+        created (float): POSIX timestamp of the submission.
+        updated (float): POSIX timestamp of the last change.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, job_id: str, backend: Optional[JobBackend] = None):
+        self.job_id = job_id
+        self.status = "queued"
+        self.stage = "queued"
+        self.result: Dict[str, Any] = {}
+        self.created = time.time()
+        self.updated = self.created
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def restore(cls, record: Dict[str, Any]) -> "Job":
+        """
+        Rebuilds a (read-only) job from its backend record.
+
+        Args:
+            record (Dict[str, Any]): The job record.
+
+        Returns:
+            Job: The job, without a backend to write changes to.
+        """
+        job = cls(record["job_id"])
+        job.status = record["status"]
+        job.stage = record["stage"]
+        job.result = dict(record["result"])
+        job.created = record["created"]
+        job.updated = record["updated"]
+        return job
+
+    # ----------------------------------------------------------------------
+    def record(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: The job record stored by the backend.
+        """
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "stage": self.stage,
+                "result": dict(self.result),
+                "created": self.created,
+                "updated": self.updated,
+            }
+
+    # ----------------------------------------------------------------------
+    def update(self, stage: Optional[str] = None, **partial: Any) -> None:
+        """
+        Publishes progress: the stage now in progress and/or new partial results.
+
+        Args:
+            stage (Optional[str]): The stage now in progress.
+            **partial (Any): Output fields available so far.
+        """
+        with self._lock:
+            if stage is not None:
+                self.stage = stage
+            self.result.update({k: v for k, v in partial.items() if v is not None})
+            self.updated = time.time()
+        self._publish()
+
+    # ----------------------------------------------------------------------
+    def set_status(self, status: str) -> None:
+        """
+        Args:
+            status (str): The new job status.
+        """
+        with self._lock:
+            self.status = status
+            self.updated = time.time()
+        self._publish()
+
+    # ----------------------------------------------------------------------
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: A consistent copy of the job ID, status, stage and results.
+        """
+        with self._lock:
+            return dict(self.result, job_id=self.job_id, status=self.status, stage=self.stage)
+
+    # ----------------------------------------------------------------------
+    def _publish(self) -> None:
+        if self._backend is None:
+            return
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._save)
+        except RuntimeError:  # not called from a coroutine
+            self._save()
+
+    # ----------------------------------------------------------------------
+    def _save(self) -> None:
+        # Each save writes the latest state, taken under the save lock: saves finishing
+        # out of order never leave an older state behind
+        with self._save_lock:
+            try:
+                self._backend.save(self.record())
+            except Exception as e:
+                logging.warning(f"Could not save job {self.job_id}: {e}")
+
+
+class JobManager:
+    """
+    JobManager runs pipelines in the background on the shared event loop.
+
+    Submitting returns a `Job` at once; at most `workers` pipelines run concurrently
+    and the others wait their turn, while submissions beyond `max_pending` unfinished
+    jobs are refused. Job state goes to `backend` (Redis when sessions are shared, so a
+    poll may reach any worker), which drops finished jobs `ttl` seconds after their
+    last update.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_QUEUE_SIZE, ttl: int = JOB_TTL,
+                 backend: Optional[JobBackend] = None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        if backend is None:
+            backend = RedisJobBackend(ttl=ttl) if JOB_BACKEND == "redis" else InMemoryJobBackend(ttl)
+        self.backend = backend
+        self._active: Dict[str, Job] = {}
+        self._finished = {"completed": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    # ----------------------------------------------------------------------
+    def submit(self, run: Callable[[Job], Awaitable[bool]]) -> Job:
+        """
+        Schedules a pipeline run.
+
+        Args:
+            run (Callable[[Job], Awaitable[bool]]): Runs the pipeline, reporting progress
+                on the job; returns False when the pipeline failed.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            JobQueueFull: When too many jobs are already pending.
+        """
+        with self._lock:
+            if len(self._active) >= self.max_pending:
+                raise JobQueueFull(f"{len(self._active)} jobs already pending")
+            job = Job(uuid.uuid4().hex, self.backend)
+            self._active[job.job_id] = job
+        job._save()
+        asyncio.run_coroutine_threadsafe(self._run(job, run), loop.get_loop())
+        return job
+
+    # ----------------------------------------------------------------------
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Args:
+            job_id (str): The job ID.
+
+        Returns:
+            Optional[Job]: The job, or None when it is unknown or expired.
+        """
+        with self._lock:
+            job = self._active.get(job_id)
+        if job is not None:
+            return job
+        record = self.backend.load(job_id)
+        return Job.restore(record) if record is not None else None
+
+    # ----------------------------------------------------------------------
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: Number of jobs of this worker per status (finished ones
+            counted since startup).
+        """
+        with self._lock:
+            jobs = list(self._active.values())
+            counts = {"queued": 0, "running": 0, **self._finished}
+        for job in jobs:
+            if job.status in ("queued", "running"):
+                counts[job.status] += 1
+        return counts
+
+    # ----------------------------------------------------------------------
+    async def _run(self, job: Job, run: Callable[[Job], Awaitable[bool]]) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)  # created on the loop it is used by
+        status = "failed"
+        try:
+            async with self._slots:
+                job.set_status("running")
+                try:
+                    succeeded = await run(job)
+                except Exception as e:
+                    job.update(stage="failed", message=f"Error: {e}")
+                    succeeded = False
+                status = "completed" if succeeded else "failed"
+        finally:
+            # The final state is saved before the job leaves `_active`, so a poll never
+            # falls back to an older record
+            await asyncio.to_thread(job.set_status, status)
+            with self._lock:
+                del self._active[job.job_id]
+                self._finished[status] += 1
@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Generic, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Seconds spent importing or initializing each subsystem, in the order they happened
+_timings: Dict[str, float] = {}
+_timings_lock = threading.Lock()
+
+
+def record(name: str, seconds: float) -> None:
+    """
+    Records the time spent on a startup step.
+
+    Args:
+        name (str): The step name, e.g. "import:main" or "init:embeddings".
+        seconds (float): The time spent, in seconds.
+    """
+    with _timings_lock:
+        _timings[name] = _timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """
+    Context manager recording the time spent in its block as a startup step.
+
+    Args:
+        name (str): The step name.
+    """
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - began)
+
+
+def startup_report() -> str:
+    """
+    Formats the recorded startup steps, slowest first.
+
+    Returns:
+        str: One line per step with its duration in milliseconds.
+    """
+    with _timings_lock:
+        timings = sorted(_timings.items(), key=lambda item: item[1], reverse=True)
+    lines = [f"{name:<32} {seconds * 1000:>10.1f} ms" for name, seconds in timings]
+    return "Startup timings:\n" + "\n".join(lines)
+
+
+class Lazy(Generic[T]):
+    """
+    Lazy is a thread-safe holder for an expensive subsystem (model, index, client...),
+    created by its factory on first use and timed into the startup report.
+
+    Attributes:
+        name (str): The subsystem name used in the startup report.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, name: str, factory: Callable[[], T]):
+        """
+        Initializes the holder without creating the subsystem.
+
+        Args:
+            name (str): The subsystem name used in the startup report.
+            factory (Callable[[], T]): Creates the subsystem.
+        """
+        self.name = name
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------
+    def get(self) -> T:
+        """
+        Returns the subsystem, creating it on the first call. Concurrent first
+        calls wait for a single initialization.
+
+        Returns:
+            T: The subsystem instance.
+        """
+        if self._ready:
+            return self._value
+        with self._lock:
+            if not self._ready:
+                with timed(f"init:{self.name}"):
+                    self._value = self._factory()
+                self._ready = True
+        return self._value
+
+    # ----------------------------------------------------------------------
+    def set(self, value: T) -> None:
+        """
+        Installs an already created subsystem in place of the factory's, e.g. a local
+        stand-in for benchmarks. Must happen before the first `get`.
+
+        Args:
+            value (T): The subsystem instance.
+        """
+        with self._lock:
+            self._value = value
+            self._ready = True
+
+    # ----------------------------------------------------------------------
+    @property
+    def initialized(self) -> bool:
+        """
+        Returns:
+            bool: True once the subsystem has been created.
+        """
+        return self._ready
+
+
+def warm_up(subsystems: List[Lazy], background: bool = True) -> Optional[threading.Thread]:
+    """
+    Initializes subsystems ahead of the first request, logging the startup report once done.
+
+    Args:
+        subsystems (List[Lazy]): The subsystems to initialize, in order.
+        background (bool): Run on a daemon thread instead of blocking the caller.
+
+    Returns:
+        Optional[threading.Thread]: The warm-up thread when running in the background.
+    """
+    def run():
+        for subsystem in subsystems:
+            try:
+                subsystem.get()
+            except Exception as e:
+                logging.error(f"Warm-up of {subsystem.name} failed: {e}")
+        logging.info(startup_report())
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
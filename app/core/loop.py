@@ -0,0 +1,38 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the process-wide event loop, starting it on a daemon thread on first use.
+
+    Every pipeline coroutine runs on this loop, so waiting on remote apps costs a
+    coroutine rather than a thread per in-flight request.
+
+    Returns:
+        asyncio.AbstractEventLoop: The running background event loop.
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="pipeline-loop", daemon=True).start()
+        return _loop
+
+
+def run(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """
+    Runs a coroutine on the background loop and blocks the calling thread until it finishes.
+
+    Args:
+        coro (Awaitable): The coroutine to run.
+        timeout (Optional[float]): Seconds to wait for the result, or None to wait indefinitely.
+
+    Returns:
+        Any: The value returned by the coroutine.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
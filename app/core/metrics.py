@@ -0,0 +1,496 @@
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as Tally
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Prefix of every exported metric name
+NAMESPACE = "creative_partner"
+# Histogram buckets, in seconds: from fast local steps up to the slowest remote calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Exporters: port of the HTTP /metrics endpoint and/or a file rewritten every interval
+# (e.g. for the node_exporter textfile collector); both are off by default
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "15"))
+# Requests slower than this are logged with their stage breakdown and, when the
+# profiler is enabled, sampled until they finish
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "60"))
+PROFILE_SLOW_REQUESTS = os.getenv("PROFILE_SLOW_REQUESTS", "0") == "1"
+PROFILE_INTERVAL = 0.01
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), "..", "datastore", "profiles")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(values: Dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in values.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Counter is a monotonically increasing value per label set (requests, hits, bytes...).
+
+    Attributes:
+        name (str): The metric name, without the namespace.
+        help (str): The description exported with the metric.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """
+        Args:
+            amount (float): The increment.
+            **labels (Any): The label values of the series.
+        """
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    # ----------------------------------------------------------------------
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(_labels(labels), 0.0)
+
+    # ----------------------------------------------------------------------
+    def render(self) -> List[str]:
+        name = f"{NAMESPACE}_{self.name}"
+        lines = [f"# HELP {name} {self.help}", f"# TYPE {name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        lines.extend(f"{name}{_format_labels(labels)} {_number(value)}" for labels, value in values)
+        return lines
+
+
+class Histogram:
+    """
+    Histogram counts observations (durations, sizes) into cumulative buckets per label set.
+
+    Attributes:
+        name (str): The metric name, without the namespace.
+        help (str): The description exported with the metric.
+        buckets (Tuple[float, ...]): Upper bounds of the buckets, ascending.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, List[float]] = {}  # bucket counts..., +Inf count, sum
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------
+    def observe(self, value: float, **labels: Any) -> None:
+        """
+        Args:
+            value (float): The observed value.
+            **labels (Any): The label values of the series.
+        """
+        key = _labels(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    # ----------------------------------------------------------------------
+    def render(self) -> List[str]:
+        name = f"{NAMESPACE}_{self.name}"
+        lines = [f"# HELP {name} {self.help}", f"# TYPE {name} histogram"]
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        for labels, values in series:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', _number(bound)))} {int(cumulative)}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_number(values[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {int(cumulative)}")
+        return lines
+
+
+class Registry:
+    """
+    Registry holds the process metrics: counters and histograms updated by the code,
+    and gauges read at export time from the `stats()` of the subsystems.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._sources: List[Tuple[str, Callable[[], Dict], Optional[str]]] = []
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------
+    def counter(self, name: str, help: str) -> Counter:
+        """
+        Returns the counter of that name, creating it on first use.
+        """
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help))
+
+    # ----------------------------------------------------------------------
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """
+        Returns the histogram of that name, creating it on first use.
+        """
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help, buckets))
+
+    # ----------------------------------------------------------------------
+    def register_stats(self, name: str, source: Callable[[], Dict], label: Optional[str] = None) -> None:
+        """
+        Exports the numeric values returned by a `stats()` function as gauges named
+        `<name>_<key>`. With `label`, the source returns one dict per item (stage, app...)
+        and the item becomes that label. Sources returning None are skipped, so a lazily
+        created subsystem is not created just to be measured.
+
+        Args:
+            name (str): Prefix of the gauge names, e.g. "artifact_store".
+            source (Callable[[], Dict]): Returns the current values.
+            label (Optional[str]): Label name of the items of a nested source.
+        """
+        with self._lock:
+            self._sources.append((name, source, label))
+
+    # ----------------------------------------------------------------------
+    def render(self) -> str:
+        """
+        Returns:
+            str: Every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            sources = list(self._sources)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for name, source, label in sources:
+            try:
+                stats = source()
+            except Exception as e:
+                logging.warning(f"Metrics source {name} failed: {e}")
+                continue
+            if not stats:
+                continue
+            rows = stats.items() if label else [(None, stats)]
+            gauges: Dict[str, List[str]] = {}
+            for item, values in rows:
+                labels = _labels({label: item}) if label else ()
+                for key, value in values.items():
+                    if isinstance(value, bool):
+                        value = int(value)
+                    if not isinstance(value, (int, float)):
+                        continue
+                    gauges.setdefault(key, []).append(f"{NAMESPACE}_{name}_{key}{_format_labels(labels)} {_number(value)}")
+            for key, samples in gauges.items():
+                lines.append(f"# TYPE {NAMESPACE}_{name}_{key} gauge")
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+def lazy_stats(subsystem) -> Callable[[], Optional[Dict]]:
+    """
+    Returns a `register_stats` source reading the `stats()` of a `Lazy` subsystem
+    once it exists, without creating it.
+
+    Args:
+        subsystem (Lazy): The holder of the subsystem.
+    """
+    return lambda: subsystem.get().stats() if subsystem.initialized else None
+
+
+# Process-wide registry and the pipeline metrics
+registry = Registry()
+STAGE_SECONDS = registry.histogram("stage_seconds", "Time spent in each pipeline stage")
+REQUEST_SECONDS = registry.histogram("request_seconds", "End-to-end time of the pipeline requests")
+REQUESTS = registry.counter("requests_total", "Pipeline requests by outcome")
+
+
+# ----------------------------------------------------------------------
+# Traces and spans
+# ----------------------------------------------------------------------
+class Trace:
+    """
+    Trace collects the spans of one request. It follows the request through its
+    coroutines and `asyncio.to_thread` calls (the context is copied to them).
+
+    Attributes:
+        label (str): Identifies the request in logs and profiles.
+        started (float): `time.monotonic()` at the start of the request.
+        spans (List[Tuple[str, float, float]]): Stage, start offset and duration, in seconds.
+        outcome (str): Reported in the request metrics; "error" unless set by the caller.
+        samples (Tally): Collapsed stacks sampled by the profiler, with their counts.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, label: str):
+        self.label = label
+        self.started = time.monotonic()
+        self.spans: List[Tuple[str, float, float]] = []
+        self.outcome = "error"
+        self.samples: Tally = Tally()
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------
+    def add(self, stage: str, began: float, seconds: float) -> None:
+        with self._lock:
+            self.spans.append((stage, began - self.started, seconds))
+
+    # ----------------------------------------------------------------------
+    def breakdown(self) -> str:
+        """
+        Returns:
+            str: The spans in start order, e.g. "enhance=+0.01s/1.20s, image=+1.21s/4.02s".
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span[1])
+        return ", ".join(f"{stage}=+{offset:.2f}s/{seconds:.2f}s" for stage, offset, seconds in spans)
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Context manager timing a pipeline stage into the `stage_seconds` histogram and the
+    current request's trace. Usable around `await`s as well as in worker threads.
+
+    Args:
+        stage (str): The stage name, e.g. "memory_fetch" or "text_to_image".
+    """
+    began = time.monotonic()
+    try:
+        yield
+    finally:
+        seconds = time.monotonic() - began
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        current = _trace.get()
+        if current is not None:
+            current.add(stage, began, seconds)
+
+
+@contextmanager
+def trace(label: str) -> Iterator[Trace]:
+    """
+    Context manager tracing one request: its spans are collected, its duration and
+    outcome recorded, and, when it exceeds `SLOW_REQUEST_SECONDS`, its breakdown is
+    logged (and its profile written when profiling is enabled).
+
+    Args:
+        label (str): Identifies the request in logs and profiles.
+
+    Returns:
+        Trace: The trace; set its `outcome` before leaving the block.
+    """
+    current = Trace(label)
+    token = _trace.set(current)
+    if profiler is not None:
+        profiler.start(current)
+    try:
+        yield current
+    finally:
+        _trace.reset(token)
+        seconds = time.monotonic() - current.started
+        REQUEST_SECONDS.observe(seconds, outcome=current.outcome)
+        REQUESTS.inc(outcome=current.outcome)
+        if profiler is not None:
+            profiler.finish(current)
+        if seconds >= SLOW_REQUEST_SECONDS:
+            logging.warning(f"Slow request {label} ({seconds:.1f}s): {current.breakdown()}")
+
+
+# ----------------------------------------------------------------------
+# Sampling profiler
+# ----------------------------------------------------------------------
+class SlowRequestProfiler:
+    """
+    SlowRequestProfiler samples the Python stacks of the process while a request runs
+    past `threshold`, and writes them in collapsed-stack format (one "frame;frame;...
+    count" line per stack, readable by flamegraph tools) when the request finishes.
+
+    Nothing is sampled while every request is fast. A request's coroutines share the
+    event loop and worker threads with other requests, so every thread is sampled and
+    concurrent requests show up in the profile too.
+
+    Attributes:
+        threshold (float): Request age in seconds after which sampling starts.
+        interval (float): Seconds between two samples.
+        directory (str): Where the profiles are written.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, threshold: float = SLOW_REQUEST_SECONDS, interval: float = PROFILE_INTERVAL,
+                 directory: str = PROFILE_DIR, max_depth: int = 64):
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = directory
+        self.max_depth = max_depth
+        self._active: Dict[int, Trace] = {}
+        self._finished: List[Tuple[str, str, List[Tuple[str, int]]]] = []  # (label, path, samples) to write
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # ----------------------------------------------------------------------
+    def start(self, current: Trace) -> None:
+        with self._lock:
+            self._active[id(current)] = current
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_forever, name="profiler", daemon=True)
+                self._thread.start()
+
+    # ----------------------------------------------------------------------
+    def finish(self, current: Trace) -> Optional[str]:
+        """
+        Stops sampling a request and hands its profile, if any samples were taken, to
+        the sampler thread: this runs on the event loop, which must not wait on disk.
+
+        Returns:
+            Optional[str]: The path the profile is written to.
+        """
+        with self._lock:
+            self._active.pop(id(current), None)
+            if not current.samples:
+                return None
+            samples = current.samples.most_common()
+            name = "".join(c if c.isalnum() or c in "-_" else "_" for c in current.label)
+            path = os.path.join(self.directory, f"{int(time.time() * 1000)}-{name}.folded")
+            self._finished.append((current.label, path, samples))
+        return path
+
+    # ----------------------------------------------------------------------
+    def _sample_forever(self) -> None:
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            with self._lock:
+                slow = [t for t in self._active.values() if now - t.started >= self.threshold]
+                finished, self._finished = self._finished, []
+            for label, path, samples in finished:
+                self._write(label, path, samples)
+            if not slow:
+                continue
+            stacks = [self._collapse(frame) for ident, frame in sys._current_frames().items() if ident != own]
+            with self._lock:
+                for current in slow:
+                    current.samples.update(stacks)
+
+    # ----------------------------------------------------------------------
+    def _write(self, label: str, path: str, samples: List[Tuple[str, int]]) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in samples:
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            logging.warning(f"Could not write the profile of slow request {label}: {e}")
+            return
+        logging.warning(f"Profile of slow request {label} written to {path}")
+
+    # ----------------------------------------------------------------------
+    def _collapse(self, frame) -> str:
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+
+profiler: Optional[SlowRequestProfiler] = SlowRequestProfiler() if PROFILE_SLOW_REQUESTS else None
+
+
+# ----------------------------------------------------------------------
+# Exporters
+# ----------------------------------------------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scraped every few seconds
+
+
+def write_metrics(path: str) -> None:
+    """
+    Writes the current metrics to a file, atomically so readers never see a partial file.
+
+    Args:
+        path (str): The destination file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(path + ".tmp", path)
+
+
+def start_exporters(port: int = METRICS_PORT, path: str = METRICS_FILE,
+                    interval: float = METRICS_INTERVAL) -> None:
+    """
+    Starts the configured exporters on daemon threads: an HTTP server answering
+    `GET /metrics` when `port` is set, and a file rewritten every `interval` seconds
+    when `path` is set.
+
+    Args:
+        port (int): Port of the HTTP endpoint, or 0 to disable it.
+        path (str): Path of the metrics file, or "" to disable it.
+        interval (float): Seconds between two writes of the file.
+    """
+    if port:
+        server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info(f"Metrics served on :{port}/metrics")
+
+    if path:
+        def write_forever():
+            while True:
+                try:
+                    write_metrics(path)
+                except OSError as e:
+                    logging.warning(f"Could not write metrics to {path}: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=write_forever, name="metrics-file", daemon=True).start()
+        logging.info(f"Metrics written to {path} every {interval:.0f}s")
@@ -1,8 +1,12 @@
-from typing import Optional, Union
+import asyncio
+import time
+from typing import Optional, Tuple, Union
 
 from openfabric_pysdk.helper import Proxy
 from openfabric_pysdk.helper.proxy import ExecutionResult
 
+from core.resilience import DeadlineExceeded, RemoteAppFailed
+
 
 class Remote:
     """
@@ -14,8 +18,12 @@ class Remote:
         proxy_url (str): The URL to the proxy service.
         proxy_tag (Optional[str]): An optional tag to identify a specific proxy instance.
         client (Optional[Proxy]): The initialized proxy client instance.
+        failures (int): Number of consecutive failed requests since the last success.
     """
 
+    # Consecutive failures after which the connection is considered unhealthy
+    MAX_FAILURES = 3
+
     # ----------------------------------------------------------------------
     def __init__(self, proxy_url: str, proxy_tag: Optional[str] = None):
         """
@@ -28,6 +36,7 @@ class Remote:
         self.proxy_url = proxy_url
         self.proxy_tag = proxy_tag
         self.client: Optional[Proxy] = None
+        self.failures = 0
 
     # ----------------------------------------------------------------------
     def connect(self) -> 'Remote':
@@ -38,8 +47,33 @@ class Remote:
             Remote: The current instance for chaining.
         """
         self.client = Proxy(self.proxy_url, self.proxy_tag, ssl_verify=False)
+        self.failures = 0
         return self
 
+    # ----------------------------------------------------------------------
+    def is_healthy(self) -> bool:
+        """
+        Checks whether the connection can be reused for further requests.
+
+        Returns:
+            bool: True if connected and below the consecutive failure threshold.
+        """
+        return self.client is not None and self.failures < Remote.MAX_FAILURES
+
+    # ----------------------------------------------------------------------
+    def mark_success(self) -> None:
+        """
+        Resets the consecutive failure counter after a completed request.
+        """
+        self.failures = 0
+
+    # ----------------------------------------------------------------------
+    def mark_failure(self) -> None:
+        """
+        Records a failed request, eventually flagging the connection as unhealthy.
+        """
+        self.failures += 1
+
     # ----------------------------------------------------------------------
     def execute(self, inputs: dict, uid: str) -> Union[ExecutionResult, None]:
         """
@@ -59,29 +93,113 @@ class Remote:
 
     # ----------------------------------------------------------------------
     @staticmethod
-    def get_response(output: ExecutionResult) -> Union[dict, None]:
+    def get_response(output: ExecutionResult, deadline: Optional[float] = None, app_id: str = "",
+                     poll_interval: float = 0.05, max_poll_interval: float = 1.0) -> Union[dict, None]:
         """
-        Waits for the result and processes the output.
+        Waits for the result and processes the output. Without a deadline it blocks until
+        the request finishes; with one it polls the status until the deadline.
 
         Args:
             output (ExecutionResult): The result returned from a proxy request.
+            deadline (Optional[float]): `time.monotonic()` timestamp to give up at.
+            app_id (str): The app the request was sent to, for error reporting.
+            poll_interval (float): Initial delay in seconds between status checks.
+            max_poll_interval (float): Upper bound in seconds for the delay between checks.
 
         Returns:
             Union[dict, None]: The response data if successful, None otherwise.
 
         Raises:
-            Exception: If the request failed or was cancelled.
+            RemoteAppFailed: If the request failed or was cancelled.
+            DeadlineExceeded: If the request did not finish before the deadline.
         """
         if output is None:
             return None
 
-        output.wait()
+        if deadline is None:
+            output.wait()
+            return Remote._result(output, app_id)[1]
+
+        while True:
+            finished, result = Remote._result(output, app_id)
+            if finished:
+                return result
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise DeadlineExceeded(app_id, "no result before the deadline")
+            time.sleep(min(poll_interval, left))
+            poll_interval = min(poll_interval * 2, max_poll_interval)
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def _result(output: ExecutionResult, app_id: str) -> Tuple[bool, Union[dict, None]]:
+        """
+        Returns whether the request is finished, with its response data once completed.
+        """
         status = str(output.status()).lower()
         if status == "completed":
-            return output.data()
+            return True, output.data()
         if status in ("cancelled", "failed"):
-            raise Exception("The request to the proxy app failed or was cancelled!")
-        return None
+            raise RemoteAppFailed(app_id, f"The request to the proxy app {status}")
+        return False, None
+
+    # ----------------------------------------------------------------------
+    async def execute_async(self, inputs: dict, uid: str, deadline: Optional[float] = None) -> Union[dict, None]:
+        """
+        Sends a request using the proxy client and awaits its result without blocking a thread.
+
+        Args:
+            inputs (dict): The input payload to send to the proxy.
+            uid (str): A unique identifier for the request.
+            deadline (Optional[float]): `time.monotonic()` timestamp to give up at.
+
+        Returns:
+            Union[dict, None]: The response data if successful, None if not connected.
+
+        Raises:
+            RemoteAppFailed: If the request failed or was cancelled.
+            DeadlineExceeded: If the request did not finish before the deadline.
+        """
+        return await Remote.get_response_async(self.execute(inputs, uid), deadline=deadline, app_id=self.proxy_url)
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    async def get_response_async(output: ExecutionResult, poll_interval: float = 0.05,
+                                 max_poll_interval: float = 1.0, deadline: Optional[float] = None,
+                                 app_id: str = "") -> Union[dict, None]:
+        """
+        Awaits the result of a proxy request by polling its status on the event loop,
+        backing off from `poll_interval` up to `max_poll_interval` between checks.
+
+        Args:
+            output (ExecutionResult): The result returned from a proxy request.
+            poll_interval (float): Initial delay in seconds between status checks.
+            max_poll_interval (float): Upper bound in seconds for the delay between checks.
+            deadline (Optional[float]): `time.monotonic()` timestamp to give up at.
+            app_id (str): The app the request was sent to, for error reporting.
+
+        Returns:
+            Union[dict, None]: The response data if successful, None otherwise.
+
+        Raises:
+            RemoteAppFailed: If the request failed or was cancelled.
+            DeadlineExceeded: If the request did not finish before the deadline.
+        """
+        if output is None:
+            return None
+
+        while True:
+            finished, result = Remote._result(output, app_id)
+            if finished:
+                return result
+            delay = poll_interval
+            if deadline is not None:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise DeadlineExceeded(app_id, "no result before the deadline")
+                delay = min(delay, left)
+            await asyncio.sleep(delay)
+            poll_interval = min(poll_interval * 2, max_poll_interval)
 
     # ----------------------------------------------------------------------
     def execute_sync(self, inputs: dict, configs: dict, uid: str) -> Union[dict, None]:
@@ -100,4 +218,4 @@ class Remote:
             return None
 
         output = self.client.execute(inputs, configs, uid)
-        return Remote.get_response(output)
+        return Remote.get_response(output, app_id=self.proxy_url)
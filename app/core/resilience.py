@@ -0,0 +1,242 @@
+import contextvars
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+# Default end-to-end budget of a remote app call (seconds), including retries
+REMOTE_TIMEOUT = float(os.getenv("REMOTE_TIMEOUT", "300"))
+# Attempts per call and the jittered exponential backoff between them (seconds)
+REMOTE_RETRIES = int(os.getenv("REMOTE_RETRIES", "3"))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+# Start a duplicate request once an attempt is slower than this latency percentile
+# of the app (0 disables hedging, as it doubles the load on slow calls)
+HEDGE_PERCENTILE = float(os.getenv("REMOTE_HEDGE_PERCENTILE", "0"))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# Consecutive failures that open an app's circuit, and how long it stays open (seconds)
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+
+
+class RemoteCallError(Exception):
+    """
+    Base class of the errors raised by remote app calls.
+
+    Attributes:
+        app_id (str): The app the call was sent to.
+    """
+
+    def __init__(self, app_id: str, message: str):
+        super().__init__(f"[{app_id}] {message}")
+        self.app_id = app_id
+
+
+class RemoteAppFailed(RemoteCallError):
+    """The app reported a failed or cancelled execution, or could not be reached."""
+
+
+class DeadlineExceeded(RemoteCallError):
+    """The call did not complete within its deadline."""
+
+
+class CircuitOpen(RemoteCallError):
+    """The app failed repeatedly and calls to it are shed until its circuit closes."""
+
+
+# ----------------------------------------------------------------------
+# Deadlines
+# ----------------------------------------------------------------------
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[float]:
+    """
+    Context manager bounding every remote call made in its block (including from
+    coroutines and `asyncio.to_thread` calls started there) by a common deadline.
+    Nested scopes can only shorten the deadline.
+
+    Args:
+        seconds (float): The time budget of the block.
+
+    Returns:
+        float: The deadline, as a `time.monotonic()` timestamp.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def resolve_deadline(timeout: Optional[float] = None) -> float:
+    """
+    Computes the deadline of a call: the earliest of its own timeout and the
+    enclosing `deadline_scope`, or `REMOTE_TIMEOUT` when neither is set.
+
+    Args:
+        timeout (Optional[float]): The call's own time budget, in seconds.
+
+    Returns:
+        float: The deadline, as a `time.monotonic()` timestamp.
+    """
+    candidates = [d for d in (_deadline.get(),) if d is not None]
+    if timeout is not None:
+        candidates.append(time.monotonic() + timeout)
+    return min(candidates) if candidates else time.monotonic() + REMOTE_TIMEOUT
+
+
+def remaining(deadline: float) -> float:
+    """
+    Returns:
+        float: Seconds left until the deadline (negative once it has passed).
+    """
+    return deadline - time.monotonic()
+
+
+# ----------------------------------------------------------------------
+# Retries
+# ----------------------------------------------------------------------
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """
+    "Full jitter" exponential backoff: a random delay between 0 and base * 2^attempt
+    (capped), so clients retrying the same failure do not retry in lockstep.
+
+    Args:
+        attempt (int): The number of attempts made so far (1 for the first retry).
+
+    Returns:
+        float: The delay before the next attempt, in seconds.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# ----------------------------------------------------------------------
+# Latency tracking for hedged requests
+# ----------------------------------------------------------------------
+class LatencyTracker:
+    """
+    LatencyTracker keeps the latencies of the last successful calls of an app and
+    derives the delay after which a duplicate (hedged) request is sent.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    # ----------------------------------------------------------------------
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Args:
+            p (float): The percentile, between 0 and 100.
+
+        Returns:
+            Optional[float]: The latency percentile, or None with too few samples.
+        """
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    # ----------------------------------------------------------------------
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Returns:
+            Optional[float]: Seconds after which to hedge, or None when hedging is off.
+        """
+        if HEDGE_PERCENTILE <= 0:
+            return None
+        return self.percentile(HEDGE_PERCENTILE)
+
+
+# ----------------------------------------------------------------------
+# Circuit breaker
+# ----------------------------------------------------------------------
+class CircuitBreaker:
+    """
+    CircuitBreaker sheds the calls to an app after `failures` consecutive failures.
+    Once `reset_after` seconds have passed a single probe call is let through
+    (half-open): its success closes the circuit, its failure opens it again. A probe
+    holds its lease for `reset_after` seconds: if it never reports back, the next call
+    after that becomes the probe.
+
+    Attributes:
+        app_id (str): The app the breaker protects.
+        state (str): "closed", "open" or "half-open".
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, app_id: str, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET):
+        self.app_id = app_id
+        self.max_failures = failures
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------
+    def allow(self) -> None:
+        """
+        Lets a call through, or sheds it.
+
+        Raises:
+            CircuitOpen: When the circuit is open, or half-open with a probe in flight.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return
+            now = time.monotonic()
+            if now - self.opened_at >= self.reset_after:
+                self.state = "half-open"  # this call is the probe
+                self.opened_at = now
+                return
+            state, failures = self.state, self.failures
+        raise CircuitOpen(self.app_id, f"circuit {state} after {failures} consecutive failures")
+
+    # ----------------------------------------------------------------------
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    # ----------------------------------------------------------------------
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.max_failures:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    # ----------------------------------------------------------------------
+    def release(self) -> None:
+        """
+        Gives up the probe of a call that ended without an outcome (e.g. cancelled):
+        the next call becomes the probe.
+        """
+        with self._lock:
+            if self.state == "half-open":
+                self.state = "open"
+                self.opened_at = time.monotonic() - self.reset_after
+
+    # ----------------------------------------------------------------------
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Root directory of the cache entries
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "datastore", "result_cache")
+# Upper bound of the number of entries, least recently used entries are evicted beyond it
+CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "100000"))
+
+
+class ResultCache:
+    """
+    ResultCache maps the input of a pipeline stage to the artifacts it produced.
+
+    Each entry is a small JSON file named after a SHA-256 key, holding the artifact ID
+    of each binary output field: the content itself is kept once, by the `ArtifactStore`,
+    which may evict it (the caller then treats the entry as a miss). Entries are evicted
+    in least-recently-used order beyond `max_entries`; access order survives restarts
+    through the files' mtimes.
+
+    Attributes:
+        root (str): Directory holding the cache entries.
+        max_entries (int): Maximum number of entries.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that found nothing.
+        evictions (int): Number of entries removed to stay under `max_entries`.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, root: str = CACHE_DIR, max_entries: int = CACHE_MAX_ENTRIES):
+        """
+        Initializes the cache, indexing the entries already present on disk.
+
+        Args:
+            root (str): Directory holding the cache entries.
+            max_entries (int): Maximum number of entries.
+        """
+        self.root = root
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def key(*parts: str) -> str:
+        """
+        Builds a cache key from the parts identifying a stage's input.
+
+        Args:
+            *parts (str): Stage name, app ID, schema version, content or content hash...
+
+        Returns:
+            str: The hex SHA-256 digest of the parts.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    # ----------------------------------------------------------------------
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """
+        Looks up a cache entry, marking it as most recently used.
+
+        Args:
+            key (str): The entry key.
+
+        Returns:
+            Optional[Dict[str, str]]: The artifact ID of each output field, or None on a miss.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                fields = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Result cache entry {key} unreadable, dropping it: {e}")
+            self.discard(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return fields
+
+    # ----------------------------------------------------------------------
+    def put(self, key: str, fields: Dict[str, str]) -> None:
+        """
+        Stores the artifact IDs of a stage output, then evicts old entries if needed.
+        The entry is written to a temporary file renamed into place, so readers never
+        see a partial entry.
+
+        Args:
+            key (str): The entry key.
+            fields (Dict[str, str]): Output field names mapped to their artifact IDs.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(fields, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not store result cache entry {key}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self._entries[key] = None
+            self._entries.move_to_end(key)
+        self._evict()
+
+    # ----------------------------------------------------------------------
+    def discard(self, key: str) -> None:
+        """
+        Removes an entry, e.g. one whose artifacts are no longer stored.
+
+        Args:
+            key (str): The entry key.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    # ----------------------------------------------------------------------
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters.
+
+        Returns:
+            Dict[str, int]: Hits, misses, evictions and number of entries.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
+
+    # ----------------------------------------------------------------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    # ----------------------------------------------------------------------
+    def _scan(self) -> None:
+        """
+        Rebuilds the LRU order from the entries on disk, oldest access first.
+        """
+        found = []
+        for shard in os.listdir(self.root):
+            shard_path = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                path = os.path.join(shard_path, name)
+                if os.path.isdir(path):
+                    # Entry of the older format, holding the content itself
+                    shutil.rmtree(path, ignore_errors=True)
+                elif name.endswith(".tmp"):
+                    os.remove(path)
+                elif name.endswith(".json"):
+                    found.append((os.path.getmtime(path), name[:-len(".json")]))
+
+        for _, key in sorted(found):
+            self._entries[key] = None
+        self._evict()
+
+    # ----------------------------------------------------------------------
+    def _evict(self) -> None:
+        while True:
+            with self._lock:
+                if len(self._entries) <= self.max_entries:
+                    return
+                key = next(iter(self._entries))
+            self.discard(key)
+            with self._lock:
+                self.evictions += 1
@@ -0,0 +1,203 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+# Per-stage capacity: concurrent runs, longest acceptable queue wait (seconds) and queue length
+STAGE_LIMITS = {
+    "llm": int(os.getenv("STAGE_LIMIT_LLM", "2")),
+    "image": int(os.getenv("STAGE_LIMIT_IMAGE", "4")),
+    "model": int(os.getenv("STAGE_LIMIT_MODEL", "2")),
+}
+STAGE_MAX_WAIT = {
+    "llm": float(os.getenv("STAGE_MAX_WAIT_LLM", "30")),
+    "image": float(os.getenv("STAGE_MAX_WAIT_IMAGE", "120")),
+    "model": float(os.getenv("STAGE_MAX_WAIT_MODEL", "300")),
+}
+STAGE_MAX_QUEUE = int(os.getenv("STAGE_MAX_QUEUE", "100"))
+# Weight of the latest run in the moving average of the service time
+SERVICE_TIME_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a stage refuses a request because it could not start within its deadline."""
+
+
+class Stage:
+    """
+    Stage bounds the concurrency of one pipeline stage.
+
+    Requests beyond `limit` wait in per-user FIFO queues served round-robin, so a user
+    submitting a burst does not delay everybody else. A request is shed at once when
+    the queue is full or the expected wait (queue length / limit x average service
+    time) exceeds `max_wait`, and shed later if it actually waited that long.
+    Stages are only used from the shared event loop (see `core.loop`), so they need no lock.
+
+    Attributes:
+        name (str): The stage name.
+        limit (int): Maximum number of concurrent runs.
+        max_wait (float): Longest acceptable queue wait, in seconds.
+        max_queue (int): Maximum number of waiting requests.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, name: str, limit: int, max_wait: float, max_queue: int = STAGE_MAX_QUEUE):
+        self.name = name
+        self.limit = limit
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.running = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self.service_time = 0.0  # moving average, in seconds
+        self.total_wait = 0.0
+        self.max_waited = 0.0
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._queued = 0
+
+    # ----------------------------------------------------------------------
+    @asynccontextmanager
+    async def slot(self, user: str) -> AsyncIterator[None]:
+        """
+        Waits for a free slot of the stage (in fair order) and holds it for the block.
+
+        Args:
+            user (str): The user the request belongs to.
+
+        Raises:
+            Overloaded: When the request cannot start within `max_wait`.
+        """
+        queued_at = time.monotonic()
+        await self._acquire(user or "", queued_at)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            if self.service_time:
+                self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+            else:
+                self.service_time = elapsed
+            self._release()
+
+    # ----------------------------------------------------------------------
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns:
+            Dict[str, float]: Running and queued requests, admission counters and wait times.
+        """
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "queued": self._queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "avg_wait": self.total_wait / self.admitted if self.admitted else 0.0,
+            "max_wait": self.max_waited,
+            "service_time": self.service_time,
+        }
+
+    # ----------------------------------------------------------------------
+    async def _acquire(self, user: str, queued_at: float) -> None:
+        if self.running < self.limit and not self._queued:
+            self.running += 1
+            self._admit(0.0)
+            return
+
+        expected_wait = (self._queued + 1) / self.limit * self.service_time
+        if self._queued >= self.max_queue or expected_wait > self.max_wait:
+            self.shed += 1
+            raise Overloaded(f"Stage {self.name} is overloaded ({self._queued} waiting), try again later")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user, deque()).append(waiter)
+        self._queued += 1
+        try:
+            done, _ = await asyncio.wait({waiter}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            if waiter.done():
+                self._release()  # the slot was handed over just before the cancellation
+            else:
+                self._dequeue(user, waiter)
+            raise
+        if not done:
+            self._dequeue(user, waiter)
+            self.timed_out += 1
+            raise Overloaded(f"Stage {self.name} could not start within {self.max_wait:.0f}s, try again later")
+        self._admit(time.monotonic() - queued_at)
+
+    # ----------------------------------------------------------------------
+    def _admit(self, waited: float) -> None:
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_waited = max(self.max_waited, waited)
+
+    # ----------------------------------------------------------------------
+    def _dequeue(self, user: str, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        queue = self._queues.get(user)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue:
+                del self._queues[user]
+
+    # ----------------------------------------------------------------------
+    def _release(self) -> None:
+        """
+        Hands the slot to the next waiting request, taking users in turn.
+        """
+        while self._queues:
+            user, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            if not waiter.done():
+                waiter.set_result(None)  # the slot passes on without freeing it
+                return
+        self.running -= 1
+
+
+class Scheduler:
+    """
+    Scheduler holds one `Stage` per pipeline stage, so each stage runs at its own
+    capacity (local LLM, text-to-image and image-to-3D apps) instead of every request
+    hitting all of them at once.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, limits: Dict[str, int] = None, max_wait: Dict[str, float] = None):
+        limits = limits or STAGE_LIMITS
+        max_wait = max_wait or STAGE_MAX_WAIT
+        self.stages = {name: Stage(name, limit, max_wait.get(name, 60.0)) for name, limit in limits.items()}
+
+    # ----------------------------------------------------------------------
+    def slot(self, stage: str, user: str):
+        """
+        Args:
+            stage (str): The stage name ("llm", "image" or "model").
+            user (str): The user the request belongs to.
+
+        Returns:
+            An async context manager holding a slot of the stage.
+        """
+        return self.stages[stage].slot(user)
+
+    # ----------------------------------------------------------------------
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns:
+            Dict[str, Dict[str, float]]: The queue metrics of every stage.
+        """
+        return {name: stage.stats() for name, stage in self.stages.items()}
+
+
+# Process-wide scheduler shared by every pipeline run
+scheduler = Scheduler()
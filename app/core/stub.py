@@ -1,10 +1,21 @@
+import asyncio
+import hashlib
 import json
 import logging
-from typing import Any, Dict, List, Literal, Tuple
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Literal, NamedTuple, Optional, Tuple, Type
 
 import requests
 
 from core.remote import Remote
+from core.resilience import (
+    REMOTE_RETRIES, CircuitBreaker, DeadlineExceeded, LatencyTracker, RemoteAppFailed, RemoteCallError,
+    backoff_delay, remaining, resolve_deadline
+)
+from openfabric_pysdk.fields import Resource
 from openfabric_pysdk.helper import has_resource_fields, json_schema_to_marshmallow, resolve_resources
 from openfabric_pysdk.loader import OutputSchemaInst
 
@@ -14,90 +25,541 @@ Schemas = Dict[str, Tuple[dict, dict]]
 Connections = Dict[str, Remote]
 
 
+class CompiledSchema(NamedTuple):
+    """
+    Output schema of an app compiled once and reused by every call.
+
+    Attributes:
+        fingerprint (str): Hash of the JSON schema the entry was compiled from.
+        marshmallow (type): The marshmallow class generated from the JSON schema.
+        instance (Any): A single instance of the marshmallow class.
+        resource_fields (List[str]): Names of the top-level fields holding resources.
+        has_resources (bool): Whether results must go through resource resolution.
+    """
+    fingerprint: str
+    marshmallow: type
+    instance: Any
+    resource_fields: List[str]
+    has_resources: bool
+
+
+# Seconds after which manifests and schemas are re-fetched from the app
+SCHEMA_TTL = int(os.getenv("STUB_SCHEMA_TTL", "3600"))
+# On-disk copy of manifests and schemas, used to skip the fetch on restarts
+SCHEMA_CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "datastore", "schemas")
+# Scheme of the apps' HTTP endpoints (manifest, schemas, resources); their WebSocket
+# endpoint uses the matching "wss" or "ws". Plain "http" is only meant for local stand-ins.
+APP_SCHEME = os.getenv("OPENFABRIC_SCHEME", "https")
+# Longest download of a resource (seconds), further bounded by the caller's deadline
+RESOURCE_TIMEOUT = 60
+
+
 class Stub:
     """
     Stub acts as a lightweight client interface that initializes remote connections
     to multiple Openfabric applications, fetching their manifests, schemas, and enabling
     execution of calls to these apps.
 
+    A single Stub is meant to live for the whole process: apps are registered once
+    (concurrently), their manifests and schemas are refreshed in the background once
+    older than the TTL, and connections are reused across calls as long as they are healthy.
+
     Attributes:
         _schema (Schemas): Stores input/output schemas for each app ID.
         _manifest (Manifests): Stores manifest metadata for each app ID.
         _connections (Connections): Stores active Remote connections for each app ID.
+        _loaded_at (Dict[str, float]): Time at which each app's manifest and schemas were fetched.
+        _compiled (Dict[Tuple[str, str], CompiledSchema]): Compiled output schemas keyed by
+            app ID and schema fingerprint.
+        _breakers (Dict[str, CircuitBreaker]): Circuit breaker of each app ID.
+        _latencies (Dict[str, LatencyTracker]): Recent call latencies of each app ID.
+        remote_class (Type[Remote]): The connection class, replaceable by a local stand-in.
     """
 
+    remote_class: Type[Remote] = Remote
+
     # ----------------------------------------------------------------------
-    def __init__(self, app_ids: List[str]):
+    def __init__(self, app_ids: Optional[List[str]] = None, ttl: int = SCHEMA_TTL,
+                 cache_dir: Optional[str] = SCHEMA_CACHE_DIR):
         """
         Initializes the Stub instance by loading manifests, schemas, and connections
         for each given app ID.
 
         Args:
-            app_ids (List[str]): A list of application identifiers (hostnames or URLs).
+            app_ids (Optional[List[str]]): A list of application identifiers (hostnames or URLs).
+            ttl (int): Seconds after which manifests and schemas are considered stale.
+            cache_dir (Optional[str]): Directory of the on-disk schema cache, or None to disable it.
         """
         self._schema: Schemas = {}
         self._manifest: Manifests = {}
         self._connections: Connections = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._compiled: Dict[Tuple[str, str], CompiledSchema] = {}
+        self._refreshing: set = set()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self._lock = threading.RLock()
+        self._http = requests.Session()
+        self.ttl = ttl
+        self.retries = REMOTE_RETRIES
+        self.cache_dir = cache_dir
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self.register(app_ids or [])
+
+    # ----------------------------------------------------------------------
+    def register(self, app_ids: List[str]) -> None:
+        """
+        Loads every app ID that is not known yet. Apps are initialized concurrently,
+        so warming several apps costs roughly as much as warming the slowest one.
+
+        Args:
+            app_ids (List[str]): A list of application identifiers (hostnames or URLs).
+        """
+        with self._lock:
+            pending = [app_id for app_id in dict.fromkeys(app_ids) if app_id not in self._schema]
+        if not pending:
+            return
+
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            list(pool.map(self._load, pending))
+
+    # ----------------------------------------------------------------------
+    def refresh(self, app_id: str) -> None:
+        """
+        Re-fetches the manifest and schemas of an app, bypassing every cache.
+
+        Args:
+            app_id (str): The application ID to refresh.
+        """
+        try:
+            manifest, input_schema, output_schema = self._fetch(app_id)
+            self._store(app_id, manifest, input_schema, output_schema, time.time())
+            self._write_cache(app_id, manifest, input_schema, output_schema)
+        except Exception as e:
+            logging.error(f"[{app_id}] Refresh failed, keeping previous schema: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(app_id)
+
+    # ----------------------------------------------------------------------
+    def _load(self, app_id: str) -> None:
+        """
+        Initializes a single app: schemas come from the on-disk cache when it is fresh,
+        from the app otherwise (falling back to a stale cache if the app is unreachable).
+        """
+        try:
+            cached = self._read_cache(app_id)
+            if cached and time.time() - cached["fetched_at"] < self.ttl:
+                manifest, input_schema, output_schema = cached["manifest"], cached["input"], cached["output"]
+                fetched_at = cached["fetched_at"]
+                logging.info(f"[{app_id}] Manifest and schemas loaded from cache.")
+            else:
+                try:
+                    manifest, input_schema, output_schema = self._fetch(app_id)
+                    fetched_at = time.time()
+                    self._write_cache(app_id, manifest, input_schema, output_schema)
+                except Exception:
+                    if not cached:
+                        raise
+                    logging.warning(f"[{app_id}] Fetch failed, using stale cached schemas.")
+                    manifest, input_schema, output_schema = cached["manifest"], cached["input"], cached["output"]
+                    fetched_at = cached["fetched_at"]
+
+            self._store(app_id, manifest, input_schema, output_schema, fetched_at)
+            self._connect(app_id)
+        except Exception as e:
+            logging.error(f"[{app_id}] Initialization failed: {e}")
+
+    # ----------------------------------------------------------------------
+    def _fetch(self, app_id: str) -> Tuple[dict, dict, dict]:
+        """
+        Fetches the manifest, input and output schema of an app over HTTP.
+        """
+        base_url = app_id.strip('/')
+
+        manifest = self._http.get(f"{APP_SCHEME}://{base_url}/manifest", timeout=5).json()
+        logging.info(f"[{app_id}] Manifest loaded: {manifest}")
+
+        input_schema = self._http.get(f"{APP_SCHEME}://{base_url}/schema?type=input", timeout=5).json()
+        logging.info(f"[{app_id}] Input schema loaded: {input_schema}")
+
+        output_schema = self._http.get(f"{APP_SCHEME}://{base_url}/schema?type=output", timeout=5).json()
+        logging.info(f"[{app_id}] Output schema loaded: {output_schema}")
+
+        return manifest, input_schema, output_schema
+
+    # ----------------------------------------------------------------------
+    def _store(self, app_id: str, manifest: dict, input_schema: dict, output_schema: dict,
+               fetched_at: float) -> None:
+        fingerprint = hashlib.sha256(json.dumps(output_schema, sort_keys=True).encode("utf-8")).hexdigest()
+        with self._lock:
+            self._manifest[app_id] = manifest
+            self._schema[app_id] = (input_schema, output_schema)
+            self._loaded_at[app_id] = fetched_at
+            if self._fingerprints.get(app_id) != fingerprint:
+                # Drop the compiled schema of the previous version, if any
+                self._compiled = {key: value for key, value in self._compiled.items() if key[0] != app_id}
+                self._fingerprints[app_id] = fingerprint
+
+    # ----------------------------------------------------------------------
+    def schema_version(self, app_id: str) -> str:
+        """
+        Returns the fingerprint of an app's current output schema, which changes whenever
+        a refresh brings in a different schema.
+
+        Args:
+            app_id (str): The application ID.
+
+        Returns:
+            str: The schema fingerprint, or an empty string if the app is not loaded.
+        """
+        return self._fingerprints.get(app_id, "")
+
+    # ----------------------------------------------------------------------
+    def compiled_schema(self, app_id: str) -> CompiledSchema:
+        """
+        Returns the compiled output schema of an app, compiling it on first use.
+        The entry stays valid until the Stub refreshes the app's schema to a new version.
+
+        Args:
+            app_id (str): The application ID for which to retrieve the compiled schema.
+
+        Returns:
+            CompiledSchema: The marshmallow class, its instance and the resource fields.
+
+        Raises:
+            ValueError: If the output schema is not found.
+        """
+        schema = self.schema(app_id, 'output')
+        key = (app_id, self._fingerprints.get(app_id))
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+
+        marshmallow = json_schema_to_marshmallow(schema)
+        instance = marshmallow()
+        resource_fields = [name for name, field in instance.fields.items() if isinstance(field, Resource)]
+        compiled = CompiledSchema(key[1], marshmallow, instance, resource_fields, has_resource_fields(instance))
+        with self._lock:
+            self._compiled[key] = compiled
+        return compiled
+
+    # ----------------------------------------------------------------------
+    def _cache_path(self, app_id: str) -> str:
+        name = app_id.strip('/').replace('/', '_').replace(':', '_')
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+    # ----------------------------------------------------------------------
+    def _read_cache(self, app_id: str) -> Optional[dict]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(app_id), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # ----------------------------------------------------------------------
+    def _write_cache(self, app_id: str, manifest: dict, input_schema: dict, output_schema: dict) -> None:
+        if not self.cache_dir:
+            return
+        path = self._cache_path(app_id)
+        entry = {"manifest": manifest, "input": input_schema, "output": output_schema, "fetched_at": time.time()}
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(entry, f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logging.warning(f"[{app_id}] Could not write schema cache: {e}")
+
+    # ----------------------------------------------------------------------
+    def _connect(self, app_id: str) -> Remote:
+        """
+        Establishes (or re-establishes) the Remote WebSocket connection of an app.
+        """
+        base_url = app_id.strip('/')
+        ws_scheme = "wss" if APP_SCHEME == "https" else "ws"
+        connection = self.remote_class(f"{ws_scheme}://{base_url}/app", f"{app_id}-proxy").connect()
+        with self._lock:
+            self._connections[app_id] = connection
+        logging.info(f"[{app_id}] Connection established.")
+        return connection
+
+    # ----------------------------------------------------------------------
+    def _connection(self, app_id: str) -> Optional[Remote]:
+        """
+        Returns a healthy connection for the app, reconnecting if the cached one
+        has failed repeatedly, and schedules a background refresh of stale schemas.
+        """
+        with self._lock:
+            connection = self._connections.get(app_id)
+            stale = (app_id in self._loaded_at
+                     and time.time() - self._loaded_at[app_id] > self.ttl
+                     and app_id not in self._refreshing)
+            if stale:
+                self._refreshing.add(app_id)
 
-        for app_id in app_ids:
-            base_url = app_id.strip('/')
+        if stale:
+            threading.Thread(target=self.refresh, args=(app_id,), daemon=True).start()
 
+        if connection is not None and not connection.is_healthy():
+            logging.warning(f"[{app_id}] Connection unhealthy, reconnecting.")
             try:
-                # Fetch manifest
-                manifest = requests.get(f"https://{base_url}/manifest", timeout=5).json()
-                logging.info(f"[{app_id}] Manifest loaded: {manifest}")
-                self._manifest[app_id] = manifest
-
-                # Fetch input schema
-                input_schema = requests.get(f"https://{base_url}/schema?type=input", timeout=5).json()
-                logging.info(f"[{app_id}] Input schema loaded: {input_schema}")
-
-                # Fetch output schema
-                output_schema = requests.get(f"https://{base_url}/schema?type=output", timeout=5).json()
-                logging.info(f"[{app_id}] Output schema loaded: {output_schema}")
-                self._schema[app_id] = (input_schema, output_schema)
-
-                # Establish Remote WebSocket connection
-                self._connections[app_id] = Remote(f"wss://{base_url}/app", f"{app_id}-proxy").connect()
-                logging.info(f"[{app_id}] Connection established.")
+                connection = self._connect(app_id)
             except Exception as e:
-                logging.error(f"[{app_id}] Initialization failed: {e}")
+                logging.error(f"[{app_id}] Reconnect failed: {e}")
+        return connection
 
     # ----------------------------------------------------------------------
-    def call(self, app_id: str, data: Any, uid: str = 'super-user') -> dict | None:
+    def call(self, app_id: str, data: Any, uid: str = 'super-user', timeout: Optional[float] = None) -> dict:
         """
-        Sends a request to the specified app via its Remote connection.
+        Sends a request to the specified app via its Remote connection, retrying failed
+        attempts with jittered backoff until the call's deadline.
 
         Args:
             app_id (str): The application ID to route the request to.
             data (Any): The input data to send to the app.
             uid (str): The unique user/session identifier for tracking (default: 'super-user').
+            timeout (Optional[float]): Time budget of the call in seconds, retries included
+                (bounded by the enclosing `deadline_scope`, `REMOTE_TIMEOUT` by default).
 
         Returns:
             dict: The output data returned by the app.
 
         Raises:
-            Exception: If no connection is found for the provided app ID, or execution fails.
+            CircuitOpen: If the app's circuit is open.
+            DeadlineExceeded: If the app did not answer before the deadline.
+            RemoteAppFailed: If the app is not connected or every attempt failed.
         """
-        connection = self._connections.get(app_id)
-        if not connection:
-            raise Exception(f"Connection not found for app ID: {app_id}")
+        deadline = resolve_deadline(timeout)
+        breaker = self.circuit(app_id)
+        breaker.allow()
 
+        attempt = 0
         try:
-            handler = connection.execute(data, uid)
-            result = connection.get_response(handler)
+            while True:
+                connection = self._connection(app_id)
+                started = time.monotonic()
+                try:
+                    remote = self._require(app_id, connection)
+                    result = self._require(app_id, remote.get_response(remote.execute(data, uid), deadline, app_id))
+                    break
+                except Exception as e:
+                    attempt += 1
+                    delay = self._retry_delay(app_id, connection, breaker, e, attempt, deadline)
+                    time.sleep(delay)
+        except BaseException:
+            breaker.release()  # a probe that ended without an outcome must not hold the circuit
+            raise
+
+        self._succeeded(app_id, connection, breaker, time.monotonic() - started)
+        return self._resolve(app_id, result)
+
+    # ----------------------------------------------------------------------
+    async def call_async(self, app_id: str, data: Any, uid: str = 'super-user',
+                         resolve: bool = True, timeout: Optional[float] = None,
+                         retries: Optional[int] = None) -> dict:
+        """
+        Coroutine counterpart of `call`: awaits the app's result on the event loop instead
+        of blocking a thread, and downloads resources off the loop. An attempt slower than
+        the app's hedging percentile gets a duplicate request; the first result wins.
+
+        Args:
+            app_id (str): The application ID to route the request to.
+            data (Any): The input data to send to the app.
+            uid (str): The unique user/session identifier for tracking (default: 'super-user').
+            resolve (bool): Download resource fields; when False they are returned as
+                references, to be passed on as-is or fetched later via `fetch_resource`.
+            timeout (Optional[float]): Time budget of the call in seconds, retries included
+                (bounded by the enclosing `deadline_scope`, `REMOTE_TIMEOUT` by default).
+            retries (Optional[int]): Maximum number of attempts (`REMOTE_RETRIES` by default);
+                1 for inputs the app may reject, which retrying would not change.
+
+        Returns:
+            dict: The output data returned by the app.
 
-            schema = self.schema(app_id, 'output')
-            marshmallow = json_schema_to_marshmallow(schema)
-            handle_resources = has_resource_fields(marshmallow())
+        Raises:
+            CircuitOpen: If the app's circuit is open.
+            DeadlineExceeded: If the app did not answer before the deadline.
+            RemoteAppFailed: If the app is not connected or every attempt failed.
+        """
+        deadline = resolve_deadline(timeout)
+        breaker = self.circuit(app_id)
+        breaker.allow()
 
-            if handle_resources:
-                result = resolve_resources("https://" + app_id + "/resource?reid={reid}", result, marshmallow())
+        attempt = 0
+        try:
+            while True:
+                connection = self._connection(app_id)
+                started = time.monotonic()
+                try:
+                    result = await self._hedged(app_id, self._require(app_id, connection), data, uid, deadline)
+                    break
+                except Exception as e:
+                    attempt += 1
+                    delay = self._retry_delay(app_id, connection, breaker, e, attempt, deadline, retries)
+                    await asyncio.sleep(delay)
+        except BaseException:
+            breaker.release()  # a probe that ended without an outcome must not hold the circuit
+            raise
 
+        self._succeeded(app_id, connection, breaker, time.monotonic() - started)
+        if not resolve:
             return result
-        except Exception as e:
-            logging.error(f"[{app_id}] Execution failed: {e}")
-            return None
+        return await asyncio.to_thread(self._resolve, app_id, result)
+
+    # ----------------------------------------------------------------------
+    def circuit(self, app_id: str) -> CircuitBreaker:
+        """
+        Returns the circuit breaker of an app, creating it on first use.
+
+        Args:
+            app_id (str): The application ID.
+
+        Returns:
+            CircuitBreaker: The app's circuit breaker.
+        """
+        with self._lock:
+            if app_id not in self._breakers:
+                self._breakers[app_id] = CircuitBreaker(app_id)
+                self._latencies[app_id] = LatencyTracker()
+            return self._breakers[app_id]
+
+    # ----------------------------------------------------------------------
+    def call_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the circuit state and latency percentiles of every app called so far.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per app ID, its circuit state (and whether it is
+            not closed), consecutive failures and p50/p95/p99 latencies (None until enough calls were made).
+        """
+        with self._lock:
+            apps = list(self._breakers)
+        stats = {}
+        for app_id in apps:
+            latencies = self._latencies[app_id]
+            breaker = self._breakers[app_id].stats()
+            stats[app_id] = dict(
+                breaker, circuit_open=breaker["state"] != "closed",
+                p50=latencies.percentile(50), p95=latencies.percentile(95), p99=latencies.percentile(99),
+            )
+        return stats
+
+    # ----------------------------------------------------------------------
+    async def _hedged(self, app_id: str, connection: Remote, data: Any, uid: str, deadline: float) -> dict:
+        """
+        Runs one attempt, duplicating the request once it is slower than the app's
+        hedging latency. The slower request is abandoned once the other one succeeds.
+        """
+        requests_in_flight = {asyncio.ensure_future(connection.execute_async(data, uid, deadline))}
+        hedge_after = self._latencies[app_id].hedge_delay()
+        try:
+            if hedge_after is not None and hedge_after < remaining(deadline):
+                done, _ = await asyncio.wait(requests_in_flight, timeout=hedge_after)
+                if not done:
+                    logging.info(f"[{app_id}] No result after {hedge_after:.1f}s, sending a hedged request.")
+                    requests_in_flight.add(asyncio.ensure_future(connection.execute_async(data, uid, deadline)))
+
+            error: Optional[BaseException] = None
+            while requests_in_flight:
+                done, requests_in_flight = await asyncio.wait(
+                    requests_in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                for request in done:
+                    if request.exception() is not None:
+                        error = request.exception()
+                    elif request.result() is not None:
+                        return request.result()
+            raise error or RemoteAppFailed(app_id, "no result")
+        finally:
+            for request in requests_in_flight:
+                request.cancel()
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def _require(app_id: str, value: Any) -> Any:
+        """
+        Fails the attempt when there is no connection, or no result.
+        """
+        if value is None:
+            raise RemoteAppFailed(app_id, "no connection or no result")
+        return value
+
+    # ----------------------------------------------------------------------
+    def _retry_delay(self, app_id: str, connection: Optional[Remote], breaker: CircuitBreaker,
+                     error: Exception, attempt: int, deadline: float,
+                     retries: Optional[int] = None) -> float:
+        """
+        Records a failed attempt and returns the delay before the next one, or raises
+        the (typed) error when the call should not be retried.
+        """
+        if connection is not None:
+            connection.mark_failure()
+        if not isinstance(error, RemoteCallError):
+            error = RemoteAppFailed(app_id, str(error))
+        delay = backoff_delay(attempt)
+        if isinstance(error, DeadlineExceeded) or attempt >= (self.retries if retries is None else retries) or remaining(deadline) <= delay:
+            breaker.record_failure()
+            logging.error(f"[{app_id}] Execution failed after {attempt} attempt(s): {error}")
+            raise error
+        logging.warning(f"[{app_id}] Attempt {attempt} failed, retrying in {delay:.1f}s: {error}")
+        return delay
+
+    # ----------------------------------------------------------------------
+    def _succeeded(self, app_id: str, connection: Remote, breaker: CircuitBreaker, seconds: float) -> None:
+        connection.mark_success()
+        breaker.record_success()
+        self._latencies[app_id].record(seconds)
+
+    # ----------------------------------------------------------------------
+    def resource_url(self, app_id: str, reid: str) -> str:
+        """
+        Builds the download URL of a resource produced by an app.
+
+        Args:
+            app_id (str): The application ID that produced the resource.
+            reid (str): The resource identifier found in the app's output.
+
+        Returns:
+            str: The URL from which the resource content can be fetched.
+        """
+        return f"{APP_SCHEME}://{app_id.strip('/')}/resource?reid={reid}"
+
+    # ----------------------------------------------------------------------
+    def fetch_resource(self, app_id: str, reid: str) -> bytes:
+        """
+        Downloads the content of a resource produced by an app.
+
+        Args:
+            app_id (str): The application ID that produced the resource.
+            reid (str): The resource identifier found in the app's output.
+
+        Returns:
+            bytes: The resource content.
+
+        Raises:
+            requests.HTTPError: If the download fails.
+            requests.Timeout: If the download does not complete before the deadline.
+        """
+        timeout = max(1.0, remaining(resolve_deadline(RESOURCE_TIMEOUT)))
+        response = self._http.get(self.resource_url(app_id, reid), timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    # ----------------------------------------------------------------------
+    def _resolve(self, app_id: str, result: Optional[dict]) -> Optional[dict]:
+        """
+        Replaces resource references in an app result with the downloaded content.
+        """
+        compiled = self.compiled_schema(app_id)
+        if compiled.has_resources:
+            result = resolve_resources(f"{APP_SCHEME}://{app_id}" + "/resource?reid={reid}", result, compiled.instance)
+        return result
 
     # ----------------------------------------------------------------------
     def manifest(self, app_id: str) -> dict:
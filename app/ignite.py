@@ -1,5 +1,39 @@
+import importlib
+import logging
+import os
+
 from openfabric_pysdk.starter import Starter
 
+from core.lazy import startup_report, timed, warm_up
+
+# Initialize the heavy subsystems (embedding model, long-term index, LLM chain...)
+# in the background right after start-up instead of on the first request
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+
 if __name__ == '__main__':
     PORT = 8888
+
+    # Import the application modules up front so their cost shows in the startup report
+    with timed("import:core"):
+        importlib.import_module("core.stub")
+        importlib.import_module("core.result_cache")
+    with timed("import:memory"):
+        importlib.import_module("memory.memory_manager")
+    with timed("import:main"):
+        import main
+
+    if STARTUP_WARMUP:
+        from memory.long_term_memory import embeddings, vector_store
+        from memory.short_term_memory import chain, semantic_cache
+        from memory.summary_queue import summary_queue
+        from memory.conversation_log import conversation_log
+        warm_up([embeddings, vector_store, semantic_cache, chain, main.result_cache, main.artifact_store,
+                 summary_queue, conversation_log])
+    else:
+        logging.info(startup_report())
+
+    # Prometheus metrics endpoint and/or file, when configured (METRICS_PORT, METRICS_FILE)
+    from core.metrics import start_exporters
+    start_exporters()
+
     Starter.ignite(debug=False, host="0.0.0.0", port=PORT)
@@ -1,9 +1,12 @@
 import os
+import asyncio
 import logging
 import base64
-from typing import Dict
+import time
+from typing import Dict, Optional
 
-from memory.short_term_memory import get_redis_history, chain_with_history
+from memory.short_term_memory import aenhance_prompt
+from memory.conversation_log import conversation_log, log_short_term
 
 from session_manager import SessionManager
 from ontology_dc8f06af066e4a7880a5938933236037.config import ConfigClass
@@ -11,13 +14,45 @@ from ontology_dc8f06af066e4a7880a5938933236037.input import InputClass
 from ontology_dc8f06af066e4a7880a5938933236037.output import OutputClass
 from openfabric_pysdk.context import AppModel, State
 from core.stub import Stub
+from core.result_cache import ResultCache
+from core.artifact_store import Artifact, ArtifactStore
+from core import loop
+from core.lazy import Lazy
+from core.jobs import Job, JobManager, JobQueueFull
+from core.scheduler import scheduler
+from core.resilience import RemoteAppFailed, RemoteCallError, deadline_scope
+from core.metrics import lazy_stats, registry, span, trace
 
 
 # Global instances
 session_manager = SessionManager()
 configurations: Dict[str, ConfigClass] = dict()
-OUTPUT_FOLDER = "output_3d_model"
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+# Long-lived Stub shared by every request: manifests, schemas and connections are reused
+stub = Stub()
+# Content-addressed cache of the text-to-image and image-to-3D outputs (indexed on first use)
+result_cache = Lazy("result_cache", ResultCache)
+# Content-addressed store of the generated files, written off the request path
+artifact_store = Lazy("artifact_store", ArtifactStore)
+# Background runs of the requests submitted with mode "async"
+jobs = JobManager()
+# Bytes sent to and received from the Openfabric apps
+TRANSFERRED_BYTES = registry.counter("transferred_bytes_total", "Bytes uploaded to or downloaded from the apps")
+# Gauges read from the subsystems' counters at export time
+registry.register_stats("scheduler", scheduler.stats, label="stage")
+registry.register_stats("jobs", jobs.stats)
+registry.register_stats("remote", stub.call_stats, label="app")
+registry.register_stats("result_cache", lazy_stats(result_cache))
+registry.register_stats("artifact_store", lazy_stats(artifact_store))
+TEXT_TO_IMAGE_APP = os.getenv("TEXT_TO_IMAGE_APP", "c25dcd829d134ea98f5ae4dd311d13bc.node3.openfabric.network")
+IMAGE_TO_3D_APP = os.getenv("IMAGE_TO_3D_APP", "5891a64fe34041d98b0262bb1175ff07.node3.openfabric.network")
+# Hand the generated image to the image-to-3D app by reference instead of re-uploading it
+# (only for apps that accept a URL as input image: a failure turns it off for the app for
+# RESOURCE_PASSTHROUGH_RETRY seconds, as an outage looks the same as a rejection)
+RESOURCE_PASSTHROUGH = os.getenv("RESOURCE_PASSTHROUGH", "0") == "1"
+RESOURCE_PASSTHROUGH_RETRY = float(os.getenv("RESOURCE_PASSTHROUGH_RETRY", "600"))
+_passthrough_rejected: Dict[str, float] = {}  # app ID -> time until which images are uploaded
+# Time budget of the remote stages of one request (seconds), queueing and retries included
+PIPELINE_TIMEOUT = float(os.getenv("PIPELINE_TIMEOUT", "600"))
 
 
 ############################################################
@@ -25,7 +60,7 @@ os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 ############################################################
 def config(configuration: Dict[str, ConfigClass], state: State) -> None:
     """
-    Stores user-specific configuration data.
+    Stores user-specific configuration data and warms the shared Stub with the configured apps.
 
     Args:
         configuration (Dict[str, ConfigClass]): A mapping of user IDs to configuration objects.
@@ -34,6 +69,8 @@ def config(configuration: Dict[str, ConfigClass], state: State) -> None:
     for uid, conf in configuration.items():
         logging.info(f"Saving new config for user with id:'{uid}'")
         configurations[uid] = conf
+        if conf.app_ids:
+            stub.register(conf.app_ids)
 
 
 ############################################################
@@ -42,68 +79,144 @@ def config(configuration: Dict[str, ConfigClass], state: State) -> None:
 def execute(model: AppModel) -> None:
     """
     Main execution entry point for handling a model pass with session and memory management.
+    The pipeline itself runs on the shared event loop (see `execute_async`).
+
+    With `mode` "async" the pipeline is queued as a background job and the response only
+    carries its `job_id`; requests with a `job_id` return that job's status, stage and
+    partial results instead of running the pipeline.
+
+    Args:
+        model (AppModel): The model object containing request and response structures.
+    """
+    request: InputClass = model.request
+    output_response: OutputClass = model.response
+
+    if request.job_id:
+        job = jobs.get(request.job_id)
+        if job is None:
+            output_response.job_id = request.job_id
+            output_response.status = "unknown"
+            output_response.message = "Unknown or expired job"
+            return
+        for name, value in job.snapshot().items():
+            setattr(output_response, name, value)
+        return
+
+    if request.mode == "async":
+        try:
+            job = jobs.submit(lambda job: execute_async(_JobModel(request), job))
+        except JobQueueFull as e:
+            output_response.status = "rejected"
+            output_response.message = f"Too many pending jobs, try again later ({e})"
+            return
+        output_response.job_id = job.job_id
+        output_response.status = job.status
+        output_response.stage = job.stage
+        output_response.message = "Job submitted"
+        return
+
+    loop.run(execute_async(model))
+
+
+class _JobModel:
+    """Request/response pair of a background job (the caller's model is answered at once)."""
+
+    def __init__(self, request: InputClass):
+        self.request = request
+        self.response = OutputClass()
+
+
+def _progress(job: Optional[Job], stage: Optional[str] = None, **partial) -> None:
+    """Publishes the stage in progress and partial results of a background job."""
+    if job is not None:
+        job.update(stage=stage, **partial)
+
+
+async def execute_async(model: AppModel, job: Optional[Job] = None) -> bool:
+    """
+    Coroutine version of the execution pipeline. Waiting on the LLM and on the remote apps
+    suspends the coroutine instead of pinning a thread, while blocking work (Redis, memory
+    search, file writes) is pushed to worker threads.
 
     Args:
         model (AppModel): The model object containing request and response structures.
+        job (Optional[Job]): The background job to report progress on, if any.
+
+    Returns:
+        bool: True when the 3D model was generated.
     """
+    with trace(f"request-{model.request.username or 'anonymous'}") as request_trace:
+        succeeded = await _execute_pipeline(model, job)
+        request_trace.outcome = "completed" if succeeded else "failed"
+        return succeeded
+
+
+async def _execute_pipeline(model: AppModel, job: Optional[Job]) -> bool:
+    """Body of `execute_async`, run within the request's trace."""
     # Get the username from request, or use default
     user_id = "super-user"
     username = model.request.username
-    if username:
-        session = session_manager.get_session(username)
-    else:
-        session = session_manager.get_session(user_id)
-    # Try to get existing session for the user
-    existing_sessions = [s for s in session_manager.sessions.values()
-                       if s.user_id == username and s.is_active]
-    session = existing_sessions[0] if existing_sessions else None
-
-    if not session:
-        session = session_manager.create_session(username)
+    # Get the existing session for the user, or create it (atomically across workers)
+    with span("session"):
+        session, created = await asyncio.to_thread(session_manager.get_or_create_session, username)
+        timed_out = await asyncio.to_thread(session_manager.check_session_timeout, session.session_id)
+    if created:
         logging.info(f"Created new session: {session.session_id}")
-    
+
     logging.info(f"User ID: {username}, Session ID: {session.session_id}")
 
     # Check for session timeout
-    if session_manager.check_session_timeout(session.session_id):
+    if timed_out:
         logging.info(f"Session {session.session_id} has timed out")
-        session_manager.end_session(
-            session.session_id
+        await asyncio.to_thread(
+            session_manager.end_session, session.session_id
         )  # This will store memory summary
         model.response.message = "Session has timed out. Please create a new session."
-        return
+        _progress(job, "failed", message=model.response.message)
+        return False
 
     # Update session activity
-    session.update_activity()
+    with span("session"):
+        await asyncio.to_thread(session_manager.touch, session)
 
     # Retrieve input
     request: InputClass = model.request
 
     # Get relevant context from memory
     try:
-        context_msgs = session.memory.fetch_context(request.prompt)
+        with span("memory_fetch"):
+            context_msgs = await asyncio.to_thread(session.memory.fetch_context, request.prompt)
     except Exception as e:
         logging.warning(f"Memory fetch failed, using empty context: {e}")
         context_msgs = []
 
-    # 2. Pass it into the LLM
-    llm_response = chain_with_history.invoke(
-        {
-            "input": request.prompt,
-            "history": context_msgs,  # << inject manually here
-        },
-        config={"configurable": {"session_id": session.session_id}},
-    )
+    # 2. Pass it into the LLM (or reuse the enhancement of a near-identical prompt);
+    # background jobs publish the enhancement as it streams in
+    _progress(job, "enhance")
+    streamed = []
+
+    def publish(text: str) -> None:
+        streamed.append(text)
+        _progress(job, enhanced_prompt="".join(streamed))
+
+    with span("enhance"):
+        enhanced_prompt = await aenhance_prompt(
+            request.prompt, context_msgs, username, on_token=publish if job is not None else None
+        )
+    _progress(job, "image", enhanced_prompt=enhanced_prompt)
 
-    # Get Redis history for this session
-    history = get_redis_history(session.session_id)
+    # Redis history for this session, shared with its memory manager
+    history = session.memory.history
 
-    # Store user's prompt in memory
+    # Store the turn once (the history is trimmed to a bounded length)
     try:
-        history.add_user_message(request.prompt)
-        history.add_ai_message(llm_response.content)
+        with span("memory_write"):
+            await asyncio.to_thread(session.memory.record_turn, request.prompt, enhanced_prompt)
     except Exception as e:
         logging.warning(f"Failed to store messages in memory: {e}")
+    # Buffered append, written to the conversation log by its background thread
+    await _log(session.session_id, "user", request.prompt)
+    await _log(session.session_id, "ai", enhanced_prompt)
 
     try:
         # Retrieve user config
@@ -112,100 +225,299 @@ def execute(model: AppModel) -> None:
             f"Session {session.session_id} - Message count: {session.message_count}"
         )
 
-        # Initialize the Stub with app IDs
+        # Make sure the configured apps are known to the shared Stub (no-op once warmed)
         app_ids = user_config.app_ids if user_config else []
-        stub = Stub(app_ids)
+        await asyncio.to_thread(stub.register, app_ids)
+
+        # Steps 1-2: text to image, then image to 3D model
+        artifacts = await generate_3d(enhanced_prompt, username, user_id, job, f"Session {session.session_id}")
 
-        # Step 1: Generate image from text using text-to-image API
-        text_to_image_response = stub.call(
-            "c25dcd829d134ea98f5ae4dd311d13bc.node3.openfabric.network",
-            {"prompt": llm_response.content},
-            user_id,
+        output_response: OutputClass = model.response
+        success_message = f"Successfully generated 3D model from prompt (Session: {session.session_id})"
+        output_response.message = success_message
+        output_response.enhanced_prompt = enhanced_prompt
+        for kind, artifact in artifacts.items():
+            setattr(output_response, f"{kind}_id", artifact.id)
+            setattr(output_response, f"{kind}_path", artifact.path)
+        _progress(
+            job,
+            "done",
+            message=output_response.message,
+            enhanced_prompt=output_response.enhanced_prompt,
+            image_id=output_response.image_id,
+            image_path=output_response.image_path,
+            model_id=output_response.model_id,
+            model_path=output_response.model_path,
+            video_id=output_response.video_id,
+            video_path=output_response.video_path,
         )
 
-        if text_to_image_response is None:
-            raise Exception("Text-to-image API call failed")
+        # Store AI response in memory
+        await _log(session.session_id, "ai", success_message)
+        try:
+            await asyncio.to_thread(history.add_ai_message, success_message)
+        except Exception as mem_error:
+            logging.warning(f"Failed to store success message in memory: {mem_error}")
+        return True
 
-        generated_image = text_to_image_response.get("result")
-        if not generated_image:
-            raise Exception("No image was generated")
+    except Exception as e:
+        error_message = f"Error: {str(e)}"
+        logging.error(
+            f"Session {session.session_id} - Error during processing: {str(e)}"
+        )
+        
+        output_response: OutputClass = model.response
+        output_response.message = error_message
+        _progress(job, "failed", message=error_message)
+
+        # Store error message in memory
+        await _log(session.session_id, "ai", error_message)
+        try:
+            await asyncio.to_thread(history.add_ai_message, error_message)
+        except Exception as mem_error:
+            logging.warning(f"Failed to store error message in memory: {mem_error}")
+
+        # End session on critical errors
+        if isinstance(e, RemoteCallError):
+            await asyncio.to_thread(
+                session_manager.end_session, session.session_id
+            )  # This will store memory summary
+        return False
 
-        # Save intermediate image with session-specific name
-        image_path = OUTPUT_FOLDER + f"/output_{session.session_id}.png"
-        with open(image_path, "wb") as f:
-            f.write(generated_image)
 
+async def generate_3d(
+    enhanced_prompt: str, username: str, user_id: str = "super-user", job: Optional[Job] = None, label: str = ""
+) -> Dict[str, Artifact]:
+    """
+    Runs the remote stages of the pipeline: text to image, then image to 3D model. Each
+    stage is served from the result cache when possible and otherwise takes a slot of
+    its scheduler stage; the outputs are stored in the artifact store.
+
+    Args:
+        enhanced_prompt (str): The prompt given to the text-to-image app.
+        username (str): The user the request belongs to (fair queuing between users).
+        user_id (str): The user ID passed to the Openfabric apps.
+        job (Optional[Job]): The background job to report progress on, if any.
+        label (str): Prefix of the log lines, e.g. the session.
+
+    Returns:
+        Dict[str, Artifact]: The "model" and, when available, "image" and "video" artifacts
+        (the image is missing when its pass-through download failed), written in the background.
+
+    Raises:
+        RemoteCallError: When an app call fails, times out or is shed by its circuit breaker.
+        Exception: When an app produces nothing.
+    """
+    with deadline_scope(PIPELINE_TIMEOUT):
+        return await _generate_3d(enhanced_prompt, username, user_id, job, label)
+
+
+async def _generate_3d(
+    enhanced_prompt: str, username: str, user_id: str, job: Optional[Job], label: str
+) -> Dict[str, Artifact]:
+    """Body of `generate_3d`, run within the pipeline deadline."""
+    # Step 1: Generate image from text using text-to-image API
+    # (served from the result cache when the same enhanced prompt was seen before)
+    image_key = ResultCache.key(
+        "image", TEXT_TO_IMAGE_APP, stub.schema_version(TEXT_TO_IMAGE_APP), enhanced_prompt
+    )
+    # (the first lookup indexes the cache directory, so it runs off the event loop too)
+    with span("result_cache"):
+        cached_image = await asyncio.to_thread(_cached_artifacts, image_key)
+    image_task = None
+    image_input = None
+    generated_image = None
+    passthrough = RESOURCE_PASSTHROUGH and time.monotonic() >= _passthrough_rejected.get(IMAGE_TO_3D_APP, 0.0)
+
+    if cached_image is not None:
+        image_artifact = cached_image["result"]
         logging.info(
-            f"Session {session.session_id} - Generated image saved to {image_path}"
+            f"{label} - Image served from cache: {image_artifact.path}"
         )
+    else:
+        async with scheduler.slot("image", username):
+            with span("text_to_image"):
+                text_to_image_response = await stub.call_async(
+                    TEXT_TO_IMAGE_APP,
+                    {"prompt": enhanced_prompt},
+                    user_id,
+                    resolve=not passthrough,
+                )
 
-        # Convert image to base64 for API input
-        image_base64 = base64.b64encode(generated_image).decode("utf-8")
+        generated_image = text_to_image_response.get("result")
+        if not generated_image:
+            raise Exception("No image was generated")
 
-        # Step 2: Generate 3D model from the image using image-to-3D API
-        image_to_3d_response = stub.call(
-            "5891a64fe34041d98b0262bb1175ff07.node3.openfabric.network",
-            {"input_image": image_base64},
-            user_id,
-        )
+        if passthrough:
+            # `generated_image` is a resource reference: download the local copy in the
+            # background while the image-to-3D app reads the image straight from its source
+            image_task = asyncio.create_task(asyncio.to_thread(_download, TEXT_TO_IMAGE_APP, generated_image))
+            image_input = stub.resource_url(TEXT_TO_IMAGE_APP, generated_image)
+            image_artifact = None
+        else:
+            image_artifact = await asyncio.to_thread(_store_artifact, generated_image, ".png")
+            logging.info(
+                f"{label} - Generated image saved to {image_artifact.path}"
+            )
 
-        if image_to_3d_response is None:
-            raise Exception("Image-to-3D API call failed")
+    if image_task is None:
+        _progress(job, "model", image_id=image_artifact.id, image_path=image_artifact.path)
+    else:
+        _progress(job, "model")
+
+    # Step 2: Generate 3D model from the image using image-to-3D API
+    # (a cached image may already have a cached model, keyed on the image content)
+    outputs = None
+    if cached_image is not None:
+        with span("result_cache"):
+            outputs = await asyncio.to_thread(_cached_artifacts, _model_cache_key(image_artifact.id))
+        if outputs is None:
+            generated_image = await asyncio.to_thread(artifact_store.get().get, image_artifact.id)
+            if generated_image is None:
+                raise Exception("The cached image is no longer stored")
+
+    if outputs is None:
+        try:
+            image_to_3d_response = await _image_to_3d(image_input, generated_image, image_task, username,
+                                                      user_id, label)
+        except BaseException:
+            if image_task is not None:
+                image_task.cancel()
+            raise
+
+        if image_task is not None:
+            # The local copy only serves the image artifact and the caches: the 3D model
+            # is done, so a failed download does not fail the request
+            try:
+                generated_image = await image_task
+            except Exception as e:
+                logging.warning(f"{label} - Could not download the generated image: {e}")
+                generated_image = None
+            if generated_image is not None:
+                image_artifact = await asyncio.to_thread(_store_artifact, generated_image, ".png")
+                logging.info(
+                    f"{label} - Generated image saved to {image_artifact.path}"
+                )
+                _progress(job, image_id=image_artifact.id, image_path=image_artifact.path)
 
         # Get both the 3D model and preview video
         model_3d = image_to_3d_response.get("generated_object")
         if not model_3d:
             raise Exception("No 3D model was generated")
         preview_video = image_to_3d_response.get("video_object")
-        if not preview_video:
-            logging.warning(
-                f"Session {session.session_id} - No preview video generated"
-            )
 
         # Save 3D model if generated
-        model_3d_path = OUTPUT_FOLDER + f"/output_{session.session_id}.glb"
-        with open(model_3d_path, "wb") as f:
-            f.write(model_3d)
+        outputs = {"generated_object": await asyncio.to_thread(_store_artifact, model_3d, ".glb")}
         logging.info(
-            f"Session {session.session_id} - Generated 3D model saved to {model_3d_path}"
+            f"{label} - Generated 3D model saved to {outputs['generated_object'].path}"
         )
 
         # Save preview video if generated
         if preview_video:
-            preview_video_path = OUTPUT_FOLDER + f"/preview_{session.session_id}.mp4"
-            with open(preview_video_path, "wb") as f:
-                f.write(preview_video)
+            outputs["video_object"] = await asyncio.to_thread(_store_artifact, preview_video, ".mp4")
             logging.info(
-                f"Session {session.session_id} - Generated preview video saved to {preview_video_path}"
+                f"{label} - Generated preview video saved to {outputs['video_object'].path}"
             )
 
-        output_response: OutputClass = model.response
-        success_message = f"Successfully generated 3D model from prompt (Session: {session.session_id})"
-        output_response.message = success_message
-
-        # Store AI response in memory
-        try:
-            history.add_ai_message(success_message)
-        except Exception as mem_error:
-            logging.warning(f"Failed to store success message in memory: {mem_error}")
+        # Cache both stages for identical future prompts (the entries refer to the
+        # artifacts: the content is only stored once, by the artifact store)
+        if image_artifact is not None:
+            with span("result_cache"):
+                if cached_image is None:
+                    await asyncio.to_thread(result_cache.get().put, image_key, {"result": image_artifact.id})
+                await asyncio.to_thread(
+                    result_cache.get().put,
+                    _model_cache_key(image_artifact.id),
+                    {field: artifact.id for field, artifact in outputs.items()},
+                )
+    else:
+        logging.info(f"{label} - 3D model served from cache")
 
-    except Exception as e:
-        error_message = f"Error: {str(e)}"
-        logging.error(
-            f"Session {session.session_id} - Error during processing: {str(e)}"
+    if "video_object" not in outputs:
+        logging.warning(
+            f"{label} - No preview video generated"
         )
-        
-        output_response: OutputClass = model.response
-        output_response.message = error_message
 
-        # Store error message in memory
-        try:
-            history.add_ai_message(error_message)
-        except Exception as mem_error:
-            logging.warning(f"Failed to store error message in memory: {mem_error}")
+    artifacts = {"model": outputs["generated_object"]}
+    if image_artifact is not None:
+        artifacts["image"] = image_artifact
+    if "video_object" in outputs:
+        artifacts["video"] = outputs["video_object"]
+    # The files are still being written: readers go through `artifact_store.get`, or
+    # `wait` for an artifact before opening its file
+    return artifacts
 
-        # End session on critical errors
-        if "API call failed" in str(e):
-            session_manager.end_session(
-                session.session_id
-            )  # This will store memory summary
+
+async def _image_to_3d(image_input: Optional[str], image: Optional[bytes], image_task: Optional[asyncio.Task],
+                       username: str, user_id: str, label: str) -> dict:
+    """
+    Calls the image-to-3D app with the image reference when passed through (a single
+    attempt: a rejected URL is not retried) and otherwise, or when the app rejects the
+    reference, with the uploaded image.
+    """
+    async with scheduler.slot("model", username):
+        if image_task is not None:
+            try:
+                with span("image_to_3d"):
+                    return await stub.call_async(IMAGE_TO_3D_APP, {"input_image": image_input}, user_id, retries=1)
+            except RemoteAppFailed as e:
+                # The app could not use the reference: upload the images for a while
+                _passthrough_rejected[IMAGE_TO_3D_APP] = time.monotonic() + RESOURCE_PASSTHROUGH_RETRY
+                logging.warning(
+                    f"{label} - Image pass-through failed ({e}), uploading images to {IMAGE_TO_3D_APP} "
+                    f"for {RESOURCE_PASSTHROUGH_RETRY:.0f}s"
+                )
+                image = await image_task
+
+        image_input = await asyncio.to_thread(_to_base64, image)
+        with span("image_to_3d"):
+            return await stub.call_async(IMAGE_TO_3D_APP, {"input_image": image_input}, user_id)
+
+
+async def _log(session_id: str, role: str, content: str) -> None:
+    """Appends to the conversation log (buffered), creating it off the event loop first."""
+    if not conversation_log.initialized:
+        await asyncio.to_thread(conversation_log.get)
+    log_short_term(session_id, role, content)
+
+
+def _to_base64(data: bytes) -> str:
+    """Encodes binary data as a base64 string for app inputs."""
+    with span("base64"):
+        encoded = base64.b64encode(data).decode("utf-8")
+    TRANSFERRED_BYTES.inc(len(encoded), direction="upload")
+    return encoded
+
+
+def _download(app_id: str, reid: str) -> bytes:
+    """Downloads a resource produced by an app."""
+    with span("resource_download"):
+        data = stub.fetch_resource(app_id, reid)
+    TRANSFERRED_BYTES.inc(len(data), direction="download")
+    return data
+
+
+def _store_artifact(data: bytes, extension: str) -> Artifact:
+    """Hands a generated file to the artifact store (written in the background)."""
+    with span("artifact_write"):
+        return artifact_store.get().put(data, extension)
+
+
+def _model_cache_key(image_id: str) -> str:
+    """Result cache key of the image-to-3D stage, derived from the image content (its artifact ID)."""
+    return ResultCache.key("model", IMAGE_TO_3D_APP, stub.schema_version(IMAGE_TO_3D_APP), image_id)
+
+
+def _cached_artifacts(key: str) -> Optional[Dict[str, Artifact]]:
+    """
+    Looks up a stage output in the result cache. An entry whose artifacts were evicted
+    from the artifact store since is dropped and reported as a miss.
+    """
+    fields = result_cache.get().get(key)
+    if fields is None:
+        return None
+    artifacts = {field: artifact_store.get().find(artifact_id) for field, artifact_id in fields.items()}
+    if any(artifact is None for artifact in artifacts.values()):
+        result_cache.get().discard(key)
+        return None
+    return artifacts
@@ -0,0 +1,75 @@
+import os
+from typing import List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+# Token budget of the history injected into the prompt (summary + retrieved + recent turns)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1024"))
+# Messages kept in the short-term history, older ones are folded into the rolling summary
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+# Limits of the rolling summary: number of remembered requests and words kept from each
+SUMMARY_MAX_ITEMS = 10
+SUMMARY_ITEM_WORDS = 15
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for budgeting."""
+    return max(1, len(text) // 4)
+
+
+def build_context(recent: List[BaseMessage], summary: Optional[str] = None,
+                  retrieved: Optional[List[BaseMessage]] = None,
+                  budget: int = CONTEXT_TOKEN_BUDGET) -> List[BaseMessage]:
+    """
+    Assemble the history passed to the LLM within a token budget.
+
+    The rolling summary goes first, then long-term memories (at most half of the
+    budget), then as many recent messages as still fit, newest first. Messages
+    with the same role and content are only included once.
+    """
+    seen = set()
+    context_head: List[BaseMessage] = []
+    used = 0
+
+    if summary:
+        message = SystemMessage(content=f"Earlier requests in this conversation: {summary}")
+        used += estimate_tokens(message.content)
+        context_head.append(message)
+
+    for message in retrieved or []:
+        cost = estimate_tokens(message.content)
+        key = (message.type, message.content)
+        if key in seen or used + cost > budget // 2:
+            continue
+        seen.add(key)
+        used += cost
+        context_head.append(message)
+
+    context_tail: List[BaseMessage] = []
+    for message in reversed(recent):
+        cost = estimate_tokens(message.content)
+        key = (message.type, message.content)
+        if key in seen:
+            continue
+        if used + cost > budget:
+            break
+        seen.add(key)
+        used += cost
+        context_tail.append(message)
+
+    return context_head + list(reversed(context_tail))
+
+
+def fold_into_summary(summary: Optional[str], dropped: List[BaseMessage]) -> Optional[str]:
+    """
+    Extend the rolling summary with the user requests of messages leaving the history.
+    Only the last SUMMARY_MAX_ITEMS requests are remembered, each cut to a few words.
+    """
+    items = [item for item in (summary or "").split(" | ") if item]
+    for message in dropped:
+        if isinstance(message, HumanMessage) and message.content.strip():
+            words = message.content.split()
+            item = " ".join(words[:SUMMARY_ITEM_WORDS]) + ("..." if len(words) > SUMMARY_ITEM_WORDS else "")
+            items.append(item)
+    items = items[-SUMMARY_MAX_ITEMS:]
+    return " | ".join(items) if items else None
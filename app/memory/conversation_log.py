@@ -0,0 +1,177 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from core.lazy import Lazy
+
+LOG_DIR = os.path.join(os.path.dirname(__file__), "..", "datastore", "conversation_log")
+# Segments are rotated once they reach this size or age
+LOG_SEGMENT_BYTES = int(os.getenv("CONVERSATION_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+LOG_SEGMENT_SECONDS = int(os.getenv("CONVERSATION_LOG_SEGMENT_SECONDS", "3600"))
+# Seconds between background flushes, and whether to fsync: "always" (every flush),
+# "rotate" (when a segment is closed) or "never" (left to the OS)
+LOG_FLUSH_INTERVAL = float(os.getenv("CONVERSATION_LOG_FLUSH_INTERVAL", "1.0"))
+LOG_FSYNC = os.getenv("CONVERSATION_LOG_FSYNC", "rotate")
+# Buffered entries that trigger an early flush
+LOG_MAX_BUFFERED = 1000
+
+
+class ConversationLog:
+    """
+    Append-only log of conversation messages.
+
+    Entries are buffered in memory and written by a background thread, one batched
+    write per flush, to JSON-lines segments rotated by size and age. A small SQLite
+    index maps each session to the (segment, offset, length) of its entries, so one
+    session's transcript is read with a few seeks instead of a scan of every segment.
+    """
+
+    def __init__(self, directory: str = LOG_DIR, segment_bytes: int = LOG_SEGMENT_BYTES,
+                 segment_seconds: int = LOG_SEGMENT_SECONDS, flush_interval: float = LOG_FLUSH_INTERVAL,
+                 fsync: str = LOG_FSYNC):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+
+        self._index = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self._index.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(session_id TEXT, segment TEXT, offset INTEGER, length INTEGER)"
+        )
+        self._index.execute("CREATE INDEX IF NOT EXISTS entries_session ON entries (session_id)")
+        self._index.commit()
+
+        self._buffer: List[Dict] = []
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()  # serializes flushes and transcript reads
+        self._wake = threading.Event()
+        self._closed = False
+        self._segment = None
+        self._segment_name = None
+        self._segment_opened = 0.0
+
+        self._thread = threading.Thread(target=self._flush_forever, name="conversation-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        """Buffer one message; it is written on the next background flush."""
+        entry = {
+            "session_id": session_id,
+            "role": role,
+            "content": content,
+            "timestamp": datetime.now().isoformat()
+        }
+        with self._buffer_lock:
+            self._buffer.append(entry)
+            if len(self._buffer) >= LOG_MAX_BUFFERED:
+                self._wake.set()
+
+    def flush(self) -> None:
+        """Write the buffered entries to the current segment and index them."""
+        with self._buffer_lock:
+            entries, self._buffer = self._buffer, []
+        if not entries:
+            return
+        with self._write_lock:
+            try:
+                self._rotate_if_needed()
+                offset = self._segment.tell()
+                chunks, rows = [], []
+                for entry in entries:
+                    line = (json.dumps(entry) + "\n").encode("utf-8")
+                    rows.append((entry["session_id"], self._segment_name, offset, len(line)))
+                    chunks.append(line)
+                    offset += len(line)
+                self._segment.write(b"".join(chunks))
+                self._segment.flush()
+            except Exception:
+                # Keep the entries for the next flush
+                with self._buffer_lock:
+                    self._buffer[:0] = entries
+                raise
+            if self.fsync == "always":
+                os.fsync(self._segment.fileno())
+            self._index.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)", rows)
+            self._index.commit()
+
+    def transcript(self, session_id: str) -> List[Dict]:
+        """All logged messages of a session, oldest first (buffered ones included)."""
+        self.flush()
+        with self._write_lock:
+            rows = self._index.execute(
+                "SELECT segment, offset, length FROM entries WHERE session_id = ? ORDER BY rowid",
+                (session_id,),
+            ).fetchall()
+        entries, files = [], {}
+        try:
+            for segment, offset, length in rows:
+                if segment not in files:
+                    files[segment] = open(os.path.join(self.directory, segment), "rb")
+                f = files[segment]
+                f.seek(offset)
+                entries.append(json.loads(f.read(length)))
+        finally:
+            for f in files.values():
+                f.close()
+        return entries
+
+    def close(self) -> None:
+        """Flush the remaining entries and close the current segment."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self.flush()
+        with self._write_lock:
+            self._close_segment()
+
+    def _rotate_if_needed(self) -> None:
+        if self._segment is not None:
+            too_big = self._segment.tell() >= self.segment_bytes
+            too_old = time.time() - self._segment_opened >= self.segment_seconds
+            if not (too_big or too_old):
+                return
+            self._close_segment()
+        self._segment_opened = time.time()
+        self._segment_name = f"segment-{int(self._segment_opened * 1000):013d}.jsonl"
+        self._segment = open(os.path.join(self.directory, self._segment_name), "ab")
+
+    def _close_segment(self) -> None:
+        if self._segment is None:
+            return
+        self._segment.flush()
+        if self.fsync != "never":
+            os.fsync(self._segment.fileno())
+        self._segment.close()
+        self._segment = None
+
+    def _flush_forever(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Failed to flush conversation log: {e}")
+
+
+conversation_log = Lazy("conversation_log", ConversationLog)
+
+
+def log_short_term(session_id: str, role: str, content: str):
+    """Log one message of a session without blocking on disk I/O."""
+    conversation_log.get().append(session_id, role, content)
+
+
+def session_transcript(session_id: str) -> List[Dict]:
+    """Every logged message of a session, oldest first."""
+    return conversation_log.get().transcript(session_id)
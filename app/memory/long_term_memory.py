@@ -1,51 +1,463 @@
-import os
-from datetime import datetime
-from langchain_community.embeddings.sentence_transformer import SentenceTransformerEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.docstore.in_memory import InMemoryDocstore
-
-from langchain_core.documents import Document
-import faiss
-
-# Initialize FastEmbed embeddings (lightweight, CPU-based, no PyTorch)
-embedding_function = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-
-
-# Create a data directory in the current workspace
-data_dir = os.path.join(os.path.dirname(__file__), "..", "datastore")
-os.makedirs(data_dir, exist_ok=True)
-
-# Initialize FAISS index with the correct dimension from embedding size
-embedding_dim = len(embedding_function.embed_query("test"))
-index = faiss.IndexFlatL2(embedding_dim)
-
-# Initialize FAISS vector store with a proper in-memory docstore
-vector_store = FAISS(
-    embedding_function=embedding_function,
-    index=index,
-    docstore=InMemoryDocstore(),
-    index_to_docstore_id={},
-)
-
-
-# 1. Add to long-term with metadata
-def add_to_long_term(text, metadata=None):
-    metadata = metadata or {}
-    metadata.setdefault("date", datetime.now().strftime("%Y-%m-%d"))
-    metadata.setdefault("type", "chat")
-    doc = Document(page_content=text, metadata=metadata)
-    vector_store.add_documents([doc])
-    # Note: FAISS does not have a built-in persist method; you can save manually if needed
-
-# 2. Search long-term memory
-def search_long_term(query, k=4):
-    results = vector_store.similarity_search(query, k=k)
-    return [(doc.page_content, doc.metadata) for doc in results]
-
-# Optional: Save and load FAISS index manually if persistence is needed
-def save_faiss_index(path):
-    vector_store.index.save_local(path)
-
-def load_faiss_index(path):
-    vector_store.index = faiss.read_index(path)
-
+import argparse
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+import faiss
+import numpy as np
+from langchain_community.embeddings.sentence_transformer import SentenceTransformerEmbeddings
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from core.lazy import Lazy
+from core.metrics import lazy_stats, registry
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# "torch" (default) or "onnx" for the int8-quantized ONNX export of the model
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers model running on the ONNX Runtime CPU backend."""
+
+    def __init__(self, model_name: str, file_name: str, batch_size: int = EMBEDDING_BATCH_SIZE):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": file_name})
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(texts, batch_size=self.batch_size).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embedding layer in front of the model: an LRU cache keyed by a hash of the
+    normalized text, and a single batched model call for all the cache misses of
+    `embed_documents`. Throughput of the model calls is tracked in `stats()`.
+    """
+
+    def __init__(self, base: Embeddings, max_entries: int = EMBEDDING_CACHE_SIZE,
+                 batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.base = base
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.texts_embedded = 0
+        self.model_calls = 0
+        self.model_seconds = 0.0
+
+    @staticmethod
+    def _key(text: str) -> str:
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    vectors[i] = self._cache[key]
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+                    self.misses += 1
+
+        if missing:
+            batch = [texts[positions[0]] for positions in missing.values()]
+            computed = []
+            for start in range(0, len(batch), self.batch_size):
+                began = time.perf_counter()
+                computed.extend(self.base.embed_documents(batch[start:start + self.batch_size]))
+                with self._lock:
+                    self.model_seconds += time.perf_counter() - began
+                    self.model_calls += 1
+            with self._lock:
+                self.texts_embedded += len(batch)
+                for (key, positions), vector in zip(missing.items(), computed):
+                    for i in positions:
+                        vectors[i] = vector
+                    self._cache[key] = vector
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def dimension(self) -> int:
+        """Embedding size, read from the model metadata rather than by embedding a probe text."""
+        model = getattr(self.base, "client", None) or getattr(self.base, "model", None)
+        if model is not None and hasattr(model, "get_sentence_embedding_dimension"):
+            return model.get_sentence_embedding_dimension()
+        return len(self.embed_query("test"))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "cache_entries": len(self._cache),
+                "texts_embedded": self.texts_embedded,
+                "model_calls": self.model_calls,
+                "model_seconds": self.model_seconds,
+                "texts_per_second": self.texts_embedded / self.model_seconds if self.model_seconds else 0.0,
+            }
+
+
+def _create_embeddings() -> CachedEmbeddings:
+    if EMBEDDING_BACKEND == "onnx":
+        # The ONNX backend needs sentence-transformers>=3.2 and optimum[onnxruntime]
+        try:
+            return CachedEmbeddings(OnnxEmbeddings(EMBEDDING_MODEL, EMBEDDING_ONNX_FILE))
+        except Exception as e:  # older sentence-transformers: TypeError, no optimum: Exception
+            logging.warning(
+                f"ONNX embeddings unavailable ({e}): falling back to torch. "
+                "Install sentence-transformers>=3.2 and optimum[onnxruntime] to use EMBEDDING_BACKEND=onnx"
+            )
+    # Initialize FastEmbed embeddings (lightweight, CPU-based, no PyTorch)
+    return CachedEmbeddings(SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL))
+
+
+# The model is loaded on first use (or by the start-up warm-up), not at import
+embeddings = Lazy("embeddings", _create_embeddings)
+registry.register_stats("embeddings", lazy_stats(embeddings))
+
+
+def get_embeddings() -> CachedEmbeddings:
+    return embeddings.get()
+
+
+# Data directory in the current workspace (created by the store when first used)
+data_dir = os.path.join(os.path.dirname(__file__), "..", "datastore")
+
+# Persistent long-term store: ANN index + SQLite docstore
+LONG_TERM_DIR = os.path.join(data_dir, "long_term")
+INDEX_KIND = os.getenv("LONG_TERM_INDEX", "hnsw")  # "hnsw" or "ivf"
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 8
+# Filtered searches over at most this many vectors compare them all (exact, and always
+# k results, where HNSW with an ID selector can miss neighbours in small partitions)
+FLAT_SEARCH_MAX = 4096
+# Snapshot the index after this many appends, or this many seconds after the last snapshot
+SNAPSHOT_EVERY = int(os.getenv("LONG_TERM_SNAPSHOT_EVERY", "50"))
+SNAPSHOT_INTERVAL = int(os.getenv("LONG_TERM_SNAPSHOT_INTERVAL", "300"))
+
+
+def new_index(kind: str, dim: int, training: Optional[np.ndarray] = None):
+    """
+    Create an empty ANN index with external ids. IVF needs training vectors,
+    without them (or for an unknown kind) an HNSW index is created.
+    """
+    if kind == "ivf" and training is not None and len(training) > 0:
+        nlist = max(1, int(np.sqrt(len(training))))
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        index.train(training)
+        index.nprobe = min(IVF_NPROBE, nlist)
+        return index
+    index = faiss.IndexHNSWFlat(dim, HNSW_M)
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return faiss.IndexIDMap2(index)
+
+
+def _is_mapped(index) -> bool:
+    """Whether the inverted lists of an index are memory-mapped from its file."""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return False  # only IVF lists are mapped, other indexes are read into memory
+    return isinstance(faiss.downcast_InvertedLists(ivf.invlists), faiss.OnDiskInvertedLists)
+
+
+class LongTermStore:
+    """
+    Long-term memory kept on disk: an ANN index (HNSW or IVF) whose vector ids are
+    the row ids of a SQLite docstore holding the texts and metadata.
+
+    A store opened `read_only` memory-maps the index when FAISS supports it for the
+    index type (IVF lists); the first append then reads it into memory. Appends are snapshotted to disk every
+    SNAPSHOT_EVERY documents or SNAPSHOT_INTERVAL seconds, and at exit.
+
+    Documents are partitioned by `user_id` and `date` (indexed columns of the docstore,
+    mirrored by in-memory inverted indexes), so filtered searches only visit the vectors
+    of the matching partitions through a FAISS ID selector.
+    """
+
+    # Metadata keys with an inverted index, usable for pre-filtering
+    PARTITION_KEYS = ("user_id", "date")
+
+    def __init__(self, embeddings, directory: str = LONG_TERM_DIR, dim: Optional[int] = None,
+                 read_only: bool = False):
+        os.makedirs(directory, exist_ok=True)
+        self.embeddings = embeddings
+        self.dim = dim or embeddings.dimension()
+        self.index_path = os.path.join(directory, "index.faiss")
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(directory, "docstore.db"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, text TEXT, metadata TEXT)")
+        self._migrate()
+        self._partitions: Dict[str, Dict[str, Set[int]]] = {key: defaultdict(set) for key in self.PARTITION_KEYS}
+        for row in self._db.execute(f"SELECT id, {', '.join(self.PARTITION_KEYS)} FROM docs"):
+            self._index_partitions(row[0], dict(zip(self.PARTITION_KEYS, row[1:])))
+        self._pending = 0
+        self._last_snapshot = time.time()
+        self._mmapped = False
+        self.index = self._load_index(mmap=read_only)
+        if self.index.ntotal < self._count():
+            print("Long-term index is behind its docstore, re-indexing missing documents")
+            self._reindex_missing()
+
+    def _migrate(self):
+        # Docstores created before partitioning only have the metadata JSON column
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(docs)")}
+        for key in self.PARTITION_KEYS:
+            if key not in columns:
+                self._db.execute(f"ALTER TABLE docs ADD COLUMN {key} TEXT")
+                self._db.execute(f"UPDATE docs SET {key} = json_extract(metadata, '$.{key}')")
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS docs_{key} ON docs ({key})")
+        self._db.commit()
+
+    def _index_partitions(self, doc_id: int, metadata: Dict):
+        for key in self.PARTITION_KEYS:
+            if metadata.get(key) is not None:
+                self._partitions[key][str(metadata[key])].add(doc_id)
+
+    def _candidates(self, filter: Dict) -> Optional[Set[int]]:
+        """Ids allowed by the partition keys of `filter`, or None if it has none."""
+        candidates = None
+        for key in self.PARTITION_KEYS:
+            if key in filter:
+                ids = self._partitions[key].get(str(filter[key]), set())
+                candidates = set(ids) if candidates is None else candidates & ids
+        return candidates
+
+    def _load_index(self, mmap: bool = False):
+        if not os.path.exists(self.index_path):
+            return new_index(INDEX_KIND, self.dim)
+        if mmap:
+            try:
+                index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP)
+                self._mmapped = _is_mapped(index)
+                return index
+            except RuntimeError:
+                pass
+        return faiss.read_index(self.index_path)
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def _reindex_missing(self):
+        # Documents committed after the last snapshot (e.g. after a crash)
+        rows = self._db.execute("SELECT id, text FROM docs ORDER BY id").fetchall()[self.index.ntotal:]
+        vectors = np.asarray(self.embeddings.embed_documents([text for _, text in rows]), dtype="float32")
+        self._writable()
+        self.index.add_with_ids(vectors, np.asarray([row_id for row_id, _ in rows], dtype="int64"))
+        self.snapshot()
+
+    def _writable(self):
+        if self._mmapped:
+            # Memory-mapped (on-disk) lists are read-only and cannot be cloned: read
+            # the index into memory instead (it has no changes beyond the file)
+            self.index = faiss.read_index(self.index_path)
+            self._mmapped = False
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict]] = None) -> List[int]:
+        """Embed and append documents, returning their ids."""
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype="float32")
+        with self._lock:
+            self._writable()
+            self._db.executemany(
+                f"INSERT INTO docs (text, metadata, {', '.join(self.PARTITION_KEYS)}) VALUES (?, ?, ?, ?)",
+                [(text, json.dumps(metadata), *(metadata.get(key) for key in self.PARTITION_KEYS))
+                 for text, metadata in zip(texts, metadatas)],
+            )
+            last_id = self._db.execute("SELECT MAX(id) FROM docs").fetchone()[0]
+            ids = list(range(last_id - len(texts) + 1, last_id + 1))
+            self.index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+            self._db.commit()
+            for doc_id, metadata in zip(ids, metadatas):
+                self._index_partitions(doc_id, metadata)
+            self._pending += len(texts)
+            if self._pending >= SNAPSHOT_EVERY or time.time() - self._last_snapshot > SNAPSHOT_INTERVAL:
+                self.snapshot()
+        return ids
+
+    def add_documents(self, documents: List[Document]) -> List[int]:
+        return self.add_texts([d.page_content for d in documents], [d.metadata for d in documents])
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict] = None) -> List[Document]:
+        """
+        Return the k nearest documents whose metadata match `filter`. Partition keys
+        (user_id, date) restrict the search itself; other keys are checked afterwards.
+        None never lifts a restriction: a partition key set to None matches no document,
+        another key set to None only the documents without it.
+        """
+        filter = dict(filter or {})
+        vector = np.asarray([self.embeddings.embed_query(query)], dtype="float32")
+        with self._lock:
+            if self.index.ntotal == 0:
+                return []
+            candidates = self._candidates(filter)
+            if candidates is None:
+                fetch_k = k * 4 if filter else k
+                _, ids = self.index.search(vector, min(fetch_k, self.index.ntotal))
+            elif not candidates:
+                return []
+            else:
+                residual = any(key not in self.PARTITION_KEYS for key in filter)
+                fetch_k = min(k * 4 if residual else k, len(candidates))
+                if len(candidates) <= FLAT_SEARCH_MAX and isinstance(self.index, faiss.IndexIDMap2):
+                    ids = self._flat_search(vector, candidates, fetch_k)
+                else:
+                    _, ids = self.index.search(vector, fetch_k, params=self._search_params(candidates))
+        results = []
+        for doc_id in ids[0]:
+            if doc_id == -1:
+                continue
+            doc = self._get(int(doc_id))
+            if doc is None or any(doc.metadata.get(key) != value for key, value in filter.items()):
+                continue
+            results.append(doc)
+            if len(results) == k:
+                break
+        return results
+
+    def _flat_search(self, vector: np.ndarray, ids: Set[int], k: int) -> np.ndarray:
+        """Exact search over the given vectors, reconstructed from the index."""
+        ids = np.asarray(sorted(ids), dtype="int64")
+        flat = faiss.IndexFlatL2(self.dim)
+        flat.add(self.index.reconstruct_batch(ids))
+        _, positions = flat.search(vector, k)
+        return np.where(positions >= 0, ids[positions], -1)
+
+    def _search_params(self, ids: Set[int]):
+        selector = faiss.IDSelectorBatch(np.asarray(sorted(ids), dtype="int64"))
+        if isinstance(self.index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.index.nprobe)
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=HNSW_EF_SEARCH)
+
+    def _get(self, doc_id: int) -> Optional[Document]:
+        with self._lock:
+            row = self._db.execute("SELECT text, metadata FROM docs WHERE id = ?", (doc_id,)).fetchone()
+        return Document(page_content=row[0], metadata=json.loads(row[1])) if row else None
+
+    def snapshot(self, path: Optional[str] = None):
+        """Atomically write the index to disk."""
+        path = path or self.index_path
+        with self._lock:
+            faiss.write_index(self.index, path + ".tmp")
+            os.replace(path + ".tmp", path)
+            self._pending = 0
+            self._last_snapshot = time.time()
+
+    def load(self, path: str):
+        """
+        Replace the index with the one saved at `path`, re-indexing the documents it
+        is missing, and snapshot it as the store's index.
+        """
+        index = faiss.read_index(path)
+        with self._lock:
+            self.index = index
+            self._mmapped = False
+            if self.index.ntotal < self._count():
+                self._reindex_missing()
+            else:
+                self.snapshot()
+
+    def rebuild(self, kind: str = INDEX_KIND, batch_size: int = 256):
+        """
+        Rebuild (and for IVF retrain) the index from the docstore. Meant to run
+        offline, e.g. to switch index type or after changing the embedding model.
+        """
+        rows = self._db.execute("SELECT id, text FROM docs ORDER BY id").fetchall()
+        vectors = np.zeros((len(rows), self.dim), dtype="float32")
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            vectors[start:start + len(batch)] = self.embeddings.embed_documents([text for _, text in batch])
+        index = new_index(kind, self.dim, training=vectors)
+        if rows:
+            index.add_with_ids(vectors, np.asarray([row_id for row_id, _ in rows], dtype="int64"))
+        with self._lock:
+            self.index = index
+            self._mmapped = False
+            self.snapshot()
+
+
+vector_store = Lazy("vector_store", lambda: LongTermStore(get_embeddings()))
+
+
+def get_vector_store() -> LongTermStore:
+    return vector_store.get()
+
+
+@atexit.register
+def _snapshot_on_exit():
+    if vector_store.initialized and vector_store.get()._pending:
+        vector_store.get().snapshot()
+
+
+# 1. Add to long-term with metadata
+def add_to_long_term(text, metadata=None):
+    metadata = metadata or {}
+    metadata.setdefault("date", datetime.now().strftime("%Y-%m-%d"))
+    metadata.setdefault("type", "chat")
+    doc = Document(page_content=text, metadata=metadata)
+    get_vector_store().add_documents([doc])
+
+# 1b. Bulk insert: all texts are embedded in batched model calls
+def add_batch_to_long_term(texts, metadatas=None):
+    metadatas = [dict(m) for m in metadatas] if metadatas else [{} for _ in texts]
+    for metadata in metadatas:
+        metadata.setdefault("date", datetime.now().strftime("%Y-%m-%d"))
+        metadata.setdefault("type", "chat")
+    return get_vector_store().add_texts(list(texts), metadatas)
+
+# 2. Search long-term memory
+def search_long_term(query, k=4):
+    results = get_vector_store().similarity_search(query, k=k)
+    return [(doc.page_content, doc.metadata) for doc in results]
+
+# Optional: Save and load FAISS index manually (the store also snapshots on its own)
+def save_faiss_index(path):
+    get_vector_store().snapshot(path)
+
+def load_faiss_index(path):
+    get_vector_store().load(path)
+
+
+if __name__ == "__main__":
+    # Offline maintenance: python -m memory.long_term_memory rebuild --kind ivf
+    parser = argparse.ArgumentParser(description="Long-term memory maintenance")
+    parser.add_argument("command", choices=["rebuild", "snapshot"])
+    parser.add_argument("--kind", choices=["hnsw", "ivf"], default=INDEX_KIND)
+    args = parser.parse_args()
+    store = get_vector_store()
+    if args.command == "rebuild":
+        store.rebuild(args.kind)
+    else:
+        store.snapshot()
+    print(f"Long-term index: {store.index.ntotal} vectors")
@@ -1,45 +1,116 @@
 # memory_manager.py
+import logging
 from datetime import datetime
-from langchain_core.messages import AIMessage
-from memory.long_term_memory import vector_store, add_to_long_term
-from memory.short_term_memory import get_redis_history
+from langchain_core.messages import AIMessage, HumanMessage
+from core.metrics import span
+from memory.long_term_memory import get_vector_store
+from memory.short_term_memory import decode_message, get_redis_history
+from memory.context_builder import HISTORY_MAX_MESSAGES, build_context, fold_into_summary
+from memory.summary_queue import submit_summary
 from dateparser import parse as parse_date
 
+# Redis key holding the rolling summary of turns trimmed from a session's history
+SUMMARY_KEY_PREFIX = "summary:"
+
 
 class MemoryManager:
     def __init__(self, session_id, user_id=None):
         self.session_id = session_id
         self.user_id = user_id
-        self.history = get_redis_history(session_id)
+        self._history = None  # Redis client created on first use
+        self._summary = None  # used when the history is not backed by Redis
+
+    @property
+    def history(self):
+        if self._history is None:
+            self._history = get_redis_history(self.session_id)
+        return self._history
 
     def fetch_context(self, query):
         """
         Check short-term memory first. If no relevant info found,
-        fallback to long-term memory via vector search.
+        fallback to long-term memory via vector search. The result is
+        deduplicated and bounded by the context token budget.
         """
         try:
-            short_msgs = self.history.messages
+            with span("memory_redis"):
+                short_msgs = self.history.recent(HISTORY_MAX_MESSAGES)
             short_texts = [m.content for m in short_msgs if hasattr(m, "content")]
 
             # 1. Check if query is relevant to recent conversation
             if any(query.lower() in msg.lower() for msg in short_texts[-5:]):
-                return short_msgs  # short-term is enough
+                return build_context(short_msgs, self.get_summary())  # short-term is enough
         except Exception as e:
-            print(f"Redis connection failed, using fallback: {e}")
+            logging.warning(f"Redis connection failed, using fallback: {e}")
             short_msgs = []
             short_texts = []
 
-        # 2. Fallback: extract date if any, then vector search with metadata
-        parsed_date = self.extract_date(query)
-        metadata_filter = {"date": parsed_date} if parsed_date else None
+        # 2. Fallback: extract date if any, then vector search restricted to
+        # this user's (and that date's) partition of the long-term store.
+        # Anonymous users have no partition: their summaries are not shared
+        if self.user_id is None:
+            return build_context(short_msgs, self.get_summary())
+        with span("memory_dateparser"):
+            parsed_date = self.extract_date(query)
+        metadata_filter = {"user_id": self.user_id}
+        if parsed_date:
+            metadata_filter["date"] = parsed_date
 
         try:
-            docs = vector_store.similarity_search(query, k=2, metadata=metadata_filter)
+            with span("memory_faiss"):
+                docs = get_vector_store().similarity_search(query, k=2, filter=metadata_filter)
             retrieved = [AIMessage(content=doc.page_content) for doc in docs]
-            return short_msgs + retrieved
+            return build_context(short_msgs, self.get_summary(), retrieved)
         except Exception as e:
-            print(f"Vector store failed, returning empty context: {e}")
-            return short_msgs
+            logging.warning(f"Vector store failed, returning empty context: {e}")
+            return build_context(short_msgs, self.get_summary())
+
+    def record_turn(self, user_text, ai_text):
+        """
+        Store one user/assistant exchange, then trim the history so it stays bounded.
+        """
+        length = self.history.add_messages([HumanMessage(content=user_text), AIMessage(content=ai_text)])
+        self.trim(length=length)
+
+    def trim(self, max_messages=HISTORY_MAX_MESSAGES, length=None):
+        """
+        Keep only the last `max_messages` messages, folding the dropped ones
+        into the rolling summary. `length` is the current history length, when
+        the caller already knows it.
+        """
+        if length is None:
+            length = self.history.length()
+        excess = length - max_messages
+        if excess <= 0:
+            return
+
+        client = getattr(self.history, "redis_client", None)
+        if client is not None:
+            # Messages are appended to the tail of the list: the oldest come first
+            dropped = [decode_message(item) for item in client.lrange(self.history.key, 0, excess - 1)]
+            summary = fold_into_summary(self.get_summary(), dropped)
+            pipe = client.pipeline()
+            pipe.ltrim(self.history.key, -max_messages, -1)
+            if summary:
+                pipe.set(SUMMARY_KEY_PREFIX + self.session_id, summary, ex=self.history.ttl)
+            pipe.execute()
+        else:
+            self._summary = fold_into_summary(self._summary, self.history.messages[:excess])
+            del self.history.messages[:excess]
+
+    def get_summary(self):
+        """
+        Rolling summary of the turns already trimmed from the history, if any.
+        """
+        client = getattr(self.history, "redis_client", None)
+        if client is None:
+            return self._summary
+        try:
+            summary = client.get(SUMMARY_KEY_PREFIX + self.session_id)
+            return summary.decode("utf-8") if summary else None
+        except Exception as e:
+            logging.warning(f"Failed to read conversation summary: {e}")
+            return None
 
     def extract_date(self, text):
         """
@@ -48,22 +119,36 @@ class MemoryManager:
         dt = parse_date(text, settings={"RELATIVE_BASE": datetime.now()})
         return dt.strftime("%Y-%m-%d") if dt else None
 
+    def build_summary(self):
+        """
+        Extract the full conversation as a long-term memory summary.
+        Returns (text, metadata), or None when there is too little to keep.
+        """
+        all_msgs = self.history.messages
+        full_text = "\n".join(m.content for m in all_msgs if hasattr(m, "content"))
+        summary = self.get_summary()
+        if summary:
+            full_text = f"Earlier requests: {summary}\n{full_text}"
+        if len(full_text.strip()) <= 100:  # basic cutoff for useful content
+            return None
+        metadata = {
+            "date": datetime.now().strftime("%Y-%m-%d"),
+            "type": "summary",
+            "session_id": self.session_id
+        }
+        if self.user_id:  # Add user_id to metadata if available
+            metadata["user_id"] = self.user_id
+        return full_text, metadata
+
     def store_summary(self):
         """
-        Extract full conversation and store it as long-term memory summary.
-        Can be triggered periodically or after session ends.
+        Queue the conversation summary for storage in long-term memory.
+        Can be triggered periodically or after session ends; embedding and
+        indexing happen on the background summary queue.
         """
         try:
-            all_msgs = self.history.messages
-            full_text = "\n".join(m.content for m in all_msgs if hasattr(m, "content"))
-            if len(full_text.strip()) > 100:  # basic cutoff for useful content
-                metadata = {
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "type": "summary",
-                    "session_id": self.session_id
-                }
-                if self.user_id:  # Add user_id to metadata if available
-                    metadata["user_id"] = self.user_id
-                add_to_long_term(full_text, metadata=metadata)
+            built = self.build_summary()
+            if built:
+                submit_summary(*built)
         except Exception as e:
-            print(f"Failed to store memory summary: {e}")
+            logging.warning(f"Failed to store memory summary: {e}")
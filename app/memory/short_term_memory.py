@@ -1,77 +1,389 @@
-import os
-from datetime import datetime
-import json
-from memory import SYSTEM_INSTRUCTION
-from langchain_community.chat_message_histories.redis import RedisChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_ollama import ChatOllama
-from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-
-
-# Setup path to store logs
-LOG_FILE = os.path.join(os.path.dirname(__file__), "..", "datastore", "short_term_log.jsonl")
-os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-
-# 1. Function to log short-term messages with timestamp
-def log_short_term(session_id: str, role: str, content: str):
-    entry = {
-        "session_id": session_id,
-        "role": role,
-        "content": content,
-        "timestamp": datetime.now().isoformat()
-    }
-    with open(LOG_FILE, "a") as f:
-        f.write(json.dumps(entry) + "\n")
-
-# Create a prompt template
-prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", SYSTEM_INSTRUCTION),
-        MessagesPlaceholder(variable_name="history"),
-        ("human", "{input}"),
-    ]
-)
-
-# Initialize the language model
-llm = ChatOllama(
-    model="llama3.2",
-    base_url=os.getenv("OLLAMA_URL", "http://localhost:11434"),
-)
-
-# Create the conversational chain
-chain = prompt | llm
-
-
-# Simple in-memory chat history fallback
-class SimpleChatHistory(BaseChatMessageHistory):
-    def __init__(self):
-        self._messages = []
-    
-    @property
-    def messages(self):
-        return self._messages
-    
-    def add_message(self, message):
-        self._messages.append(message)
-    
-    def clear(self):
-        self._messages.clear()
-
-# Function to get or create a RedisChatMessageHistory instance with TTL
-def get_redis_history(session_id: str) -> BaseChatMessageHistory:
-    try:
-        # Set TTL to 30 minutes (1800 seconds)
-        return RedisChatMessageHistory(session_id, url=REDIS_URL, ttl=1800)
-    except Exception as e:
-        print(f"Redis connection failed, using in-memory fallback: {e}")
-        # Return a simple in-memory chat history as fallback
-        return SimpleChatHistory()
-
-
-# Create a runnable with message history
-chain_with_history = RunnableWithMessageHistory(
-    chain, get_redis_history, input_messages_key="input", history_messages_key="history"
-)
\ No newline at end of file
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import json
+from typing import AsyncIterator, Callable, List, Optional
+
+import faiss
+import numpy as np
+from core.lazy import Lazy
+from core.metrics import lazy_stats, registry, span
+from core.scheduler import scheduler
+from memory import SYSTEM_INSTRUCTION
+from memory.conversation_log import log_short_term  # noqa: F401  (buffered, segmented log)
+from memory.long_term_memory import get_embeddings
+import redis
+from langchain_ollama import ChatOllama
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import (
+    AIMessage, BaseMessage, HumanMessage, SystemMessage, message_to_dict, messages_from_dict
+)
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Chat history lifetime in Redis, refreshed on every append
+HISTORY_TTL = 1800
+HISTORY_KEY_PREFIX = "chat:"
+
+# Semantic cache of prompt enhancements: cosine similarity above which a cached
+# enhancement is reused, maximum number of cached prompts, and users who opted out
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+SEMANTIC_CACHE_OPT_OUT = {u for u in os.getenv("SEMANTIC_CACHE_OPT_OUT", "").split(",") if u}
+
+# Prompt enhancement: the word budget of the system prompt (generation stops once it is
+# reached), a hard cap on generated tokens, and how long Ollama keeps the model loaded
+# after a request (so a burst after a pause does not pay a cold load)
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3.2")
+ENHANCE_MAX_WORDS = int(os.getenv("ENHANCE_MAX_WORDS", "60"))
+ENHANCE_NUM_PREDICT = int(os.getenv("ENHANCE_NUM_PREDICT", "128"))
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+LLM_FIRST_TOKEN_SECONDS = registry.histogram("llm_first_token_seconds", "Time to the first streamed LLM token")
+LLM_EARLY_STOPS = registry.counter("llm_early_stops_total", "Enhancements cut at the word budget")
+
+
+# Create a prompt template. The system instruction comes first and never changes, so
+# Ollama reuses its evaluated prefix across requests instead of re-reading it each time.
+prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", SYSTEM_INSTRUCTION),
+        MessagesPlaceholder(variable_name="history"),
+        ("human", "{input}"),
+    ]
+)
+
+# Initialize the language model and the conversational chain on first use
+def _create_chain():
+    llm = ChatOllama(
+        model=LLM_MODEL,
+        base_url=os.getenv("OLLAMA_URL", "http://localhost:11434"),
+        num_predict=ENHANCE_NUM_PREDICT,
+        keep_alive=LLM_KEEP_ALIVE,
+    )
+    # Load the model and evaluate the system prefix now, rather than on the first request
+    try:
+        llm.invoke(prompt.format_messages(input="", history=[]), options={"num_predict": 1})
+    except Exception as e:
+        logging.warning(f"LLM preload failed, the first request will load the model: {e}")
+    return prompt | llm
+
+
+chain = Lazy("llm_chain", _create_chain)
+
+
+# Simple in-memory chat history fallback
+class SimpleChatHistory(BaseChatMessageHistory):
+    def __init__(self):
+        self._messages = []
+    
+    @property
+    def messages(self):
+        return self._messages
+    
+    def add_message(self, message):
+        self._messages.append(message)
+
+    def add_messages(self, messages):
+        self._messages.extend(messages)
+        return len(self._messages)
+
+    def recent(self, n: int) -> List[BaseMessage]:
+        return self._messages[-n:] if n > 0 else []
+
+    def length(self) -> int:
+        return len(self._messages)
+    
+    def clear(self):
+        self._messages.clear()
+
+
+# Compact message encoding: one type byte followed by the UTF-8 content; other
+# message types (tool calls, chunks...) fall back to LangChain's JSON form
+_TYPE_CODES = {HumanMessage: b"h", AIMessage: b"a", SystemMessage: b"s"}
+_CODE_TYPES = {code: cls for cls, code in _TYPE_CODES.items()}
+_JSON_CODE = b"j"
+
+
+def encode_message(message: BaseMessage) -> bytes:
+    code = _TYPE_CODES.get(type(message))
+    if code is not None and isinstance(message.content, str) and not message.additional_kwargs:
+        return code + message.content.encode("utf-8")
+    return _JSON_CODE + json.dumps(message_to_dict(message)).encode("utf-8")
+
+
+def decode_message(data: bytes) -> BaseMessage:
+    code, payload = data[:1], data[1:]
+    if code == _JSON_CODE:
+        return messages_from_dict([json.loads(payload)])[0]
+    return _CODE_TYPES[code](content=payload.decode("utf-8"))
+
+
+class RedisChatHistory(BaseChatMessageHistory):
+    """
+    Chat history stored as a Redis list, oldest message first.
+
+    All histories share one connection pool. Appends push every message and refresh
+    the TTL in a single pipelined round trip, and `recent(n)` reads only the tail of
+    the list instead of deserializing the whole conversation.
+    """
+
+    def __init__(self, session_id: str, client: "redis.Redis", ttl: int = HISTORY_TTL):
+        self.session_id = session_id
+        self.key = HISTORY_KEY_PREFIX + session_id
+        self.ttl = ttl
+        self.redis_client = client
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return [decode_message(item) for item in self.redis_client.lrange(self.key, 0, -1)]
+
+    def recent(self, n: int) -> List[BaseMessage]:
+        """The last `n` messages, oldest first."""
+        if n <= 0:
+            return []
+        return [decode_message(item) for item in self.redis_client.lrange(self.key, -n, -1)]
+
+    def length(self) -> int:
+        return self.redis_client.llen(self.key)
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages) -> int:
+        """Append messages and refresh the TTL in one round trip, returning the new length."""
+        if not messages:
+            return self.length()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.rpush(self.key, *(encode_message(m) for m in messages))
+        if self.ttl:
+            pipe.expire(self.key, self.ttl)
+        return pipe.execute()[0]
+
+    def clear(self) -> None:
+        self.redis_client.delete(self.key)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _redis_client() -> "redis.Redis":
+    """Client on the shared connection pool, created (and checked) on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = redis.ConnectionPool.from_url(REDIS_URL)
+            redis.Redis(connection_pool=pool).ping()
+            _pool = pool
+    return redis.Redis(connection_pool=_pool)
+
+
+def set_redis_pool(pool: "redis.ConnectionPool") -> None:
+    """Use the given connection pool for chat histories (e.g. a fakeredis one in benchmarks)."""
+    global _pool
+    with _pool_lock:
+        _pool = pool
+
+
+# Function to get or create a Redis-backed chat history with TTL
+def get_redis_history(session_id: str) -> BaseChatMessageHistory:
+    try:
+        return RedisChatHistory(session_id, _redis_client(), ttl=HISTORY_TTL)
+    except Exception as e:
+        logging.warning(f"Redis connection failed, using in-memory fallback: {e}")
+        # Return a simple in-memory chat history as fallback
+        return SimpleChatHistory()
+
+
+
+# Semantic cache in front of the enhancement chain
+class SemanticCache:
+    """
+    Reuses the enhancement of a previous prompt when a new prompt is close enough in
+    embedding space. Entries are scoped (by user and conversation context, see
+    `cache_scope`): a prompt only matches the prompts of its own scope. Embeddings are L2-normalized so the inner-product FAISS indexes
+    return cosine similarity; the least recently hit prompt is evicted when full.
+    """
+
+    def __init__(self, embeddings, threshold: float, max_entries: int):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._indexes = {}  # scope -> FAISS index of its prompts
+        self._entries = OrderedDict()  # FAISS id -> (scope, cached enhancement)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray([self.embeddings.embed_query(text)], dtype="float32")
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self, prompt: str, scope: str = "") -> Optional[str]:
+        vector = self._embed(prompt)
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is None:
+                self.misses += 1
+                return None
+            scores, ids = index.search(vector, 1)
+            entry_id = int(ids[0][0])
+            if entry_id == -1 or scores[0][0] < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return self._entries[entry_id][1]
+
+    def add(self, prompt: str, enhancement: str, scope: str = "") -> None:
+        vector = self._embed(prompt)
+        with self._lock:
+            while len(self._entries) >= self.max_entries:
+                oldest, (oldest_scope, _) = self._entries.popitem(last=False)
+                self._indexes[oldest_scope].remove_ids(np.asarray([oldest], dtype="int64"))
+                if self._indexes[oldest_scope].ntotal == 0:
+                    del self._indexes[oldest_scope]
+            if scope not in self._indexes:
+                self._indexes[scope] = faiss.IndexIDMap(faiss.IndexFlatIP(vector.shape[1]))
+            self._indexes[scope].add_with_ids(vector, np.asarray([self._next_id], dtype="int64"))
+            self._entries[self._next_id] = (scope, enhancement)
+            self._next_id += 1
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "scopes": len(self._indexes)}
+
+
+semantic_cache = Lazy(
+    "semantic_cache", lambda: SemanticCache(get_embeddings(), SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE)
+)
+registry.register_stats("semantic_cache", lazy_stats(semantic_cache))
+
+
+def cache_scope(user_id: Optional[str], history: List) -> str:
+    """
+    Semantic cache scope of a prompt: its user and a fingerprint of the context sent
+    with it, since "make it red" means something else in every conversation.
+    """
+    digest = hashlib.sha256()
+    for message in history:
+        digest.update(f"{getattr(message, 'type', '')}:{getattr(message, 'content', message)}\x00".encode("utf-8"))
+    return f"{user_id or ''}:{digest.hexdigest()[:16]}"
+
+
+def set_semantic_cache_opt_out(user_id: str, opt_out: bool = True):
+    """Exclude (or re-include) a user from semantic cache lookups and inserts."""
+    if opt_out:
+        SEMANTIC_CACHE_OPT_OUT.add(user_id)
+    else:
+        SEMANTIC_CACHE_OPT_OUT.discard(user_id)
+
+
+class WordBudget:
+    """
+    Cuts a streamed text after `max_words` words. `feed` returns the part of each
+    chunk that fits the budget; `exhausted` turns True once the budget is reached.
+    """
+
+    _WORD = re.compile(r"\S+")
+
+    def __init__(self, max_words: int = ENHANCE_MAX_WORDS):
+        self.max_words = max_words
+        self.text = ""
+        self.exhausted = False
+
+    def feed(self, chunk: str) -> str:
+        if self.exhausted:
+            return ""
+        start = len(self.text)
+        text = self.text + chunk
+        words = list(self._WORD.finditer(text))
+        if len(words) > self.max_words or (len(words) == self.max_words and text[-1:].isspace()):
+            text = text[:words[self.max_words - 1].end()]
+            self.exhausted = True
+        self.text = text
+        return text[start:]
+
+
+async def astream_enhancement(prompt: str, history: List, user_id: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Streams the LLM enhancement of a prompt. Generation is capped at
+    `ENHANCE_NUM_PREDICT` tokens and stopped as soon as `ENHANCE_MAX_WORDS` words were
+    produced (closing the stream makes Ollama stop generating).
+
+    Args:
+        prompt (str): The user prompt.
+        history (List): The conversation context (see memory.context_builder).
+        user_id (Optional[str]): The user, for fair scheduling of the LLM stage.
+
+    Returns:
+        AsyncIterator[str]: The text chunks of the enhancement, as generated.
+    """
+    budget = WordBudget()
+    # Creating the chain preloads the model: never on the event loop
+    llm_chain = await asyncio.to_thread(chain.get)
+    # Only the LLM call itself takes a slot of the (local, low-capacity) LLM stage
+    async with scheduler.slot("llm", user_id):
+        with span("llm"):
+            began = time.monotonic()
+            stream = llm_chain.astream({"input": prompt, "history": history})
+            try:
+                async for message in stream:
+                    if not message.content:
+                        continue
+                    if not budget.text:
+                        LLM_FIRST_TOKEN_SECONDS.observe(time.monotonic() - began)
+                    text = budget.feed(message.content)
+                    if text:
+                        yield text
+                    if budget.exhausted:
+                        LLM_EARLY_STOPS.inc()
+                        break
+            finally:
+                await stream.aclose()
+
+
+async def aenhance_prompt(prompt: str, history: List, user_id: Optional[str] = None,
+                          on_token: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Enhance a prompt through the LLM chain, returning a cached enhancement instead when
+    the same user enhanced a semantically similar prompt with the same context before
+    (unless they opted out). `on_token` receives the enhancement as it is generated (a
+    cached one at once).
+    """
+    use_cache = user_id not in SEMANTIC_CACHE_OPT_OUT
+    scope = cache_scope(user_id, history) if use_cache else ""
+    if use_cache:
+        try:
+            with span("semantic_cache"):
+                cached = await asyncio.to_thread(semantic_cache.get().lookup, prompt, scope)
+            if cached is not None:
+                if on_token is not None:
+                    on_token(cached)
+                return cached
+        except Exception as e:
+            logging.warning(f"Semantic cache lookup failed, calling the LLM: {e}")
+
+    # The history is built by the caller (see memory.context_builder) and the turn is
+    # recorded by the caller too, so the plain chain is used rather than a history wrapper
+    chunks = []
+    async for text in astream_enhancement(prompt, history, user_id):
+        chunks.append(text)
+        if on_token is not None:
+            on_token(text)
+    enhancement = "".join(chunks).strip()
+
+    if use_cache:
+        try:
+            await asyncio.to_thread(semantic_cache.get().add, prompt, enhancement, scope)
+        except Exception as e:
+            logging.warning(f"Failed to update semantic cache: {e}")
+    return enhancement
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from core.lazy import Lazy
+from core.metrics import lazy_stats, registry
+from memory.long_term_memory import add_batch_to_long_term, data_dir
+
+SUMMARY_QUEUE_DB = os.path.join(data_dir, "summary_queue.db")
+SUMMARY_QUEUE_SIZE = int(os.getenv("SUMMARY_QUEUE_SIZE", "1000"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "2"))
+# Summaries embedded together in one batch, and how long a worker waits to fill a batch
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "16"))
+SUMMARY_BATCH_WAIT = 0.5
+# Failed batches are retried with exponential backoff (capped), up to this many attempts per summary
+SUMMARY_MAX_ATTEMPTS = 5
+SUMMARY_MAX_BACKOFF = 60
+
+
+class SummaryQueue:
+    """
+    Background queue storing session summaries into long-term memory.
+
+    Every summary is first written to a SQLite journal and only deleted once it is
+    in the long-term store, so pending summaries survive a restart (at-least-once
+    delivery). Journal ids go through a bounded in-memory queue; a pool of workers
+    takes them in batches so the embeddings of several sessions are computed in one
+    batched call. Summaries that do not fit in the queue stay in the journal and are
+    picked up once the queue drains; so do the summaries of a failed batch, which are
+    not picked up again before their backoff deadline (`not_before`).
+    """
+
+    def __init__(self, path: str = SUMMARY_QUEUE_DB, maxsize: int = SUMMARY_QUEUE_SIZE,
+                 workers: int = SUMMARY_WORKERS, batch_size: int = SUMMARY_BATCH_SIZE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pending "
+            "(id INTEGER PRIMARY KEY, text TEXT, metadata TEXT, enqueued_at REAL, attempts INTEGER DEFAULT 0, "
+            "not_before REAL DEFAULT 0)"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(pending)")]
+        if "not_before" not in columns:  # journal of an older version
+            self._db.execute("ALTER TABLE pending ADD COLUMN not_before REAL DEFAULT 0")
+        self._db.commit()
+        self._db_lock = threading.Lock()
+        self._queue: "queue.Queue[int]" = queue.Queue(maxsize)
+        self._queued = set()  # journal ids currently in the queue or being processed
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+
+        # Resume the summaries left pending by a previous run
+        self._refill()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"summary-worker-{i}", daemon=True).start()
+
+    def submit(self, text: str, metadata: Dict) -> int:
+        """Journal a summary and queue it for storage, returning its journal id."""
+        with self._db_lock:
+            cursor = self._db.execute(
+                "INSERT INTO pending (text, metadata, enqueued_at) VALUES (?, ?, ?)",
+                (text, json.dumps(metadata), time.time()),
+            )
+            self._db.commit()
+        self._enqueue(cursor.lastrowid)
+        return cursor.lastrowid
+
+    def _enqueue(self, row_id: int) -> bool:
+        with self._lock:
+            if row_id in self._queued:
+                return True
+            try:
+                self._queue.put_nowait(row_id)
+            except queue.Full:
+                return False  # stays in the journal until the queue drains
+            self._queued.add(row_id)
+            return True
+
+    def _refill(self):
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT id FROM pending WHERE attempts < ? AND not_before <= ? ORDER BY id",
+                (SUMMARY_MAX_ATTEMPTS, time.time()),
+            ).fetchall()
+        for (row_id,) in rows:
+            if not self._enqueue(row_id):
+                break
+
+    def _next_batch(self) -> List[int]:
+        try:
+            batch = [self._queue.get(timeout=1.0)]
+        except queue.Empty:
+            self._refill()
+            return []
+        deadline = time.monotonic() + SUMMARY_BATCH_WAIT
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._process(batch)
+
+    def _process(self, batch: List[int]):
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT id, text, metadata, attempts FROM pending WHERE id IN ({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall()
+        try:
+            if rows:
+                add_batch_to_long_term([row[1] for row in rows], [json.loads(row[2]) for row in rows])
+            with self._db_lock:
+                self._db.executemany("DELETE FROM pending WHERE id = ?", [(row[0],) for row in rows])
+                self._db.commit()
+            with self._lock:
+                self.processed += len(rows)
+                self.batches += 1
+                self._queued.difference_update(batch)
+        except Exception as e:
+            logging.warning(f"Failed to store {len(rows)} session summaries, will retry: {e}")
+            # The rows go back to the journal with a deadline instead of the worker sleeping
+            # on them: `_refill` only queues them again once it has passed
+            now = time.time()
+            with self._db_lock:
+                self._db.executemany(
+                    "UPDATE pending SET attempts = attempts + 1, not_before = ? WHERE id = ?",
+                    [(now + min(2 ** (row[3] + 1), SUMMARY_MAX_BACKOFF), row[0]) for row in rows],
+                )
+                self._db.commit()
+            with self._lock:
+                self.failed += len(rows)
+                self._queued.difference_update(batch)
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and delivery counters."""
+        with self._db_lock:
+            journaled = self._db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "in_flight": len(self._queued),
+                "journaled": journaled,
+                "processed": self.processed,
+                "failed": self.failed,
+                "batches": self.batches,
+            }
+
+
+summary_queue = Lazy("summary_queue", SummaryQueue)
+registry.register_stats("summary_queue", lazy_stats(summary_queue))
+
+
+def submit_summary(text: str, metadata: Optional[Dict] = None) -> int:
+    """Queue a session summary for background storage into long-term memory."""
+    return summary_queue.get().submit(text, metadata or {})
@@ -15,6 +15,8 @@ class InputClass:
     prompt: str = None
     attachments: List[str] = None
     username: str = None
+    mode: str = None
+    job_id: str = None
 
 
 ################################################################
@@ -24,6 +26,8 @@ class InputClassSchema(Schema):
     prompt = fields.String(allow_none=True)
     attachments = fields.List(fields.String(allow_none=True), allow_none=True)
     username = fields.String(allow_none=True)
+    mode = fields.String(allow_none=True)
+    job_id = fields.String(allow_none=True)
 
     @post_load
     def create(self, data, **kwargs):
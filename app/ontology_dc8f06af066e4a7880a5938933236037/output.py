@@ -11,6 +11,16 @@ from openfabric_pysdk.utility import SchemaUtil
 @dataclass
 class OutputClass:
     message: str = None
+    image_id: str = None
+    image_path: str = None
+    model_id: str = None
+    model_path: str = None
+    video_id: str = None
+    video_path: str = None
+    job_id: str = None
+    status: str = None
+    stage: str = None
+    enhanced_prompt: str = None
 
 
 ################################################################
@@ -18,6 +28,16 @@ class OutputClass:
 ################################################################
 class OutputClassSchema(Schema):
     message = fields.Str(allow_none=True)
+    image_id = fields.Str(allow_none=True)
+    image_path = fields.Str(allow_none=True)
+    model_id = fields.Str(allow_none=True)
+    model_path = fields.Str(allow_none=True)
+    video_id = fields.Str(allow_none=True)
+    video_path = fields.Str(allow_none=True)
+    job_id = fields.Str(allow_none=True)
+    status = fields.Str(allow_none=True)
+    stage = fields.Str(allow_none=True)
+    enhanced_prompt = fields.Str(allow_none=True)
 
     @post_load
     def create(self, data, **kwargs):
@@ -1,11 +1,23 @@
-from typing import Dict
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+import heapq
+import logging
+import os
+import threading
+import time
 import uuid
 from memory.memory_manager import MemoryManager
 from datetime import datetime, timedelta
 
+# "memory" keeps sessions in this process, "redis" shares them between workers
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+
 
 # Session management
 class Session:
+    __slots__ = ("session_id", "start_time", "last_activity", "message_count", "is_active", "user_id", "memory")
+
     def __init__(self, user_id: str = None):
         self.session_id = (
             f"{user_id}_{uuid.uuid4().hex[:8]}" if user_id else uuid.uuid4().hex
@@ -18,6 +30,37 @@ class Session:
         # Initialize memory manager with both session_id and user_id
         self.memory = MemoryManager(self.session_id, user_id)
 
+    @classmethod
+    def restore(cls, record: Dict) -> "Session":
+        """
+        Rebuild a session from its stored record (see SessionBackend).
+
+        Args:
+            record (Dict): The session record.
+
+        Returns:
+            Session: The session, with a memory manager bound to the same history.
+        """
+        session = cls.__new__(cls)
+        session.session_id = record["session_id"]
+        session.user_id = record["user_id"]
+        session.start_time = datetime.fromtimestamp(record["start_time"])
+        session.last_activity = datetime.fromtimestamp(record["last_activity"])
+        session.message_count = record["message_count"]
+        session.is_active = True
+        session.memory = MemoryManager(session.session_id, session.user_id)
+        return session
+
+    def record(self) -> Dict:
+        """Return the storable state of the session (see SessionBackend)."""
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "start_time": self.start_time.timestamp(),
+            "last_activity": self.last_activity.timestamp(),
+            "message_count": self.message_count,
+        }
+
     def update_activity(self):
         """Update the last activity time of the session."""
         self.last_activity = datetime.now()
@@ -34,11 +77,221 @@ class Session:
         """
         return datetime.now() - self.last_activity > timedelta(minutes=timeout_minutes)
 
+    def deadline(self, timeout_minutes: int) -> float:
+        """
+        Compute the time at which the session times out if it stays idle.
+
+        Args:
+            timeout_minutes (int): The timeout duration in minutes.
+
+        Returns:
+            float: The expiry deadline as a POSIX timestamp.
+        """
+        return (self.last_activity + timedelta(minutes=timeout_minutes)).timestamp()
+
+
+class SessionBackend(ABC):
+    """
+    Storage of session records shared by SessionManager instances. A record is a dict
+    with session_id, user_id, start_time, last_activity (POSIX timestamps) and
+    message_count. Each user has at most one active session.
+    """
+
+    @abstractmethod
+    def find(self, user_id: Optional[str]) -> Optional[Dict]:
+        """Return the record of the user's active session, if any."""
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[Dict]:
+        """Return the record of a session, if it is still active."""
+
+    @abstractmethod
+    def get_or_create(self, record: Dict) -> Dict:
+        """
+        Atomically return the user's active session record, or store `record`
+        as the user's new session if there is none.
+        """
+
+    @abstractmethod
+    def touch(self, record: Dict) -> None:
+        """Store the activity of a session, extending its lifetime."""
+
+    @abstractmethod
+    def delete(self, session_id: str, user_id: Optional[str]) -> bool:
+        """Remove a session, returning True only for the caller that removed it."""
+
+
+class InMemorySessionBackend(SessionBackend):
+    """Session records kept in this process (single worker deployments)."""
 
-class SessionManager:
     def __init__(self):
+        self._records: Dict[str, Dict] = {}
+        self._by_user: Dict[Optional[str], str] = {}
+        self._lock = threading.Lock()
+
+    def find(self, user_id: Optional[str]) -> Optional[Dict]:
+        with self._lock:
+            session_id = self._by_user.get(user_id)
+            return dict(self._records[session_id]) if session_id else None
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            record = self._records.get(session_id)
+            return dict(record) if record else None
+
+    def get_or_create(self, record: Dict) -> Dict:
+        with self._lock:
+            session_id = self._by_user.get(record["user_id"])
+            if session_id:
+                return dict(self._records[session_id])
+            self._records[record["session_id"]] = dict(record)
+            self._by_user[record["user_id"]] = record["session_id"]
+            return dict(record)
+
+    def touch(self, record: Dict) -> None:
+        with self._lock:
+            if record["session_id"] in self._records:
+                self._records[record["session_id"]].update(record)
+
+    def delete(self, session_id: str, user_id: Optional[str]) -> bool:
+        with self._lock:
+            if self._records.pop(session_id, None) is None:
+                return False
+            if self._by_user.get(user_id) == session_id:
+                del self._by_user[user_id]
+            return True
+
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Session records shared through Redis, so every worker behind a load balancer sees
+    the same session for a user. A record is the hash `session:{id}` and the user's
+    current session id is `session_user:{user_id}`; both expire on their own
+    (TTL = timeout + grace) if no worker ends the session. Get-or-create runs as a
+    Lua script so concurrent first requests of a user end up in one session.
+    """
+
+    KEY_PREFIX = "session:"
+    USER_KEY_PREFIX = "session_user:"
+    # Extra lifetime so a worker's reaper normally ends (and summarizes) the session first
+    GRACE_SECONDS = 300
+
+    GET_OR_CREATE = """
+    local existing = redis.call('GET', KEYS[1])
+    if existing and redis.call('EXISTS', ARGV[1] .. existing) == 1 then
+        return existing
+    end
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    redis.call('HSET', KEYS[2], 'user_id', ARGV[4], 'start_time', ARGV[5],
+               'last_activity', ARGV[5], 'message_count', '0')
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+    return ARGV[2]
+    """
+
+    # Only a session that still exists is extended: another worker may have ended it
+    TOUCH = """
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], 'last_activity', ARGV[1], 'message_count', ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    if redis.call('GET', KEYS[2]) == ARGV[4] then
+        redis.call('EXPIRE', KEYS[2], ARGV[3])
+    end
+    return 1
+    """
+
+    DELETE = """
+    if redis.call('DEL', KEYS[1]) == 0 then
+        return 0
+    end
+    if redis.call('GET', KEYS[2]) == ARGV[1] then
+        redis.call('DEL', KEYS[2])
+    end
+    return 1
+    """
+
+    def __init__(self, client=None, url: str = SESSION_REDIS_URL, timeout_minutes: int = 30):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = timeout_minutes * 60 + self.GRACE_SECONDS
+        self._get_or_create = client.register_script(self.GET_OR_CREATE)
+        self._touch = client.register_script(self.TOUCH)
+        self._delete = client.register_script(self.DELETE)
+
+    def _user_key(self, user_id: Optional[str]) -> str:
+        return self.USER_KEY_PREFIX + (user_id or "")
+
+    def find(self, user_id: Optional[str]) -> Optional[Dict]:
+        session_id = self.client.get(self._user_key(user_id))
+        return self.load(session_id.decode("utf-8")) if session_id else None
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        fields = self.client.hgetall(self.KEY_PREFIX + session_id)
+        if not fields:
+            return None
+        fields = {key.decode("utf-8"): value.decode("utf-8") for key, value in fields.items()}
+        return {
+            "session_id": session_id,
+            "user_id": fields["user_id"] or None,
+            "start_time": float(fields["start_time"]),
+            "last_activity": float(fields["last_activity"]),
+            "message_count": int(fields["message_count"]),
+        }
+
+    def get_or_create(self, record: Dict) -> Dict:
+        session_id = self._get_or_create(
+            keys=[self._user_key(record["user_id"]), self.KEY_PREFIX + record["session_id"]],
+            args=[self.KEY_PREFIX, record["session_id"], self.ttl, record["user_id"] or "", record["start_time"]],
+        )
+        session_id = session_id.decode("utf-8") if isinstance(session_id, bytes) else session_id
+        return self.load(session_id) or record
+
+    def touch(self, record: Dict) -> None:
+        self._touch(
+            keys=[self.KEY_PREFIX + record["session_id"], self._user_key(record["user_id"])],
+            args=[record["last_activity"], record["message_count"], self.ttl, record["session_id"]],
+        )
+
+    def delete(self, session_id: str, user_id: Optional[str]) -> bool:
+        return bool(self._delete(keys=[self.KEY_PREFIX + session_id, self._user_key(user_id)], args=[session_id]))
+
+
+class SessionManager:
+    # Upper bound in seconds between two passes of the expiry reaper
+    REAPER_INTERVAL = 60
+    # Seconds before a session whose expiry check failed (e.g. Redis error) is checked again
+    REAPER_RETRY = 30
+
+    def __init__(self, backend: Optional[SessionBackend] = None):
+        # Session objects (with their memory managers) known to this process
         self.sessions: Dict[str, Session] = {}
         self.timeout_minutes = 30
+        if backend is None:
+            backend = (RedisSessionBackend(timeout_minutes=self.timeout_minutes)
+                       if SESSION_BACKEND == "redis" else InMemorySessionBackend())
+        self.backend = backend
+        # Min-heap of (deadline, session_id), one entry per session known to this process
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.RLock()
+        self._reaper: Optional[threading.Thread] = None
+
+    def _attach(self, record: Dict) -> Session:
+        """Return the local Session object for a record, creating or refreshing it."""
+        with self._lock:
+            session = self.sessions.get(record["session_id"])
+            if session is None:
+                session = Session.restore(record)
+                self.sessions[session.session_id] = session
+                heapq.heappush(self._expiry, (session.deadline(self.timeout_minutes), session.session_id))
+            else:
+                # Another worker may have served this session since
+                session.last_activity = max(session.last_activity, datetime.fromtimestamp(record["last_activity"]))
+                session.message_count = max(session.message_count, record["message_count"])
+        self._start_reaper()
+        return session
 
     def get_session(self, session_id: str) -> Session:
         """
@@ -50,10 +303,46 @@ class SessionManager:
         Returns:
             Session: The active session associated with the given ID, or None if not found or inactive.
         """
-        session = self.sessions.get(session_id, None)
-        if session and session.is_active:
-            return session
-        return None
+        record = self.backend.load(session_id)
+        if record is None:
+            return None
+        session = self._attach(record)
+        return session if session.is_active else None
+
+    def get_user_session(self, user_id: str) -> Optional[Session]:
+        """
+        Retrieve the active session of a user in O(1).
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            Optional[Session]: The user's active session, or None if the user has none.
+        """
+        record = self.backend.find(user_id)
+        return self._attach(record) if record else None
+
+    def get_or_create_session(self, user_id: str) -> Tuple[Session, bool]:
+        """
+        Atomically retrieve the active session of a user, creating it if needed.
+        Concurrent calls for the same user (on any worker) share one session.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            Tuple[Session, bool]: The session, and whether it was created by this call.
+        """
+        now = datetime.now().timestamp()
+        proposed = {
+            "session_id": f"{user_id}_{uuid.uuid4().hex[:8]}" if user_id else uuid.uuid4().hex,
+            "user_id": user_id,
+            "start_time": now,
+            "last_activity": now,
+            "message_count": 0,
+        }
+        record = self.backend.get_or_create(proposed)
+        return self._attach(record), record["session_id"] == proposed["session_id"]
 
     def create_session(self, user_id: str) -> Session:
         """
@@ -65,10 +354,19 @@ class SessionManager:
         Returns:
             Session: The newly created session.
         """
-        session = Session(user_id)
-        self.sessions[session.session_id] = session
+        session, _ = self.get_or_create_session(user_id)
         return session
 
+    def touch(self, session: Session) -> None:
+        """
+        Record activity on a session, in this process and in the backend.
+
+        Args:
+            session (Session): The session that served a request.
+        """
+        session.update_activity()
+        self.backend.touch(session.record())
+
     def check_session_timeout(self, session_id: str) -> bool:
         """
         Check if a session has timed out.
@@ -89,9 +387,99 @@ class SessionManager:
         Args:
             session_id (str): The ID of the session to end.
         """
-        if session_id in self.sessions:
-            session = self.sessions[session_id]
-            # Store memory summary before ending session
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            record = self.backend.load(session_id)
+            if record is None:
+                return
+            session = Session.restore(record)
+        session.is_active = False
+        # Only the worker that actually removed the session stores its memory summary
+        if self.backend.delete(session_id, session.user_id):
             session.memory.store_summary()
-            session.is_active = False
-            del self.sessions[session_id]
+
+    def reap_expired(self, now: Optional[float] = None) -> List[str]:
+        """
+        End every session whose deadline has passed. Entries of sessions that were
+        active since they were scheduled (here or on another worker) are pushed back
+        with their new deadline, so each step costs O(log n). A session whose check or
+        ending fails is retried REAPER_RETRY seconds later.
+
+        Args:
+            now (Optional[float]): The current POSIX timestamp (defaults to the current time).
+
+        Returns:
+            List[str]: The IDs of the sessions that expired.
+        """
+        now = now if now is not None else datetime.now().timestamp()
+        due = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                due.append(heapq.heappop(self._expiry)[1])
+
+        expired = []
+        for session_id in due:
+            session = self.sessions.get(session_id)
+            if session is None:
+                continue  # already ended
+            try:
+                record = self.backend.load(session_id)
+            except Exception as e:
+                logging.error(f"Failed to check expiry of session {session_id}, retrying: {e}")
+                self._retry_expiry(session_id, session, now)
+                continue
+            if record is None:
+                # Ended by another worker (or expired in the backend)
+                with self._lock:
+                    self.sessions.pop(session_id, None)
+                continue
+            session.last_activity = max(session.last_activity, datetime.fromtimestamp(record["last_activity"]))
+            deadline = session.deadline(self.timeout_minutes)
+            if deadline > now:
+                with self._lock:
+                    heapq.heappush(self._expiry, (deadline, session_id))
+            else:
+                expired.append((session_id, session))
+
+        ended = []
+        for session_id, session in expired:
+            logging.info(f"Session {session_id} expired, ending it")
+            try:
+                self.end_session(session_id)
+                ended.append(session_id)
+            except Exception as e:
+                logging.error(f"Failed to end expired session {session_id}, retrying: {e}")
+                self._retry_expiry(session_id, session, now)
+        return ended
+
+    def _retry_expiry(self, session_id: str, session: Session, now: float) -> None:
+        """Keep a session whose expiry could not be handled, and check it again later."""
+        with self._lock:
+            self.sessions.setdefault(session_id, session)
+            heapq.heappush(self._expiry, (now + self.REAPER_RETRY, session_id))
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        Returns:
+            Optional[float]: The earliest scheduled deadline, or None if no session is active.
+        """
+        with self._lock:
+            return self._expiry[0][0] if self._expiry else None
+
+    def _start_reaper(self) -> None:
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_forever, name="session-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reap_forever(self) -> None:
+        while True:
+            try:
+                self.reap_expired()
+            except Exception as e:
+                logging.error(f"Session reaper pass failed: {e}")
+            deadline = self.next_deadline()
+            now = datetime.now().timestamp()
+            delay = self.REAPER_INTERVAL if deadline is None else min(self.REAPER_INTERVAL, max(0.0, deadline - now))
+            time.sleep(delay)
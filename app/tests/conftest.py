@@ -0,0 +1,44 @@
+import hashlib
+import os
+import sys
+from typing import List
+
+import pytest
+
+# The application modules import each other from the app directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_core.embeddings import Embeddings  # noqa: E402
+
+
+class WordEmbeddings(Embeddings):
+    """Hashed word counts: deterministic vectors without loading a model."""
+
+    def __init__(self, dim: int = 32):
+        self.dim = dim
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for word in text.lower().split():
+            vector[int(hashlib.sha256(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        return vector
+
+
+@pytest.fixture
+def embeddings() -> WordEmbeddings:
+    return WordEmbeddings()
+
+
+@pytest.fixture
+def redis_client():
+    """A fakeredis client, also backing the chat histories."""
+    fakeredis = pytest.importorskip("fakeredis")
+    from memory import short_term_memory
+
+    client = fakeredis.FakeRedis()
+    short_term_memory.set_redis_pool(client.connection_pool)
+    yield client
+    short_term_memory.set_redis_pool(None)
@@ -0,0 +1,23 @@
+import pytest
+
+# The batch CLI drives the full pipeline module (and its SDK dependencies)
+batch = pytest.importorskip("batch")
+
+
+def test_read_prompts_skips_invalid_lines(tmp_path, caplog):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text(
+        '{"id": "a", "prompt": "a red cube"}\n'
+        '{"id": "b", "text": "no prompt"}\n'
+        '{"id": "c", "prompt": \n'
+        "\n"
+        "a blue sphere\n"
+        '{"id": "a", "prompt": "duplicate"}\n',
+        encoding="utf-8",
+    )
+
+    items = batch.read_prompts(str(path))
+
+    assert [item["prompt"] for item in items] == ["a red cube", "a blue sphere"]
+    assert f"{path}:2:" in caplog.text
+    assert f"{path}:3:" in caplog.text
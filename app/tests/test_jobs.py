@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from core.jobs import InMemoryJobBackend, JobManager, RedisJobBackend
+
+
+def _wait_for(manager: JobManager, job_id: str, status: str, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job is not None and job.status == status:
+            return job
+        time.sleep(0.01)
+    pytest.fail(f"job {job_id} never reached {status}")
+
+
+@pytest.fixture
+def managers(redis_client):
+    """Two workers sharing the job state through (fake) Redis."""
+    return JobManager(backend=RedisJobBackend(redis_client)), JobManager(backend=RedisJobBackend(redis_client))
+
+
+def test_job_is_visible_from_another_worker(managers):
+    first, second = managers
+
+    async def run(job):
+        job.update("image", enhanced_prompt="a red cube")
+        job.update("done", model_id="abc", model_path="/tmp/abc.glb")
+        return True
+
+    job = first.submit(run)
+    polled = _wait_for(second, job.job_id, "completed")
+
+    assert polled.snapshot() == {
+        "job_id": job.job_id,
+        "status": "completed",
+        "stage": "done",
+        "enhanced_prompt": "a red cube",
+        "model_id": "abc",
+        "model_path": "/tmp/abc.glb",
+    }
+    assert first.stats() == {"queued": 0, "running": 0, "completed": 1, "failed": 0}
+    assert second.stats() == {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+
+
+def test_failed_job_reports_the_error(managers):
+    first, second = managers
+
+    async def run(job):
+        raise RuntimeError("boom")
+
+    job = first.submit(run)
+    polled = _wait_for(second, job.job_id, "failed")
+
+    assert polled.stage == "failed"
+    assert polled.result["message"] == "Error: boom"
+
+
+def test_unknown_job(managers):
+    assert managers[1].get("missing") is None
+
+
+def test_in_memory_backend_drops_finished_jobs_after_ttl():
+    backend = InMemoryJobBackend(ttl=60)
+    record = {"job_id": "old", "status": "completed", "stage": "done", "result": {},
+              "created": 0.0, "updated": time.time() - 120}
+    backend.save(record)
+    backend.save(dict(record, job_id="new", updated=time.time()))
+
+    assert backend.load("old") is None
+    assert backend.load("new")["status"] == "completed"
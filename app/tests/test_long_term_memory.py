@@ -0,0 +1,68 @@
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from memory.long_term_memory import LongTermStore  # noqa: E402
+
+
+def _texts(count, offset=0):
+    return [f"summary {i} of a bronze statue with word{i % 7} and tag{i % 11}" for i in range(offset, offset + count)]
+
+
+def _ivf_store(embeddings, directory, count=300):
+    store = LongTermStore(embeddings, str(directory), dim=embeddings.dim)
+    store.add_texts(_texts(count), [{"user_id": "a"} for _ in range(count)])
+    store.rebuild("ivf")
+    return store
+
+
+def test_append_after_reloading_ivf_store(embeddings, tmp_path):
+    _ivf_store(embeddings, tmp_path)
+
+    store = LongTermStore(embeddings, str(tmp_path), dim=embeddings.dim)
+    ids = store.add_texts(["a new summary"], [{"user_id": "a"}])
+
+    assert store.index.ntotal == 301
+    assert [doc.page_content for doc in store.similarity_search("a new summary", k=1)] == ["a new summary"]
+    assert ids == [301]
+
+
+def test_append_to_read_only_ivf_store(embeddings, tmp_path):
+    _ivf_store(embeddings, tmp_path)
+
+    store = LongTermStore(embeddings, str(tmp_path), dim=embeddings.dim, read_only=True)
+    assert store._mmapped
+    store.add_texts(["a new summary"], [{"user_id": "a"}])
+
+    assert not store._mmapped
+    assert store.index.ntotal == 301
+
+
+def test_reindex_when_docstore_is_ahead_of_ivf_snapshot(embeddings, tmp_path):
+    store = _ivf_store(embeddings, tmp_path)
+    # Committed to the docstore but not snapshotted, as after a crash
+    store._db.execute("INSERT INTO docs (text, metadata, user_id) VALUES (?, ?, ?)",
+                      ("written before the crash", '{"user_id": "a"}', "a"))
+    store._db.commit()
+
+    reopened = LongTermStore(embeddings, str(tmp_path), dim=embeddings.dim)
+
+    assert reopened.index.ntotal == 301
+
+
+def test_hnsw_store_is_not_mapped(embeddings, tmp_path):
+    store = LongTermStore(embeddings, str(tmp_path), dim=embeddings.dim)
+    store.add_texts(_texts(10), [{"user_id": "a"} for _ in range(10)])
+    store.snapshot()
+
+    reopened = LongTermStore(embeddings, str(tmp_path), dim=embeddings.dim, read_only=True)
+
+    assert not reopened._mmapped
+
+
+def test_none_user_filter_matches_no_partition(embeddings, tmp_path):
+    store = LongTermStore(embeddings, str(tmp_path), dim=embeddings.dim)
+    store.add_texts(["summary of user a", "summary of user b"], [{"user_id": "a"}, {"user_id": "b"}])
+
+    assert store.similarity_search("summary", k=2, filter={"user_id": None}) == []
+    assert [doc.metadata["user_id"] for doc in store.similarity_search("summary", k=2, filter={"user_id": "b"})] == ["b"]
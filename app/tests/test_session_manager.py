@@ -0,0 +1,112 @@
+import pytest
+
+import memory.memory_manager
+from session_manager import InMemorySessionBackend, SessionManager
+
+
+@pytest.fixture
+def summaries(monkeypatch, redis_client):
+    """Summaries submitted to long-term memory, instead of the background queue."""
+    submitted = []
+    monkeypatch.setattr(memory.memory_manager, "submit_summary", lambda text, metadata: submitted.append(metadata))
+    return submitted
+
+
+class FlakyBackend(InMemorySessionBackend):
+    """In-memory backend whose loads fail while `failing` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.failing = False
+
+    def load(self, session_id):
+        if self.failing:
+            raise ConnectionError("backend unavailable")
+        return super().load(session_id)
+
+
+def test_reaper_retries_sessions_whose_check_failed(summaries):
+    backend = FlakyBackend()
+    manager = SessionManager(backend)
+    session, _ = manager.get_or_create_session("alice")
+    expired_at = session.deadline(manager.timeout_minutes) + 1
+
+    backend.failing = True
+    assert manager.reap_expired(now=expired_at) == []
+    assert session.session_id in manager.sessions
+    assert manager.next_deadline() == expired_at + SessionManager.REAPER_RETRY
+
+    backend.failing = False
+    assert manager.reap_expired(now=expired_at) == []  # not due again yet
+    assert manager.reap_expired(now=expired_at + SessionManager.REAPER_RETRY) == [session.session_id]
+    assert session.session_id not in manager.sessions
+    assert backend.load(session.session_id) is None
+
+
+@pytest.fixture
+def workers(redis_client):
+    """Two session managers (as on two workers) sharing one Redis."""
+    pytest.importorskip("lupa")  # fakeredis runs the Lua scripts with lupa
+    from session_manager import RedisSessionBackend
+
+    return SessionManager(RedisSessionBackend(redis_client)), SessionManager(RedisSessionBackend(redis_client))
+
+
+def test_redis_sessions_are_shared_between_workers(workers, summaries):
+    first, second = workers
+    session, created = first.get_or_create_session("alice")
+    same, created_again = second.get_or_create_session("alice")
+
+    assert created and not created_again
+    assert same.session_id == session.session_id
+    assert second.get_user_session("alice").session_id == session.session_id
+
+
+def test_redis_touch_is_seen_by_other_worker(workers, summaries):
+    first, second = workers
+    session, _ = first.get_or_create_session("alice")
+    other, _ = second.get_or_create_session("alice")
+
+    other.message_count = 3
+    second.touch(other)
+
+    record = first.backend.load(session.session_id)
+    assert record["message_count"] == 3
+    assert record["last_activity"] >= session.last_activity.timestamp()
+
+
+def test_redis_touch_does_not_recreate_ended_session(workers, redis_client, summaries):
+    first, second = workers
+    session, _ = first.get_or_create_session("alice")
+    other, _ = second.get_or_create_session("alice")
+
+    first.end_session(session.session_id)
+    second.touch(other)
+
+    assert not redis_client.exists(f"session:{session.session_id}")
+    assert second.get_session(session.session_id) is None
+
+
+def test_redis_expired_session_is_reaped_and_summarized_once(workers, summaries):
+    first, second = workers
+    session, _ = first.get_or_create_session("alice")
+    second.get_or_create_session("alice")
+    session.memory.record_turn("a bronze statue of a horse " * 5, "an enhanced bronze statue of a horse " * 5)
+    expired_at = session.deadline(first.timeout_minutes) + 1
+
+    assert first.reap_expired(now=expired_at) == [session.session_id]
+    second.reap_expired(now=expired_at)
+
+    assert [metadata["session_id"] for metadata in summaries] == [session.session_id]
+    assert second.get_user_session("alice") is None
+    assert session.session_id not in second.sessions
+
+
+def test_redis_delete_only_succeeds_once(workers, summaries):
+    first, second = workers
+    session, _ = first.get_or_create_session("alice")
+
+    assert first.backend.delete(session.session_id, "alice")
+    assert not second.backend.delete(session.session_id, "alice")
+    new_session, created = second.get_or_create_session("alice")
+    assert created and new_session.session_id != session.session_id
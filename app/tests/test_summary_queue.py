@@ -0,0 +1,70 @@
+import sqlite3
+import time
+
+import pytest
+
+from memory import summary_queue as summary_queue_module
+from memory.summary_queue import SummaryQueue
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """Summaries reaching long-term memory; fails while `stored.failing` is set."""
+    class Stored(list):
+        failing = False
+
+    stored = Stored()
+
+    def add_batch(texts, metadatas):
+        if stored.failing:
+            raise RuntimeError("store unavailable")
+        stored.extend(texts)
+
+    monkeypatch.setattr(summary_queue_module, "add_batch_to_long_term", add_batch)
+    return stored
+
+
+def _drain(queue: SummaryQueue) -> None:
+    """Runs a worker's loop (without a worker thread) until the queue is empty."""
+    while True:
+        batch = queue._next_batch()
+        if not batch:
+            return
+        queue._process(batch)
+
+
+def test_failed_batch_waits_for_its_deadline(tmp_path, stored):
+    queue = SummaryQueue(str(tmp_path / "queue.db"), workers=0)
+    stored.failing = True
+    queue.submit("first session", {"user_id": "alice"})
+
+    started = time.monotonic()
+    _drain(queue)
+    assert time.monotonic() - started < 5  # the worker did not sleep through the backoff
+    assert queue.stats()["failed"] == 1
+
+    # Not due yet: an idle worker does not pick the row up again
+    stored.failing = False
+    _drain(queue)
+    assert stored == [] and queue.stats()["journaled"] == 1
+
+    with queue._db_lock:
+        queue._db.execute("UPDATE pending SET not_before = 0")
+        queue._db.commit()
+    _drain(queue)
+    assert stored == ["first session"]
+    assert queue.stats()["journaled"] == 0
+
+
+def test_journal_of_an_older_version_is_migrated(tmp_path, stored):
+    path = str(tmp_path / "queue.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE pending "
+               "(id INTEGER PRIMARY KEY, text TEXT, metadata TEXT, enqueued_at REAL, attempts INTEGER DEFAULT 0)")
+    db.execute("INSERT INTO pending (text, metadata, enqueued_at) VALUES ('left over', '{}', 0)")
+    db.commit()
+    db.close()
+
+    queue = SummaryQueue(path, workers=0)
+    _drain(queue)
+    assert stored == ["left over"]